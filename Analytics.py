@@ -0,0 +1,280 @@
+# Imports
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import Schema as sch
+import PriceStore as ps
+import Instrument as ins
+
+analytics_dir_nm = "etl_outputs_analytics"
+
+# Products in the order of the cube's product axis, as named in the
+# 'Data_Vertical' tab; crudes and 'USGC-HSFO (/bbl)' are quoted per barrel,
+# the other products per gallon
+curve_cols = [
+    "WTI",
+    "Brent",
+    "Gasoline-RBOB",
+    "NYH ULSD-Heating Oil",
+    "USGC-ULSD",
+    "USGC-HSFO (/bbl)",
+]
+crude_cols = ["WTI", "Brent"]
+crack_cols = ["Gasoline-RBOB", "NYH ULSD-Heating Oil", "USGC-ULSD", "USGC-HSFO (/bbl)"]
+per_gallon_cols = ["Gasoline-RBOB", "NYH ULSD-Heating Oil", "USGC-ULSD"]
+gal_per_bbl = 42
+
+# The store keeps HSFO under its scraped metric_id, per barrel
+store_metric_to_col = {"USGC-HSFO": "USGC-HSFO (/bbl)"}
+
+# Calendar spreads are M1 less each of these tenors (M1 = the first
+# contract quoted on a collected date)
+spread_tenors = [2, 12]
+
+
+def get_cube_from_wide(df: pd.DataFrame) -> tuple:
+    """
+    Builds the (collected date x product x contract month) cube of prior
+    settles from one or more 'Data_Vertical' tabs (a daily output, or the
+    combined history).
+    :param df: DataFrame with the template's columns and declared dtypes
+    :return: Tuple of (collected dates, contract months as YYYYMM, cube)
+    """
+    dates, date_codes = np.unique(
+        df["Collected Date"].to_numpy(dtype="datetime64[ns]"), return_inverse=True
+    )
+    months, month_codes = np.unique(
+        df["Month Rank"].to_numpy(dtype="int64"), return_inverse=True
+    )
+
+    cube = np.full((len(dates), len(curve_cols), len(months)), np.nan)
+    cube[date_codes, :, month_codes] = df[curve_cols].to_numpy(dtype="float64")
+
+    return dates, months, cube
+
+
+def get_cube_from_store(
+    start_date: str = None, end_date: str = None, store_dir: str = None
+) -> tuple:
+    """
+    Builds the (collected date x product x contract month) cube of prior
+    settles for a range of collected dates from the price store.
+    :param start_date: First collected date ('YYYY-MM-DD', inclusive)
+    :param end_date: Last collected date ('YYYY-MM-DD', inclusive)
+    :param store_dir: Store directory
+    :return: Tuple of (collected dates, contract months as YYYYMM, cube)
+    """
+    df = ps.query_prices(
+        start_date, end_date, columns=["prior_settle"], store_dir=store_dir
+    )
+    col_nms = df["metric_id"].astype(str).replace(store_metric_to_col)
+    product_codes = pd.Index(curve_cols).get_indexer(col_nms)
+    df, product_codes = df[product_codes >= 0], product_codes[product_codes >= 0]
+
+    dates, date_codes = np.unique(
+        df["collected_date"].to_numpy(dtype="datetime64[ns]"), return_inverse=True
+    )
+    months, month_codes = np.unique(
+        df["contract_month"].to_numpy(dtype="int64"), return_inverse=True
+    )
+
+    cube = np.full((len(dates), len(curve_cols), len(months)), np.nan)
+    cube[date_codes, product_codes, month_codes] = df["prior_settle"].to_numpy(
+        dtype="float64"
+    )
+
+    return dates, months, cube
+
+
+def get_front_contracts(cube: np.ndarray, n_tenors: int) -> tuple:
+    """
+    Shifts every curve of the cube so that its first quoted contract month is
+    at tenor 1, keeping the first n_tenors tenors.
+    :param cube: (collected date x product x contract month) cube
+    :param n_tenors: Number of tenors to keep
+    :return: Tuple of (contract month positions, prices), each of shape
+    (collected date x product x n_tenors); tenors a curve doesn't reach are
+    NaN
+    """
+    n_months = cube.shape[-1]
+    if n_months < n_tenors:
+        pad = np.full(cube.shape[:-1] + (n_tenors - n_months,), np.nan)
+        cube = np.concatenate([cube, pad], axis=-1)
+
+    # A stable sort on 'not quoted' moves quoted months to the front in order
+    positions = np.argsort(np.isnan(cube), axis=-1, kind="stable")[..., :n_tenors]
+
+    return positions, np.take_along_axis(cube, positions, axis=-1)
+
+
+def get_curve_shape(dates: np.ndarray, months: np.ndarray, cube: np.ndarray):
+    """
+    Computes the calendar spreads and the structure of every product's curve
+    on every collected date. A curve is in backwardation when M1 settles
+    above M2 and in contango when it settles below.
+    :return: DataFrame with one row per collected date and product quoted on
+    it
+    """
+    n_tenors = max(spread_tenors)
+    positions, fronts = get_front_contracts(cube, n_tenors)
+
+    m1 = fronts[..., 0]
+    m1_month = months[np.minimum(positions[..., 0], len(months) - 1)]
+    columns = {
+        "Collected Date": np.repeat(dates, len(curve_cols)),
+        "Product": np.tile(curve_cols, len(dates)),
+        "M1 Month Rank": m1_month.ravel(),
+        "M1": m1.ravel(),
+    }
+    for tenor in spread_tenors:
+        columns[f"M{tenor}"] = fronts[..., tenor - 1].ravel()
+    for tenor in spread_tenors:
+        columns[f"M1-M{tenor}"] = (m1 - fronts[..., tenor - 1]).ravel()
+
+    m1_m2 = m1 - fronts[..., 1]
+    columns["Structure"] = np.select(
+        [m1_m2 > 0, m1_m2 < 0, m1_m2 == 0],
+        ["Backwardation", "Contango", "Flat"],
+        None,
+    ).ravel()
+
+    df = pd.DataFrame(columns)
+
+    return df[~np.isnan(m1).ravel()].reset_index(drop=True)
+
+
+def get_cracks(dates: np.ndarray, months: np.ndarray, cube: np.ndarray):
+    """
+    Computes the crack spread of every product against every crude, per
+    contract month, in $/bbl: per-gallon products are converted at 42
+    gallons to the barrel and 'USGC-HSFO (/bbl)' is already per barrel.
+    :return: DataFrame with one row per collected date and contract month
+    with at least one crack
+    """
+    product_idx = [curve_cols.index(col) for col in crack_cols]
+    crude_idx = [curve_cols.index(col) for col in crude_cols]
+    factors = np.array(
+        [gal_per_bbl if col in per_gallon_cols else 1 for col in crack_cols]
+    )
+
+    # (date x product x 1 x month) less (date x 1 x crude x month)
+    products = cube[:, product_idx, None, :] * factors[None, :, None, None]
+    cracks = products - cube[:, None, crude_idx, :]
+    cracks = cracks.reshape(len(dates), -1, len(months))
+
+    crack_nms = [f"{prod} vs {crude}" for prod in crack_cols for crude in crude_cols]
+    values = cracks.transpose(0, 2, 1).reshape(-1, len(crack_nms))
+
+    df = pd.DataFrame(values, columns=crack_nms)
+    df.insert(0, "Collected Date", np.repeat(dates, len(months)))
+    df.insert(1, "Month Rank", np.tile(months, len(dates)).astype("int32"))
+
+    return df[~np.isnan(values).all(axis=1)].reset_index(drop=True)
+
+
+@ins.timed("analytics.compute")
+def get_analytics(dates: np.ndarray, months: np.ndarray, cube: np.ndarray) -> dict:
+    """
+    Computes every analytics table over a cube in one pass.
+    :return: Dictionary of tab name: DataFrame
+    """
+    return {
+        "Curve_Shape": get_curve_shape(dates, months, cube),
+        "Cracks": get_cracks(dates, months, cube),
+    }
+
+
+def get_analytics_for_output(df: pd.DataFrame) -> dict:
+    """
+    Computes the analytics tables of a daily output.
+    :param df: 'Data_Vertical' DataFrame with the declared dtypes
+    :return: Dictionary of tab name: DataFrame
+    """
+    return get_analytics(*get_cube_from_wide(df))
+
+
+def get_analytics_paths(date_str: str, dir_to_write: str = None) -> dict:
+    """
+    Returns the full paths of a collected date's analytics files.
+    """
+    if not dir_to_write:
+        dir_to_write = os.path.join(os.getcwd(), analytics_dir_nm)
+
+    else:
+        pass
+
+    return {
+        tab_nm: os.path.join(
+            dir_to_write,
+            f"CME Group Futures Analytics - {tab_nm} {date_str}.parquet",
+        )
+        for tab_nm in ["Curve_Shape", "Cracks"]
+    }
+
+
+def write_analytics(dict_of_dfs: dict, dir_to_write: str = None) -> list:
+    """
+    Writes analytics tables out to one .parquet file per table and collected
+    date, next to the daily outputs they were computed from.
+    :param dict_of_dfs: Output of get_analytics()
+    :param dir_to_write: Directory to write to
+    :return: List of full paths of the files written
+    """
+    paths_written = []
+    for tab_nm, df in dict_of_dfs.items():
+        for collected_date, df_date in df.groupby("Collected Date", sort=True):
+            path_to_write = get_analytics_paths(
+                collected_date.strftime(sch.date_format), dir_to_write
+            )[tab_nm]
+            os.makedirs(os.path.dirname(path_to_write), exist_ok=True)
+            df_date.to_parquet(path_to_write, index=False)
+            paths_written.append(path_to_write)
+
+    return paths_written
+
+
+def recompute_history(
+    start_date: str = None,
+    end_date: str = None,
+    store_dir: str = None,
+    dir_to_write: str = None,
+) -> dict:
+    """
+    Recomputes the analytics of every collected date in the price store (or
+    a range of them) and rewrites their files.
+    :param start_date: First collected date ('YYYY-MM-DD', inclusive)
+    :param end_date: Last collected date ('YYYY-MM-DD', inclusive)
+    :param store_dir: Store directory
+    :param dir_to_write: Directory to write to
+    :return: Dictionary of tab name: DataFrame over the whole range
+    """
+    with ins.stage("analytics.read_store"):
+        dates, months, cube = get_cube_from_store(start_date, end_date, store_dir)
+    print(f"<{cube.shape[0]} dates x {cube.shape[2]} contract months>")
+
+    dict_of_dfs = get_analytics(dates, months, cube)
+
+    with ins.stage("analytics.write"):
+        paths_written = write_analytics(dict_of_dfs, dir_to_write)
+    print(f"<{len(paths_written)} analytics files written>")
+
+    return dict_of_dfs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute spreads, cracks and curve structure from the "
+        "price store"
+    )
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--store-dir", default=None)
+    parser.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    recompute_history(args.start, args.end, args.store_dir, args.dir)
+    print(f"<Recomputed in {time.perf_counter() - start:.2f}s>")
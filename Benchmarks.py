@@ -0,0 +1,1026 @@
+# Imports
+import os
+import time
+import calendar
+import tracemalloc
+import contextlib
+import io
+import re
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tempfile
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import ETL as etl
+import ETL_Combine_Processed as combine
+import Schema as sch
+import Crawler as cr
+import Instrument as ins
+import Analytics as an
+import Catalog as cat
+
+# Shape of the current nightly job: contract months quoted per product (from
+# a 2020-04 'Combined Output' CSV), a rough prior settle per product and the
+# number of daily outputs the combine step reads; the suite scales these
+suite_contract_months = {
+    "WTI": 130,
+    "Brent": 91,
+    "USGC-HSFO": 53,
+    "Gasoline-RBOB": 45,
+    "NYH ULSD-Heating Oil": 45,
+    "USGC-ULSD": 45,
+}
+suite_prices = {
+    "WTI": 28.0,
+    "Brent": 30.0,
+    "USGC-HSFO": 20.0,
+    "Gasoline-RBOB": 0.72,
+    "NYH ULSD-Heating Oil": 1.02,
+    "USGC-ULSD": 0.98,
+}
+suite_history_days = 60
+suite_scales = (1, 10, 100)
+
+results_dir = "benchmark_results"
+
+# Both header rows of the 'Combined Output' CSV (the quotes table's
+# two-level header flattened by Main.py)
+scrape_csv_cols = [
+    "Metric ID",
+    "Month",
+    "Options",
+    "Charts",
+    "Last",
+    "Change",
+    "Prior Settle",
+    "Open",
+    "High",
+    "Low",
+    "Volume",
+    "Hi / Low Limit",
+    "Updated",
+    "Unnamed: 12_level_0",
+    "Unnamed: 13_level_0",
+    "Collected Timestamp",
+    "Collected Date",
+]
+scrape_csv_second_header = (
+    [""]
+    + scrape_csv_cols[1:12]
+    + ["Updated", "Unnamed: 12_level_1", "Unnamed: 13_level_1", "", ""]
+)
+
+
+def get_synthetic_updated_col(
+    n_rows: int = 1_000_000, n_distinct: int = 50_000, seed: int = 0
+) -> pd.Series:
+    """
+    Generates a CME-shaped 'updated' column (e.g. '20:24:53 CT  09 Apr 2020')
+    by sampling from a pool of distinct timestamps, with a small share of
+    unparseable '-' values mixed in.
+    :param n_rows: Number of rows to generate
+    :param n_distinct: Number of distinct timestamps to sample from
+    :param seed: Seed for the random number generator
+    :return: Series of 'updated' strings
+    """
+    rng = np.random.default_rng(seed)
+    months = [val for val in calendar.month_abbr if val]
+
+    pool = [
+        f"{rng.integers(0, 24):02d}:{rng.integers(0, 60):02d}:"
+        f"{rng.integers(0, 60):02d} CT  {rng.integers(1, 29):02d} "
+        f"{months[rng.integers(0, 12)]} {rng.integers(2020, 2032)}"
+        for _ in range(n_distinct)
+    ]
+    pool.append("-")
+
+    return pd.Series(np.array(pool, dtype=object)[rng.integers(0, len(pool), n_rows)])
+
+
+def get_synthetic_combined_df(n_rows: int = 1_000_000, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a frame shaped like the 'Combined_Vertical' tab: one row per
+    collected date and contract month, with text keys/dates, an integer
+    month rank and float prices.
+    :param n_rows: Number of rows to generate
+    :param seed: Seed for the random number generator
+    :return: DataFrame with the template's columns
+    """
+    rng = np.random.default_rng(seed)
+    months = [val.upper() for val in calendar.month_abbr if val]
+
+    collected = pd.Timestamp("2020-04-01") + pd.to_timedelta(
+        rng.integers(0, 3_650, n_rows), unit="D"
+    )
+    year, month = rng.integers(2020, 2032, n_rows), rng.integers(0, 12, n_rows)
+    month_col = (
+        pd.Series(np.array(months, dtype=object)[month]) + " " + year.astype(str)
+    )
+    collected_date = pd.Series(collected.strftime("%Y-%m-%d"))
+
+    df = pd.DataFrame(
+        {
+            "Lookup-Key": collected_date + " - " + month_col,
+            "Month": month_col,
+            "Month Rank": (year * 100 + month + 1).astype("int32"),
+        }
+    )
+    for col in ["WTI", "Brent", "Gasoline-RBOB", "NYH ULSD-Heating Oil"]:
+        df[col] = np.round(rng.normal(50, 15, n_rows), 2)
+    for col in ["USGC-ULSD", "USGC-HSFO"]:
+        df[col] = np.round(rng.normal(1.5, 0.4, n_rows), 4)
+    df["USGC-HSFO (/bbl)"] = df["USGC-HSFO"] * 42
+    df["Collected Date"] = collected_date
+    df["Updated Date"] = collected_date
+    df["Updated Time"] = "08:24 PM"
+    df["Updated Time Zone"] = "CT"
+
+    return df
+
+
+def get_synthetic_pivoted_df(
+    n_products: int = 200, n_months: int = 150, seed: int = 0
+) -> pd.DataFrame:
+    """
+    Generates a frame shaped like the pivoted frame in ETL.run_pipeline
+    before coalescing: one row per contract month and a 'field: product'
+    column per field and product. Each product only quotes some of the
+    months (null elsewhere) and a small share of its prices are '-'.
+    :param n_products: Number of products (metric_ids) to generate
+    :param n_months: Number of contract months (rows) to generate
+    :param seed: Seed for the random number generator
+    :return: Wide DataFrame of object columns
+    """
+    rng = np.random.default_rng(seed)
+
+    cols = {}
+    for i in range(n_products):
+        is_quoted = rng.random(n_months) < 0.6
+        prices = np.round(rng.normal(50, 15, n_months), 4).astype(str).astype(object)
+        prices[rng.random(n_months) < 0.02] = "-"
+
+        for field, values in [
+            ("prior_settle", prices),
+            ("collected_date", np.full(n_months, "2020-04-10", dtype=object)),
+            ("last_updated_date", np.full(n_months, "2020-04-09", dtype=object)),
+            ("last_updated_time_local", np.full(n_months, "08:24 PM", dtype=object)),
+            ("last_updated_time_zone", np.full(n_months, "CT", dtype=object)),
+        ]:
+            cols[f"{field}: Product {i}"] = np.where(is_quoted, values, np.nan)
+
+    return pd.DataFrame(cols)
+
+
+def floatify_cols_iterative(df, list_of_cols):
+    """
+    Reference (column-by-column) implementation of etl.floatify_cols().
+    """
+    for col in list_of_cols:
+        df[col] = df[col].replace("-", np.nan)
+        df[col] = df[col].apply(float)
+
+    return None
+
+
+def coalesce_multiple_iterative(df, col_patterns_to_coalesce, col_nms_to_coalesce_into):
+    """
+    Reference (fillna-chain, copy-per-set) implementation of
+    etl.coalesce_multiple().
+    """
+    sets_of_cols = []
+    for patt in col_patterns_to_coalesce:
+        sets_of_cols.append([col for col in df.columns if re.findall(patt, col) != []])
+
+    for cols, col_nm in zip(sets_of_cols, col_nms_to_coalesce_into):
+        df1 = df.copy()
+        coalesced = df1[cols[0]]
+        for col in cols[1:]:
+            coalesced = coalesced.fillna(df1[col])
+        df[col_nm] = coalesced
+        df.drop(columns=cols, inplace=True)
+
+    return None
+
+
+def time_func(func, *args, n_repeats: int = 3, **kwargs) -> float:
+    """
+    Times a function call, returning the best wall time over n_repeats runs.
+    """
+    timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def benchmark_parse_updated(n_rows: int = 1_000_000, n_repeats: int = 3) -> dict:
+    """
+    Compares the row-by-row explode_col_by_func(parse_last_updated) path
+    against the vectorized parse_last_updated_col() on a synthetic frame.
+    :param n_rows: Number of rows in the synthetic frame
+    :param n_repeats: Number of runs to take the best time from
+    :return: Dictionary of timings in seconds
+    """
+    df = pd.DataFrame({"updated": get_synthetic_updated_col(n_rows)})
+    new_cols = ["date", "time_military", "time_local", "time_zone"]
+
+    results = {
+        "rows": n_rows,
+        "apply_seconds": time_func(
+            lambda: etl.explode_col_by_func(df.copy(), "updated", new_cols),
+            n_repeats=n_repeats,
+        ),
+        "vectorized_seconds": time_func(
+            etl.parse_last_updated_col, df["updated"], n_repeats=n_repeats
+        ),
+    }
+    results["speedup"] = results["apply_seconds"] / results["vectorized_seconds"]
+
+    print(
+        f"parse 'updated' ({n_rows:,} rows): "
+        f"apply {results['apply_seconds']:.2f}s | "
+        f"vectorized {results['vectorized_seconds']:.2f}s | "
+        f"{results['speedup']:.1f}x"
+    )
+
+    return results
+
+
+def benchmark_col_widths(n_rows: int = 1_000_000, n_repeats: int = 3) -> dict:
+    """
+    Compares sizing every column of a combined-shaped frame by stringifying
+    every value (exact) against the per-dtype estimate fancy_excel_writer()
+    uses by default.
+    :param n_rows: Number of rows in the synthetic frame
+    :param n_repeats: Number of runs to take the best time from
+    :return: Dictionary of timings in seconds and the largest difference
+    between an exact and an estimated width (float columns with rare long
+    repr's can be under-sized by a few characters)
+    """
+    df = get_synthetic_combined_df(n_rows)
+
+    def size_all(exact):
+        return [etl.get_col_width(df[col], exact) for col in df]
+
+    results = {
+        "rows": n_rows,
+        "exact_seconds": time_func(size_all, True, n_repeats=n_repeats),
+        "estimate_seconds": time_func(size_all, False, n_repeats=n_repeats),
+        "max_width_diff": max(
+            abs(exact - estimate)
+            for exact, estimate in zip(size_all(True), size_all(False))
+        ),
+    }
+    results["speedup"] = results["exact_seconds"] / results["estimate_seconds"]
+
+    print(
+        f"column widths ({n_rows:,} rows): "
+        f"exact {results['exact_seconds']:.2f}s | "
+        f"estimate {results['estimate_seconds']:.2f}s | "
+        f"{results['speedup']:.1f}x | "
+        f"max width difference {results['max_width_diff']}"
+    )
+
+    return results
+
+
+def benchmark_floatify_cols(
+    n_products: int = 500, n_months: int = 200, n_repeats: int = 3
+) -> dict:
+    """
+    Compares the column-by-column replace/apply(float) conversion against
+    the batched etl.floatify_cols() over every price column of a wide
+    synthetic pivoted frame.
+    :param n_products: Number of products (price columns)
+    :param n_months: Number of rows
+    :param n_repeats: Number of runs to take the best time from
+    :return: Dictionary of timings in seconds and whether results match
+    """
+    df = get_synthetic_pivoted_df(n_products, n_months)
+    price_cols = [col for col in df.columns if col.startswith("prior_settle")]
+
+    df_iterative, df_batched = df.copy(), df.copy()
+    floatify_cols_iterative(df_iterative, price_cols)
+    etl.floatify_cols(df_batched, price_cols)
+
+    results = {
+        "products": n_products,
+        "iterative_seconds": time_func(
+            lambda: floatify_cols_iterative(df.copy(), price_cols),
+            n_repeats=n_repeats,
+        ),
+        "batched_seconds": time_func(
+            lambda: etl.floatify_cols(df.copy(), price_cols), n_repeats=n_repeats
+        ),
+        "results_match": df_iterative.equals(df_batched),
+    }
+    results["speedup"] = results["iterative_seconds"] / results["batched_seconds"]
+
+    print(
+        f"floatify ({n_products} products x {n_months} months): "
+        f"iterative {results['iterative_seconds']:.3f}s | "
+        f"batched {results['batched_seconds']:.3f}s | "
+        f"{results['speedup']:.1f}x | results match: {results['results_match']}"
+    )
+
+    return results
+
+
+def benchmark_coalesce(
+    n_products: int = 500, n_months: int = 200, n_repeats: int = 3
+) -> dict:
+    """
+    Compares the fillna-chain coalesce (copying the frame for every set of
+    columns) against the NumPy-block etl.coalesce_multiple() with the
+    patterns ETL.run_pipeline uses, over a wide synthetic pivoted frame.
+    :param n_products: Number of products (columns per coalesced set)
+    :param n_months: Number of rows
+    :param n_repeats: Number of runs to take the best time from
+    :return: Dictionary of timings in seconds and whether results match
+    """
+    df = get_synthetic_pivoted_df(n_products, n_months)
+    patterns = [".*_zone:", "collected_date: ", "last_updated_date: ", ".*time_local:"]
+    col_nms = ["updated_time_zone", "collected_date", "updated_date", "updated_time"]
+
+    df_iterative, df_block = df.copy(), df.copy()
+    coalesce_multiple_iterative(df_iterative, patterns, col_nms)
+    etl.coalesce_multiple(df_block, patterns, col_nms)
+
+    results = {
+        "products": n_products,
+        "iterative_seconds": time_func(
+            lambda: coalesce_multiple_iterative(df.copy(), patterns, col_nms),
+            n_repeats=n_repeats,
+        ),
+        "block_seconds": time_func(
+            lambda: etl.coalesce_multiple(df.copy(), patterns, col_nms),
+            n_repeats=n_repeats,
+        ),
+        "results_match": df_iterative.equals(df_block),
+    }
+    results["speedup"] = results["iterative_seconds"] / results["block_seconds"]
+
+    print(
+        f"coalesce ({n_products} products x {n_months} months): "
+        f"iterative {results['iterative_seconds']:.3f}s | "
+        f"block {results['block_seconds']:.3f}s | "
+        f"{results['speedup']:.1f}x | results match: {results['results_match']}"
+    )
+
+    return results
+
+
+def parse_html_corpus(parser_name: str, list_of_paths: list) -> dict:
+    """
+    Parses every raw page in list_of_paths with either the original soup
+    parser or the lxml parser, timing it and tracking peak memory. Meant to
+    run in a fresh process so the peak RSS belongs to a single parser. The
+    Python-heap peak doesn't include lxml's C allocations; the RSS figure
+    does.
+    :param parser_name: 'soup' (df_from_html_soup) or 'lxml' (df_from_html)
+    :param list_of_paths: List of full paths to raw HTML pages
+    :return: Dictionary of parse seconds and peak memory
+    """
+    parser = {"soup": cr.df_from_html_soup, "lxml": cr.df_from_html}[parser_name]
+
+    pages = []
+    for path in list_of_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+
+    def parse_all():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for html in pages:
+                parser(html, "Benchmark", "2020-01-01 00:00:00.0")
+
+    # Timed pass (untraced), then a second pass under tracemalloc
+    rss_before = ins.get_peak_rss_mb()
+    start = time.perf_counter()
+    parse_all()
+    seconds = time.perf_counter() - start
+    rss_after = ins.get_peak_rss_mb()
+
+    tracemalloc.start()
+    parse_all()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": seconds,
+        "python_peak_mb": traced_peak / 1024**2,
+        "rss_peak_increase_mb": None if rss_before is None else rss_after - rss_before,
+    }
+
+
+def benchmark_parse_html(dir_to_read: str = "outputs_txt") -> dict:
+    """
+    Compares parse time and peak memory of the original BeautifulSoup +
+    prettify parser against the lxml single-table parser over the archived
+    raw pages, running each parser in its own fresh process.
+    :param dir_to_read: Directory of raw HTML pages
+    :return: Dictionary of results per parser
+    """
+    list_of_paths = [
+        os.path.join(dir_to_read, file)
+        for file in sorted(os.listdir(dir_to_read))
+        if file.endswith(".txt")
+    ]
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for parser_name in ["soup", "lxml"]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[parser_name] = executor.submit(
+                parse_html_corpus, parser_name, list_of_paths
+            ).result()
+
+        result = results[parser_name]
+        rss = result["rss_peak_increase_mb"]
+        print(
+            f"parse html ({len(list_of_paths)} pages) {parser_name}: "
+            f"{result['seconds']:.2f}s | "
+            f"python peak {result['python_peak_mb']:.0f} MB | "
+            f"rss peak increase {'n/a' if rss is None else f'{rss:.0f} MB'}"
+        )
+
+    return results
+
+
+def get_contract_months(first_month: pd.Period, n_months: int) -> np.ndarray:
+    """
+    Returns n_months consecutive contract months formatted as CME lists them
+    (e.g. 'JUN 2020').
+    """
+    months = pd.period_range(first_month, periods=n_months, freq="M")
+
+    return np.array(months.strftime("%b %Y").str.upper(), dtype=object)
+
+
+def get_synthetic_scrape_df(
+    date_str: str, product_scale: int = 1, seed: int = 0
+) -> pd.DataFrame:
+    """
+    Generates a 'Combined Output' CSV's contents for one collected date at a
+    multiple of the current product count (the real products, then numbered
+    copies of them): every product's quotes table with prior settles along
+    an upward-sloping curve, a small share of '-' values and the handful of
+    distinct 'updated' timestamps a scrape shares across its contracts.
+    :param date_str: Collected date ('YYYY-MM-DD')
+    :param product_scale: Multiple of the current product count
+    :param seed: Seed for the random number generator
+    :return: DataFrame with both header rows, ready for to_csv()
+    """
+    rng = np.random.default_rng(seed)
+    collected = pd.Timestamp(date_str)
+    updated_day = (collected - pd.Timedelta(days=1)).strftime("%d %b %Y")
+    updated_pool = [
+        f"16:{rng.integers(30, 40)}:{rng.integers(0, 60):02d} CT  {updated_day}"
+        for _ in range(8)
+    ]
+
+    frames = [pd.DataFrame([scrape_csv_second_header], columns=scrape_csv_cols)]
+    for copy_idx in range(product_scale):
+        for product_idx, (name, n_months) in enumerate(suite_contract_months.items()):
+            months = get_contract_months(
+                collected.to_period("M") + product_idx % 3, n_months
+            )
+            base_price = suite_prices[name] * rng.normal(1, 0.05)
+            prices = base_price * (1 + 0.004 * np.arange(n_months))
+            prices += rng.normal(0, 0.002 * base_price, n_months)
+
+            decimals = 2 if suite_prices[name] >= 10 else 4
+            prior_settle = np.char.mod(f"%.{decimals}f", prices).astype(object)
+            prior_settle[rng.random(n_months) < 0.02] = "-"
+
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "Metric ID": name if not copy_idx else f"{name} {copy_idx + 1}",
+                        "Month": months,
+                        "Options": months,
+                        "Charts": "Show Price Chart",
+                        "Last": "-",
+                        "Change": "-",
+                        "Prior Settle": prior_settle,
+                        "Open": "-",
+                        "High": "-",
+                        "Low": "-",
+                        "Volume": "0",
+                        "Hi / Low Limit": "No Limit / No Limit",
+                        "Updated": rng.choice(updated_pool, n_months),
+                        "Unnamed: 12_level_0": "",
+                        "Unnamed: 13_level_0": "",
+                        "Collected Timestamp": "08:00:00.0",
+                        "Collected Date": date_str,
+                    }
+                )
+            )
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_synthetic_scrape_csv(
+    dir_to_write: str, date_str: str, product_scale: int = 1, seed: int = 0
+) -> str:
+    """
+    Writes get_synthetic_scrape_df() as 'date ~ Combined Output ~ v1.csv'.
+    :return: Full path of the CSV written
+    """
+    path_to_write = os.path.join(dir_to_write, f"{date_str} ~ Combined Output ~ v1.csv")
+    get_synthetic_scrape_df(date_str, product_scale, seed).to_csv(
+        path_to_write, index=False
+    )
+
+    return path_to_write
+
+
+def get_synthetic_daily_outputs(
+    n_days: int = suite_history_days, start_date: str = "2020-04-04", seed: int = 0
+) -> dict:
+    """
+    Generates the 'Data_Vertical' tab of n_days consecutive daily ETL outputs
+    with the declared dtypes, as ETL_Combine_Processed.read_etl_output()
+    returns them: one row per contract month any product quotes, prices
+    following a random walk from day to day, and the trailing months only
+    WTI quotes that the combine step truncates. Categories are per day, as
+    they are when each file is read on its own.
+    :param n_days: Number of collected dates
+    :param start_date: First collected date
+    :param seed: Seed for the random number generator
+    :return: Dictionary of base file name: DataFrame, in date order
+    """
+    rng = np.random.default_rng(seed)
+    products = list(suite_contract_months)
+    n_rows = max(suite_contract_months.values())
+    row_idx = np.arange(n_rows)
+
+    levels = np.array([suite_prices[name] for name in products]) * np.exp(
+        np.cumsum(rng.normal(0, 0.02, (n_days, len(products))), axis=0)
+    )
+
+    dict_of_dfs = {}
+    for day_idx, collected in enumerate(pd.date_range(start_date, periods=n_days)):
+        date_str = collected.strftime("%Y-%m-%d")
+        months = pd.period_range(collected.to_period("M"), periods=n_rows, freq="M")
+
+        df = pd.DataFrame(
+            {
+                "Lookup-Key": f"{date_str} - " + pd.Series(row_idx).astype(str),
+                "Month": np.array(months.strftime("%b %Y").str.upper(), dtype=object),
+                "Month Rank": months.year * 100 + months.month,
+            }
+        )
+        for product_idx, name in enumerate(products):
+            first_row = product_idx % 3 if name != "WTI" else 0
+            is_quoted = (row_idx >= first_row) & (
+                row_idx < first_row + suite_contract_months[name]
+            )
+            prices = levels[day_idx, product_idx] * (1 + 0.004 * row_idx)
+            col = name if name != "USGC-HSFO" else "USGC-HSFO (/bbl)"
+            df[col] = np.where(is_quoted, np.round(prices, 4), np.nan)
+
+        df["USGC-HSFO"] = df["USGC-HSFO (/bbl)"] / 42
+        df["Collected Date"] = date_str
+        df["Updated Date"] = (collected - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        df["Updated Time"] = rng.choice(["04:38 PM", "04:39 PM"], n_rows)
+        df["Updated Time Zone"] = "CT"
+
+        file_nm = f"CME Group Futures Price - Prior Settle {date_str}"
+        dict_of_dfs[file_nm] = sch.enforce_schema(df[list(sch.output_schema)])
+
+    return dict_of_dfs
+
+
+def write_synthetic_fixtures(
+    dir_to_write: str, n_days: int = suite_history_days, product_scale: int = 1
+) -> dict:
+    """
+    Writes a project-shaped directory of synthetic inputs to run ETL_All.py
+    or ETL_Combine_Processed.py against: n_days of 'Combined Output' CSVs in
+    outputs_csv and the matching daily outputs in etl_outputs_parquet and
+    etl_outputs_xlsx.
+    :param dir_to_write: Directory to write the fixtures to
+    :param n_days: Number of collected dates
+    :param product_scale: Multiple of the current product count for the CSVs
+    :return: Dictionary of counts of files written per sub-directory
+    """
+    counts = {}
+    csv_dir = os.path.join(dir_to_write, "outputs_csv")
+    xlsx_dir = os.path.join(dir_to_write, "etl_outputs_xlsx")
+    os.makedirs(csv_dir, exist_ok=True)
+    os.makedirs(xlsx_dir, exist_ok=True)
+
+    dict_of_dfs = get_synthetic_daily_outputs(n_days)
+    for day_idx, (file_nm, df) in enumerate(dict_of_dfs.items()):
+        date_str = file_nm.split(" ")[-1]
+        write_synthetic_scrape_csv(csv_dir, date_str, product_scale, seed=day_idx)
+
+        etl.write_columnar_output(
+            df, file_nm, os.path.join(dir_to_write, "etl_outputs_parquet")
+        )
+        context_df = pd.DataFrame(
+            {"Name": ["Source", "Date"], "Href": ["CME Group (Prior Settle)", date_str]}
+        )
+        etl.fancy_excel_writer(
+            os.path.join(xlsx_dir, f"{file_nm}.xlsx"),
+            {"Data_Vertical": sch.to_excel_types(df), "Context": context_df},
+        )
+
+    for sub_dir in ["outputs_csv", "etl_outputs_parquet", "etl_outputs_xlsx"]:
+        counts[sub_dir] = len(os.listdir(os.path.join(dir_to_write, sub_dir)))
+    print(f"<Wrote synthetic fixtures to {dir_to_write}: {counts}>")
+
+    return counts
+
+
+def get_pipeline_frames(path_to_csv: str) -> dict:
+    """
+    Runs a scraping CSV through the same steps as ETL.run_pipeline() up to
+    sorting, keeping the input of every step the suite times.
+    :param path_to_csv: Full path to a 'Combined Output' CSV
+    :return: Dictionary of 'read', 'exploded', 'pivoted' and 'coalesced'
+    DataFrames
+    """
+    frames = {"read": etl.read_csv_from_path(path_to_csv)}
+
+    frames["exploded"] = etl.explode_scraped_df(frames["read"].copy())
+    frames["pivoted"] = etl.pivot_on_metric_id(frames["exploded"])
+
+    frames["coalesced"] = frames["pivoted"].copy()
+    etl.coalesce_multiple(
+        frames["coalesced"], etl.patterns_to_find, etl.coalesced_col_nms
+    )
+
+    return frames
+
+
+def get_suite_cases(scale: int, dir_to_write: str) -> dict:
+    """
+    Builds the suite's cases at one scale. Per-file steps run on a scraping
+    CSV with scale times the current products; combine and Excel steps run
+    on scale times the current history of daily outputs.
+    :param scale: Multiple of the current product count / history length
+    :param dir_to_write: Scratch directory for generated files
+    :return: Dictionary of benchmark name: (scaled dimension, number of
+    rows, callable to time)
+    """
+    path_to_csv = write_synthetic_scrape_csv(dir_to_write, "2020-04-10", scale)
+    frames = get_pipeline_frames(path_to_csv)
+
+    daily_dfs = get_synthetic_daily_outputs(suite_history_days * scale)
+    hash_dict = {k: True for k in daily_dfs}
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_combined = combine.combine_valid_dfs(daily_dfs, hash_dict)
+    excel_dfs = {"Combined_Vertical": sch.to_excel_types(df_combined)}
+
+    def write_excel():
+        # Column widths are cached per process; the nightly job starts cold
+        etl.stable_col_widths.clear()
+        etl.fancy_excel_writer(io.BytesIO(), excel_dfs)
+
+    n_read, n_coalesced = len(frames["read"]), len(frames["coalesced"])
+
+    return {
+        "read_csv_from_path": (
+            "products",
+            n_read,
+            lambda: etl.read_csv_from_path(path_to_csv),
+        ),
+        "explode_col_by_func": (
+            "products",
+            n_read,
+            lambda: etl.explode_col_by_func(
+                frames["read"].copy(), "updated", etl.cols_to_explode
+            ),
+        ),
+        "explode_updated_col": (
+            "products",
+            n_read,
+            lambda: etl.explode_updated_col(
+                frames["read"].copy(), "updated", etl.cols_to_explode
+            ),
+        ),
+        "pivot_on_metric_id": (
+            "products",
+            n_read,
+            lambda: etl.pivot_on_metric_id(frames["exploded"]),
+        ),
+        "get_month_hash_and_sort": (
+            "products",
+            n_coalesced,
+            lambda: etl.get_month_hash_and_sort(frames["coalesced"].copy()),
+        ),
+        "combine_valid_dfs": (
+            "history",
+            len(df_combined),
+            lambda: combine.combine_valid_dfs(daily_dfs, hash_dict),
+        ),
+        "fancy_excel_writer": ("history", len(df_combined), write_excel),
+        "get_analytics": (
+            "history",
+            len(df_combined),
+            lambda: an.get_analytics(*an.get_cube_from_wide(df_combined)),
+        ),
+    }
+
+
+def get_git_commit():
+    """
+    Returns the short hash of the commit checked out where this file lives,
+    or None outside a git repository.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scales=suite_scales, n_repeats: int = 3, names: list = None) -> dict:
+    """
+    Times every case of the suite at every scale, taking the best of
+    n_repeats runs. Copies made to keep a case's input intact are timed with
+    it, identically from run to run.
+    :param scales: Multiples of the current product count / history length
+    :param n_repeats: Number of runs to take the best time from
+    :param names: Only run these benchmarks (defaults to all)
+    :return: Dictionary of run metadata and a list of results
+    """
+    suite_results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": f"{platform.system()} {platform.machine()}",
+        "cpu_count": os.cpu_count(),
+        "n_repeats": n_repeats,
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in scales:
+            print(f"<Preparing benchmark inputs at {scale}x>")
+            cases = get_suite_cases(scale, tmp_dir)
+
+            for name, (dimension, n_rows, func) in cases.items():
+                if names and name not in names:
+                    continue
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    seconds = time_func(func, n_repeats=n_repeats)
+                suite_results["results"].append(
+                    {
+                        "benchmark": name,
+                        "scale": scale,
+                        "dimension": dimension,
+                        "n_rows": n_rows,
+                        "seconds": seconds,
+                    }
+                )
+                print(
+                    f"\t{name} ({scale}x {dimension}, {n_rows:,} rows): "
+                    f"{seconds:.4f}s"
+                )
+
+    return suite_results
+
+
+def write_results(suite_results: dict, dir_to_write: str = results_dir) -> str:
+    """
+    Writes a run of the suite to '<created_at> ~ <commit>.json'.
+    :return: Full path of the file written
+    """
+    os.makedirs(dir_to_write, exist_ok=True)
+
+    stamp = suite_results["created_at"].replace(":", "")
+    commit = suite_results["git_commit"] or "no-commit"
+    path_to_write = os.path.join(dir_to_write, f"{stamp} ~ {commit}.json")
+    with open(path_to_write, "w") as f:
+        json.dump(suite_results, f, indent=2)
+
+    return path_to_write
+
+
+def read_results(path_to_read: str) -> dict:
+    """
+    Reads in a run of the suite written by write_results().
+    """
+    with open(path_to_read, "r") as f:
+        return json.load(f)
+
+
+def compare_results(
+    baseline: dict, current: dict, threshold: float = 1.25, min_delta: float = 0.01
+) -> list:
+    """
+    Prints a comparison of two runs of the suite, case by case, flagging
+    cases that got slower by more than threshold times (and by more than
+    min_delta seconds, so sub-millisecond noise isn't flagged).
+    :param baseline: Run to compare against (output of run_suite())
+    :param current: Run to compare
+    :param threshold: Ratio of current to baseline seconds above which a
+    case is flagged as a regression
+    :param min_delta: Smallest slowdown in seconds that's flagged
+    :return: List of (benchmark, scale, ratio) of the regressions
+    """
+    baseline_seconds = {
+        (result["benchmark"], result["scale"]): result["seconds"]
+        for result in baseline["results"]
+    }
+
+    print(
+        f"<Comparing {current['created_at']} ({current['git_commit']}) against "
+        f"{baseline['created_at']} ({baseline['git_commit']})>"
+    )
+
+    regressions = []
+    for result in current["results"]:
+        key = (result["benchmark"], result["scale"])
+        if key not in baseline_seconds:
+            print(f"\t{key[0]:<24} {key[1]:>4}x  (not in baseline)")
+            continue
+
+        before, after = baseline_seconds[key], result["seconds"]
+        ratio = after / before if before else float("inf")
+
+        if ratio > threshold and after - before > min_delta:
+            flag = "REGRESSION"
+            regressions.append((key[0], key[1], round(ratio, 2)))
+        elif ratio < 1 / threshold:
+            flag = "faster"
+        else:
+            flag = ""
+
+        print(
+            f"\t{key[0]:<24} {key[1]:>4}x  {before:>9.4f}s -> {after:>9.4f}s  "
+            f"{ratio:>5.2f}x  {flag}"
+        )
+
+    print(f"<{len(regressions)} regressions above {threshold}x>")
+
+    return regressions
+
+
+def get_latest_file_listdir(dir_str: str, date_str: str) -> str:
+    """
+    Original FileHelper.get_latest_file_for_date(): lists the directory on
+    every lookup.
+    """
+    files = [file for file in os.listdir(dir_str) if date_str in file]
+
+    return os.path.join(dir_str, max(files))
+
+
+def benchmark_catalog(
+    list_of_n_dates: list = (100, 1_000, 3_000), n_lookups: int = 1_000
+) -> list:
+    """
+    Times latest-version lookups through the file catalog against listing
+    the directory, for directories of 3 versions per date. Once the catalog
+    has indexed a directory each lookup is a stat of the directory and an
+    index query, so its time per lookup shouldn't grow with the number of
+    files the way listing does.
+    :param list_of_n_dates: Directory sizes to time, in dates
+    :param n_lookups: Number of lookups to time at each size
+    :return: List of dictionaries of timings in seconds
+    """
+    results = []
+    cwd = os.getcwd()
+    for n_dates in list_of_n_dates:
+        # The catalog lives in the project root, outside the directories it
+        # indexes (its own writes would otherwise move their modified times)
+        with tempfile.TemporaryDirectory() as project_dir:
+            os.chdir(project_dir)
+            try:
+                dir_to_read = os.path.join(project_dir, "outputs_csv")
+                os.makedirs(dir_to_read)
+                dates = [
+                    str(d.date())
+                    for d in pd.date_range("2000-01-01", periods=n_dates, freq="D")
+                ]
+                for date_str in dates:
+                    for version in range(1, 4):
+                        file_nm = f"{date_str} ~ Combined Output ~ v{version}.csv"
+                        open(os.path.join(dir_to_read, file_nm), "w").close()
+
+                lookups = [dates[i % n_dates] for i in range(n_lookups)]
+                cat.get_distinct_dates(dir_to_read)  # indexes the directory
+
+                result = {
+                    "files": n_dates * 3,
+                    "catalog_seconds": time_func(
+                        lambda: [cat.get_latest_path(dir_to_read, d) for d in lookups],
+                        n_repeats=1,
+                    ),
+                    "listdir_seconds": time_func(
+                        lambda: [
+                            get_latest_file_listdir(dir_to_read, d) for d in lookups
+                        ],
+                        n_repeats=1,
+                    ),
+                }
+            finally:
+                os.chdir(cwd)
+
+        results.append(result)
+        print(
+            f"catalog lookups ({result['files']:,} files, {n_lookups:,} lookups): "
+            f"catalog {result['catalog_seconds']:.2f}s | "
+            f"listdir {result['listdir_seconds']:.2f}s"
+        )
+
+    return results
+
+
+def run_micro_benchmarks():
+    """
+    Runs the before/after comparisons of individual optimizations.
+    """
+    benchmark_parse_updated()
+    benchmark_parse_html()
+    benchmark_col_widths()
+    benchmark_catalog()
+    for n_products in [6, 50, 500]:
+        benchmark_floatify_cols(n_products)
+        benchmark_coalesce(n_products)
+
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ETL and combine steps on synthetic CME data"
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=list(suite_scales),
+        help="Multiples of the current product count / history length",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--only", nargs="+", default=None, help="Only run these benchmarks"
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="Results file to compare this run against; exits 1 on regressions",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        default=None,
+        help="Compare two results files without running the suite",
+    )
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument(
+        "--fixtures",
+        default=None,
+        help="Write synthetic CSVs and daily outputs for the first scale here",
+    )
+    parser.add_argument(
+        "--micro",
+        action="store_true",
+        help="Run the before/after micro-benchmarks instead of the suite",
+    )
+    args = parser.parse_args()
+
+    if args.micro:
+        run_micro_benchmarks()
+
+    elif args.fixtures:
+        scale = args.scales[0]
+        write_synthetic_fixtures(args.fixtures, suite_history_days * scale, scale)
+
+    elif args.compare:
+        regressions = compare_results(
+            read_results(args.compare[0]), read_results(args.compare[1]), args.threshold
+        )
+        sys.exit(1 if regressions else 0)
+
+    else:
+        suite_results = run_suite(args.scales, args.repeats, args.only)
+        print(f"<Results written to {write_results(suite_results)}>")
+
+        if args.baseline:
+            regressions = compare_results(
+                read_results(args.baseline), suite_results, args.threshold
+            )
+            sys.exit(1 if regressions else 0)
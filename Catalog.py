@@ -0,0 +1,217 @@
+# Imports
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+catalog_file_nm = "_catalog.sqlite"
+
+# 'date ~ name ~ vN.ext' (scraper outputs) and 'name date.ext' (ETL outputs)
+versioned_file_pattern = (
+    r"^(?P<date>\d{4}-\d{2}-\d{2}) ~ (?P<name>.+) ~ v(?P<version>\d+)\.\w+$"
+)
+dated_file_pattern = r"^(?P<name>.+) (?P<date>\d{4}-\d{2}-\d{2})\.\w+$"
+
+schema = [
+    "CREATE TABLE IF NOT EXISTS dirs (dir TEXT PRIMARY KEY, mtime REAL)",
+    "CREATE TABLE IF NOT EXISTS files (dir TEXT, file_name TEXT, date TEXT, "
+    "name TEXT, version INTEGER, mtime REAL, PRIMARY KEY (dir, file_name))",
+    "CREATE INDEX IF NOT EXISTS files_by_version ON files (dir, date, name, version)",
+    "CREATE INDEX IF NOT EXISTS files_by_mtime ON files (dir, mtime)",
+]
+
+
+def get_catalog_path() -> str:
+    """
+    Returns the full path to the catalog, which lives in the project root
+    next to the output directories it indexes.
+    """
+    return os.path.join(os.getcwd(), catalog_file_nm)
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Opens the catalog, creating its tables on first use.
+    """
+    conn = sqlite3.connect(get_catalog_path(), timeout=30)
+    with conn:
+        for statement in schema:
+            conn.execute(statement)
+
+    return conn
+
+
+def parse_file_name(file_name: str):
+    """
+    Splits a file name into its date, name and version.
+    :param file_name: Base file name
+    :return: Tuple of (date, name, version), with version None for ETL
+    outputs and all three None for names following neither convention
+    """
+    match = re.match(versioned_file_pattern, file_name)
+    if match:
+        return match.group("date"), match.group("name"), int(match.group("version"))
+
+    match = re.match(dated_file_pattern, file_name)
+    if match:
+        return match.group("date"), match.group("name"), None
+
+    return None, None, None
+
+
+def sync_dir(conn: sqlite3.Connection, dir_str: str) -> None:
+    """
+    Re-indexes every file in a directory from a single scan. Only needed the
+    first time a directory is queried or after it was changed by something
+    other than register_file() (e.g. files copied in or deleted by hand).
+    """
+    rows = []
+    with os.scandir(dir_str) as entries:
+        for entry in entries:
+            if entry.is_file():
+                rows.append(
+                    (dir_str, entry.name, *parse_file_name(entry.name))
+                    + (entry.stat().st_mtime,)
+                )
+
+    with conn:
+        conn.execute("DELETE FROM files WHERE dir = ?", (dir_str,))
+        conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO dirs VALUES (?, ?)",
+            (dir_str, os.stat(dir_str).st_mtime),
+        )
+
+    return None
+
+
+def ensure_synced(conn: sqlite3.Connection, dir_str: str) -> str:
+    """
+    Checks the directory's modified time against the one recorded at the
+    last sync or write, re-indexing the directory only when they differ.
+    :return: Normalized directory path used as the catalog key
+    """
+    dir_str = os.path.normpath(os.path.abspath(dir_str))
+    row = conn.execute("SELECT mtime FROM dirs WHERE dir = ?", (dir_str,)).fetchone()
+
+    if row is None or row[0] != os.stat(dir_str).st_mtime:
+        sync_dir(conn, dir_str)
+
+    return dir_str
+
+
+def resync(dir_str: str) -> None:
+    """
+    Re-indexes a directory on request, for changes that don't move the
+    directory's modified time and weren't made through register_file()
+    (e.g. a file rewritten in place by hand).
+    :param dir_str: Directory to re-index
+    :return: None
+    """
+    with closing(connect()) as conn:
+        sync_dir(conn, os.path.normpath(os.path.abspath(dir_str)))
+
+    return None
+
+
+def register_file(path_to_file: str) -> None:
+    """
+    Records a file just written by this project in the catalog, so the next
+    query doesn't need to re-scan its directory. Also used for files
+    rewritten in place, whose new modified time the directory's own
+    modified time doesn't reflect. A directory already in the catalog isn't
+    re-scanned: writers look up the next version (which syncs it) right
+    before writing, so the file written is the only change to record.
+    :param path_to_file: Full path to the file written
+    :return: None
+    """
+    dir_str, file_name = os.path.split(os.path.normpath(os.path.abspath(path_to_file)))
+
+    with closing(connect()) as conn:
+        row = conn.execute("SELECT 1 FROM dirs WHERE dir = ?", (dir_str,)).fetchone()
+        if row is None:
+            sync_dir(conn, dir_str)
+
+        else:
+            pass
+
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (dir_str, file_name, *parse_file_name(file_name))
+                + (os.path.getmtime(path_to_file),),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?)",
+                (dir_str, os.stat(dir_str).st_mtime),
+            )
+
+    return None
+
+
+def get_next_version(dir_str: str, name: str, date_str: str) -> int:
+    """
+    Returns the next version number for a name on a given date.
+    """
+    with closing(connect()) as conn:
+        dir_str = ensure_synced(conn, dir_str)
+        (version,) = conn.execute(
+            "SELECT MAX(version) FROM files WHERE dir = ? AND date = ? AND name = ?",
+            (dir_str, date_str, name),
+        ).fetchone()
+
+    return (version or 0) + 1
+
+
+def get_latest_path(dir_str: str, date_str: str, name: str = None) -> str:
+    """
+    Returns the full path to the highest version on a given date, optionally
+    for a single name.
+    """
+    query = "SELECT file_name FROM files WHERE dir = ? AND date = ?"
+    params = [date_str]
+    if name is not None:
+        query += " AND name = ?"
+        params.append(name)
+    query += " AND version IS NOT NULL ORDER BY version DESC LIMIT 1"
+
+    with closing(connect()) as conn:
+        dir_str = ensure_synced(conn, dir_str)
+        row = conn.execute(query, [dir_str, *params]).fetchone()
+
+    if row is None:
+        raise FileNotFoundError(f"No versioned files for {date_str} in {dir_str}")
+
+    return os.path.join(dir_str, row[0])
+
+
+def get_most_recent_path(dir_str: str) -> str:
+    """
+    Returns the full path to the most recently modified file in a directory.
+    """
+    with closing(connect()) as conn:
+        dir_str = ensure_synced(conn, dir_str)
+        row = conn.execute(
+            "SELECT file_name FROM files WHERE dir = ? ORDER BY mtime DESC LIMIT 1",
+            (dir_str,),
+        ).fetchone()
+
+    if row is None:
+        raise FileNotFoundError(f"No files in {dir_str}")
+
+    return os.path.join(dir_str, row[0])
+
+
+def get_distinct_dates(dir_str: str) -> list:
+    """
+    Returns the sorted distinct dates of the versioned files in a directory.
+    """
+    with closing(connect()) as conn:
+        dir_str = ensure_synced(conn, dir_str)
+        rows = conn.execute(
+            "SELECT DISTINCT date FROM files WHERE dir = ? AND version IS NOT NULL "
+            "ORDER BY date",
+            (dir_str,),
+        ).fetchall()
+
+    return [row[0] for row in rows]
@@ -0,0 +1,266 @@
+# Imports
+import os
+import re
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import ETL as etl
+import Schema as sch
+import Analytics as an
+import Instrument as ins
+
+changes_dir_nm = "etl_outputs_changes"
+changes_file_prefix = "CME Group Futures Changes"
+
+# Each day's changes file carries the prior settles of the last
+# rolling_window - 1 persisted days ('Settle T-1', ...), so the next day's
+# rolling statistics only need that one file
+rolling_window = 20
+window_cols = [f"Settle T-{lag}" for lag in range(1, rolling_window)]
+
+key_cols = ["Metric", "Month Rank"]
+change_cols = key_cols + [
+    "Collected Date",
+    "Prior Settle",
+    "Prev Collected Date",
+    "Prev Settle",
+    "Change",
+    "% Change",
+    "Rolling Days",
+    "Rolling Mean",
+    "Rolling Std",
+    "Rolling Min",
+    "Rolling Max",
+]
+
+
+def get_changes_path(date_str: str, dir_to_write: str = None) -> str:
+    """
+    Returns the full path of a collected date's changes file.
+    """
+    if not dir_to_write:
+        dir_to_write = os.path.join(os.getcwd(), changes_dir_nm)
+
+    else:
+        pass
+
+    return os.path.join(dir_to_write, f"{changes_file_prefix} {date_str}.parquet")
+
+
+def list_dates_in_dir(dir_to_read: str) -> list:
+    """
+    Returns the sorted collected dates of the .parquet files in a directory,
+    read from their file names.
+    """
+    if not os.path.isdir(dir_to_read):
+        return []
+
+    return sorted(
+        match.group(1)
+        for file in os.listdir(dir_to_read)
+        for match in [re.search(r"(\d{4}-\d{2}-\d{2})\.parquet$", file)]
+        if match
+    )
+
+
+def get_prev_date(date_str: str, dir_to_read: str = None) -> str:
+    """
+    Returns the latest collected date before date_str with a changes file,
+    or None for the first date.
+    """
+    dir_to_read = os.path.dirname(get_changes_path(date_str, dir_to_read))
+    earlier = [d for d in list_dates_in_dir(dir_to_read) if d < date_str]
+
+    return earlier[-1] if earlier else None
+
+
+def melt_output(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reshapes a daily output ('Data_Vertical') into one row per metric and
+    contract month quoted on it.
+    :param df: DataFrame with the template's columns and declared dtypes
+    :return: DataFrame of key_cols, 'Collected Date' and 'Prior Settle'
+    """
+    prices = df[an.curve_cols].to_numpy(dtype="float64")
+    long_df = pd.DataFrame(
+        {
+            "Metric": np.tile(an.curve_cols, len(df)),
+            "Month Rank": np.repeat(df["Month Rank"].to_numpy(), len(an.curve_cols)),
+            "Collected Date": np.repeat(
+                df["Collected Date"].to_numpy(), len(an.curve_cols)
+            ),
+            "Prior Settle": prices.ravel(),
+        }
+    )
+
+    return long_df[~np.isnan(prices.ravel())].reset_index(drop=True)
+
+
+def get_changes(long_df: pd.DataFrame, prev_df: pd.DataFrame = None):
+    """
+    Computes the day-over-day change of every metric and contract month
+    against the previously persisted day, and rolling statistics of its
+    prior settle over the last rolling_window persisted days. Contracts not
+    quoted on the previous day start a new window.
+    :param long_df: Output of melt_output()
+    :param prev_df: Previous day's output of this function, if any
+    :return: DataFrame of change_cols and window_cols
+    """
+    if prev_df is None:
+        prev_df = long_df.iloc[:0].reindex(columns=change_cols + window_cols)
+
+    else:
+        pass
+
+    prev_cols = ["Collected Date", "Prior Settle"] + window_cols[:-1]
+    prev_df = prev_df[key_cols + prev_cols].rename(
+        columns=dict(zip(prev_cols, ["Prev Collected Date"] + window_cols))
+    )
+    df = long_df.merge(prev_df, how="left", on=key_cols, sort=False)
+    df["Prev Settle"] = df["Settle T-1"].astype("float64")
+
+    df["Change"] = df["Prior Settle"] - df["Prev Settle"]
+    # Relative to the magnitude so the sign follows the change when the
+    # previous settle was negative (as WTI's was in April 2020)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["% Change"] = df["Change"] / df["Prev Settle"].abs() * 100
+
+    # (contract x window) matrix of prior settles, today first
+    window = df[["Prior Settle"] + window_cols].to_numpy(dtype="float64")
+    quoted = ~np.isnan(window)
+    n_days = quoted.sum(axis=1)
+    total = np.where(quoted, window, 0).sum(axis=1)
+    mean = total / n_days
+    sq_dev = np.where(quoted, (window - mean[:, None]) ** 2, 0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.where(n_days > 1, np.sqrt(sq_dev / (n_days - 1)), np.nan)
+
+    df["Rolling Days"] = n_days.astype("int32")
+    df["Rolling Mean"] = mean
+    df["Rolling Std"] = std
+    df["Rolling Min"] = np.where(quoted, window, np.inf).min(axis=1)
+    df["Rolling Max"] = np.where(quoted, window, -np.inf).max(axis=1)
+
+    df["Prev Collected Date"] = pd.to_datetime(df["Prev Collected Date"])
+    df[window_cols] = window[:, 1:]
+
+    return df[change_cols + window_cols]
+
+
+@ins.timed("changes.update")
+def update_changes(date_str: str, dir_to_read=None, dir_to_write=None) -> str:
+    """
+    Computes a collected date's changes from its daily .parquet output and
+    the previous persisted day's changes file only, so adding a day costs
+    the same however long the history is.
+    :param date_str: Collected date ('YYYY-MM-DD')
+    :param dir_to_read: Directory of daily .parquet outputs
+    :param dir_to_write: Directory of changes files
+    :return: Full path of the file written
+    """
+    path_to_read = etl.get_output_paths(date_str)["parquet"]
+    if dir_to_read:
+        path_to_read = os.path.join(dir_to_read, os.path.split(path_to_read)[-1])
+
+    else:
+        pass
+
+    long_df = melt_output(sch.enforce_schema(pd.read_parquet(path_to_read)))
+
+    prev_date = get_prev_date(date_str, dir_to_write)
+    prev_df = None
+    if prev_date is not None:
+        prev_df = pd.read_parquet(get_changes_path(prev_date, dir_to_write))
+
+    else:
+        pass
+
+    path_to_write = get_changes_path(date_str, dir_to_write)
+    os.makedirs(os.path.dirname(path_to_write), exist_ok=True)
+    get_changes(long_df, prev_df).to_parquet(path_to_write, index=False)
+
+    return path_to_write
+
+
+def get_changes_dates(start_date: str = None, end_date: str = None, dir_to_read=None):
+    """
+    Returns the sorted collected dates with a changes file between
+    start_date and end_date (inclusive, either open-ended).
+    """
+    dir_to_read = os.path.dirname(get_changes_path("", dir_to_read))
+
+    return [
+        date_str
+        for date_str in list_dates_in_dir(dir_to_read)
+        if (start_date is None or date_str >= start_date)
+        and (end_date is None or date_str <= end_date)
+    ]
+
+
+def read_changes(start_date: str = None, end_date: str = None, dir_to_read=None):
+    """
+    Reads the changes of a range of collected dates for reporting, without
+    the prior settles carried for the rolling window. '% Change' is left
+    blank where the previous settle was 0.
+    :param start_date: First collected date ('YYYY-MM-DD', inclusive)
+    :param end_date: Last collected date ('YYYY-MM-DD', inclusive)
+    :param dir_to_read: Directory of changes files
+    :return: DataFrame of change_cols in collected date order
+    """
+    dfs = [
+        pd.read_parquet(get_changes_path(date_str, dir_to_read), columns=change_cols)
+        for date_str in get_changes_dates(start_date, end_date, dir_to_read)
+    ]
+    if not dfs:
+        return pd.DataFrame(columns=change_cols)
+
+    df = pd.concat(dfs, ignore_index=True)
+    df["% Change"] = df["% Change"].replace([np.inf, -np.inf], np.nan)
+
+    return df
+
+
+def rebuild_changes(start_date: str = None, dir_to_read=None, dir_to_write=None):
+    """
+    Recomputes the changes of every date with a daily .parquet output from
+    start_date on, one day at a time in date order. Used after backfills,
+    which run dates out of order and can change a day later days build on.
+    :param start_date: First collected date to recompute ('YYYY-MM-DD')
+    :param dir_to_read: Directory of daily .parquet outputs
+    :param dir_to_write: Directory of changes files
+    :return: Number of dates recomputed
+    """
+    if not dir_to_read:
+        dir_to_read = os.path.join(os.getcwd(), "etl_outputs_parquet")
+
+    else:
+        pass
+
+    dates = [
+        date_str
+        for date_str in list_dates_in_dir(dir_to_read)
+        if start_date is None or date_str >= start_date
+    ]
+
+    print(f"<{len(dates)} dates of changes to recompute>")
+    for i, date_str in enumerate(dates, start=1):
+        update_changes(date_str, dir_to_read, dir_to_write)
+        print(f"\t[{i}/{len(dates)}] {date_str}")
+
+    return len(dates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute day-over-day changes from the daily outputs"
+    )
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--out-dir", default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rebuild_changes(args.start, args.dir, args.out_dir)
+    print(f"<Recomputed in {time.perf_counter() - start:.2f}s>")
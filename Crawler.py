@@ -1,11 +1,77 @@
 import FileHelper as fh
+import Instrument as ins
 
 from bs4 import BeautifulSoup
+import lxml.etree
+import lxml.html
 from selenium import webdriver
+from webdriver_manager.chrome import ChromeDriverManager
 import pandas as pd
+import os
 import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from functools import partial
+from http.client import HTTPException
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import urllib.parse
+import urllib.request
+import re
+import json
+
+# Columns of the CME quotes table as parsed by pd.read_html()
+quotes_table_cols = [
+    "Month",
+    "Options",
+    "Charts",
+    "Last",
+    "Change",
+    "Prior Settle",
+    "Open",
+    "High",
+    "Low",
+    "Volume",
+    "Hi / Low Limit",
+    "Updated",
+]
+
+# Columns the ETL needs for a scraped table to be usable
+required_quotes_cols = ["Month", "Prior Settle", "Updated"]
+
+# Mapping of CME quote JSON keys to quotes table columns
+quotes_json_cols = {
+    "expirationMonth": "Month",
+    "last": "Last",
+    "change": "Change",
+    "priorSettle": "Prior Settle",
+    "open": "Open",
+    "high": "High",
+    "low": "Low",
+    "volume": "Volume",
+    "updated": "Updated",
+}
+
+json_script_pattern = (
+    r"<script[^>]*type=[\"']application/(?:ld\+)?json[\"'][^>]*>(.*?)</script>"
+)
+
+# Errors that send a page from the fast path to the browser: failed requests
+# (urllib raises OSError subclasses) and pages that don't parse
+fast_path_errors = (OSError, HTTPException, ValueError, lxml.etree.ParserError)
+
+# Requests in flight (at most one) and the earliest time of the next request
+# for each host, shared by every session so that concurrent sessions never
+# request pages from a host faster than the serial crawler does
+_host_state = {}
+_host_condition = threading.Condition()
+
+user_agent = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/80.0.3987.149 Safari/537.36"
+)
 
 # TODO: Break Scroller into its own module
 
@@ -110,20 +176,23 @@ def simulate_scrolling(
     return None
 
 
-def html_from_javascript(browser: object, href: str):
+def html_from_javascript(browser: object, href: str, scroll: bool = True):
     """
     Retrieves html from web page given an href, delaying for javascript to
     fire and load data.
     :param browser: Webdriver browser object
     :param href: href of web page
+    :param scroll: Whether to pause and simulate scrolling before pulling
+    the page source
     :return: Pre-soup HTML string, String of timestamp
     """
     browser.get(href)
 
     # time_to_sleep = random.randint(lower, upper)
     print(f"\t<page opened>")
-    time.sleep(random.randint(3, 8))  # Sleeping a bit before scrolling
-    simulate_scrolling(browser)
+    if scroll:
+        time.sleep(random.randint(3, 8))  # Sleeping a bit before scrolling
+        simulate_scrolling(browser)
 
     html = browser.page_source
     current_tmstmp = str(datetime.today())
@@ -133,9 +202,39 @@ def html_from_javascript(browser: object, href: str):
 
 
 def df_from_html(html: str, href_name: str, current_tmstmp: str):
+    """
+    Parses the first table out of a page's HTML and loads it into a
+    DataFrame. Only that table is serialized and handed to pd.read_html();
+    the page itself is returned unchanged (no prettify) for archiving.
+    :param html: HTML string
+    :param href_name: Name of href for df column
+    :param current_tmstmp: String of current UTC timestamp
+    :return: DataFrame, raw HTML string
+    """
+    tree = lxml.html.fromstring(html)
+
+    df = None
+    for table in tree.iter("table"):
+        try:
+            df = pd.read_html(lxml.html.tostring(table, encoding="unicode"))[0]
+            break
+        except ValueError:  # table without any parsable rows
+            continue
+
+    if df is None:
+        raise ValueError(f"No tables found in HTML for {href_name}")
+
+    add_collection_cols(df, href_name, current_tmstmp)
+    print("\t<parsed HTML into dataframe>")
+
+    return df, html
+
+
+def df_from_html_soup(html: str, href_name: str, current_tmstmp: str):
     """
     Parses the first table out of a BeautifulSoup object set of HTML and loads
-    into DataFrame - returns df and prettified soup string.
+    into DataFrame - returns df and prettified soup string. Superseded by
+    df_from_html(); kept as the baseline for Benchmarks.benchmark_parse_html().
     :param html: Soup object
     :param href_name: Name of href for df column
     :param current_tmstmp: String of current UTC timestamp
@@ -147,13 +246,165 @@ def df_from_html(html: str, href_name: str, current_tmstmp: str):
     html_tables = soup.find_all("table")
     df = pd.read_html(str(html_tables))[0]
 
+    add_collection_cols(df, href_name, current_tmstmp)
+    print("\t<parsed HTML into dataframe>")
+
+    return df, soup_prettified
+
+
+def add_collection_cols(df: pd.DataFrame, href_name: str, current_tmstmp: str):
+    """
+    Adds the Metric ID, Collected Timestamp and Collected Date columns to a
+    freshly parsed quotes table (in-place).
+    """
     df.insert(0, "Metric ID", href_name)
     current_date, current_tmstmp = current_tmstmp.split(" ")
     df["Collected Timestamp"] = current_tmstmp
     df["Collected Date"] = current_date
-    print("\t<parsed HTML into dataframe>")
 
-    return df, soup_prettified
+    return None
+
+
+def html_from_url(href: str, timeout: int = 30):
+    """
+    Retrieves the html of a web page with a plain HTTP request (no browser,
+    so no javascript is run).
+    :param href: href of web page
+    :param timeout: Seconds to wait for a response
+    :return: HTML string, String of timestamp
+    """
+    request = urllib.request.Request(href, headers={"User-Agent": user_agent})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        charset = response.headers.get_content_charset() or "utf-8"
+        html = response.read().decode(charset, errors="replace")
+
+    current_tmstmp = str(datetime.today())
+    print("\t<downloaded page data without browser>")
+
+    return html, current_tmstmp
+
+
+def get_embedded_payloads(html: str) -> list:
+    """
+    Pulls every JSON payload embedded in <script type="application/ld+json">
+    or <script type="application/json"> blocks out of a page with a regex,
+    skipping any that don't parse.
+    :param html: HTML string
+    :return: List of parsed JSON objects
+    """
+    payloads = []
+    for block in re.findall(json_script_pattern, html, flags=re.S | re.I):
+        try:
+            payloads.append(json.loads(block))
+        except ValueError:
+            pass
+
+    return payloads
+
+
+def records_from_quotes_json(payloads: list) -> list:
+    """
+    Finds CME quote records ({"expirationMonth": ..., "priorSettle": ...})
+    anywhere within a list of JSON payloads and maps them onto the quotes
+    table's column names.
+    :param payloads: List of parsed JSON objects
+    :return: List of dictionaries keyed by quotes table column
+    """
+    records = []
+    to_visit = list(payloads)
+    while to_visit:
+        obj = to_visit.pop(0)
+        if isinstance(obj, dict):
+            if "expirationMonth" in obj and "priorSettle" in obj:
+                records.append(
+                    {
+                        col: re.sub(r"<br\s*/?>", " ", str(obj[key]))
+                        for key, col in quotes_json_cols.items()
+                        if key in obj
+                    }
+                )
+            else:
+                to_visit.extend(obj.values())
+        elif isinstance(obj, list):
+            to_visit.extend(obj)
+
+    return records
+
+
+def records_from_json_ld(payloads: list) -> list:
+    """
+    Maps the FinancialProduct 'mentions' of a JSON-LD payload onto the quotes
+    table's column names. CME only publishes the contract month and the
+    day's low/high there, so these records lack Prior Settle and Updated.
+    :param payloads: List of parsed JSON objects
+    :return: List of dictionaries keyed by quotes table column
+    """
+    records = []
+    for payload in payloads:
+        if not isinstance(payload, dict):
+            continue
+
+        for mention in payload.get("mentions", []):
+            if mention.get("@type") != "FinancialProduct":
+                continue
+
+            amount = mention.get("amount", {})
+            records.append(
+                {
+                    "Month": " ".join(mention.get("name", "").split(" ")[:2]),
+                    "Low": amount.get("minValue", "-"),
+                    "High": amount.get("maxValue", "-"),
+                }
+            )
+
+    return records
+
+
+def df_from_records(records: list) -> pd.DataFrame:
+    """
+    Builds a DataFrame shaped like the pd.read_html() quotes table (duplicated
+    two-level header and a trailing legend row that combine_scraped_dfs()
+    strips off) from a list of records, filling unknown values with '-'.
+    :param records: List of dictionaries keyed by quotes table column
+    :return: DataFrame
+    """
+    df = pd.DataFrame(records).reindex(columns=quotes_table_cols).fillna("-")
+    legend = pd.DataFrame([["Legend"] * len(quotes_table_cols)], columns=df.columns)
+    df = pd.concat([df, legend], ignore_index=True)
+    df.columns = pd.MultiIndex.from_arrays([quotes_table_cols, quotes_table_cols])
+
+    return df
+
+
+def df_from_html_fast(html: str, href_name: str, current_tmstmp: str):
+    """
+    Browserless extraction of the quotes table from a page, trying embedded
+    quote JSON, then JSON-LD, then any static <table>. A candidate is only
+    accepted if it has every column in required_quotes_cols populated.
+    :param html: HTML string
+    :param href_name: Name of href for df column
+    :param current_tmstmp: String of current UTC timestamp
+    :return: DataFrame, or None if the page yields no usable table
+    """
+    payloads = get_embedded_payloads(html)
+
+    for records in (records_from_quotes_json(payloads), records_from_json_ld(payloads)):
+        has_required = records and all(
+            col in record for record in records for col in required_quotes_cols
+        )
+        if has_required:
+            df = df_from_records(records)
+            add_collection_cols(df, href_name, current_tmstmp)
+            print("\t<parsed embedded JSON into dataframe>")
+            return df
+
+    if re.search(r"<table", html, flags=re.I):
+        df, _ = df_from_html(html, href_name, current_tmstmp)
+        header = [col[0] if isinstance(col, tuple) else col for col in df.columns]
+        if all(col in header for col in required_quotes_cols) and len(df) > 1:
+            return df
+
+    return None
 
 
 def get_dict_of_dfs(
@@ -178,10 +429,13 @@ def get_dict_of_dfs(
 
         print(f"Scraping started for: {href_name}")
 
-        raw_html, current_tmstmp = html_from_javascript(browser, href)
+        with ins.stage("scrape.product", product=href_name):
+            with ins.stage("scrape.fetch", product=href_name, path="browser"):
+                raw_html, current_tmstmp = html_from_javascript(browser, href)
 
-        df, prettified_soup = df_from_html(raw_html, href_name, current_tmstmp)
-        fh.save_raw_file(prettified_soup, href_name, "outputs_txt")
+            with ins.stage("scrape.parse", product=href_name, path="browser"):
+                df, raw_html = df_from_html(raw_html, href_name, current_tmstmp)
+            fh.save_raw_file(raw_html, href_name, "outputs_txt")
 
         dict_of_dfs[href_name] = df
 
@@ -200,3 +454,272 @@ def get_dict_of_dfs(
 
 # TODO: Add  to the end of get_dict_of_dfs() function to close
 #   the browser once the job is finished
+
+
+def make_browser(headless: bool = False) -> webdriver.Chrome:
+    """
+    Instantiates a Chrome browser, preferring the local chromedriver.exe and
+    falling back to the webdriver-manager install.
+    :param headless: Whether to run Chrome without a window
+    :return: Webdriver browser object
+    """
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless")
+        options.add_argument("--window-size=1920,1080")
+
+    try:
+        browser = webdriver.Chrome(
+            os.path.join(os.getcwd(), r"chromedriver.exe"), options=options
+        )
+    except:
+        browser = webdriver.Chrome(ChromeDriverManager().install(), options=options)
+
+    if not headless:
+        browser.maximize_window()
+
+    return browser
+
+
+@contextmanager
+def host_slot(
+    href: str, session_id: int, minutes_pause_floor=2, minutes_pause_ceiling=5
+):
+    """
+    Waits until no other session is requesting a page from href's host and
+    the randomized pause after its previous request has passed, then holds
+    the host for the request. This is the pacing get_dict_of_dfs() gives a
+    single session, applied across all of them.
+    :param href: href of web page about to be requested
+    :param session_id: Number of the session (for printing)
+    :param minutes_pause_floor: Lower bound of the pause after each request
+    (in minutes)
+    :param minutes_pause_ceiling: Upper bound of the pause after each request
+    (in minutes)
+    """
+    host = urllib.parse.urlsplit(href).netloc
+
+    with _host_condition:
+        state = _host_state.setdefault(host, {"busy": False, "next_at": 0.0})
+        while state["busy"] or state["next_at"] > time.monotonic():
+            wait = None if state["busy"] else state["next_at"] - time.monotonic()
+            _host_condition.wait(timeout=wait)
+        state["busy"] = True
+
+    try:
+        yield
+
+    finally:
+        time_to_sleep = random.randint(
+            int(minutes_pause_floor * 60), int(minutes_pause_ceiling * 60)
+        )
+        print(
+            f"\t<session {session_id} done with {host} - next request to it in "
+            f"{time_to_sleep} seconds>"
+        )
+        with _host_condition:
+            state["busy"] = False
+            state["next_at"] = time.monotonic() + time_to_sleep
+            _host_condition.notify_all()
+
+
+def scrape_in_session(
+    session_id: int,
+    dict_of_hrefs: dict,
+    browser_factory=make_browser,
+    minutes_page_sleep_floor=2,
+    minutes_page_sleep_ceiling=5,
+    scroll=True,
+    fast_path=False,
+) -> dict:
+    """
+    Scrapes a subset of hrefs in order with its own browser session. Every
+    request goes through host_slot(), so a host gets the same randomized
+    pause between requests as get_dict_of_dfs() gives it, however many
+    sessions are running. With fast_path, each page is first fetched without
+    a browser and only rendered in Chrome (started on first use) when the
+    request fails or df_from_html_fast() yields no table; the render happens
+    in the same hold of the host, so a fallback costs no extra pause.
+    :param session_id: Number of the session (for printing)
+    :param dict_of_hrefs: Dictionary of names to hrefs for this session
+    :param browser_factory: Callable returning a new webdriver browser object
+    :param minutes_page_sleep_floor: Lower bound of time to sleep between
+    requests to a host (in minutes)
+    :param minutes_page_sleep_ceiling: Upper bound of time to sleep between
+    requests to a host (in minutes)
+    :param scroll: Whether to simulate scrolling on each page
+    :param fast_path: Whether to try the browserless extraction first
+    :return: Dictionary of DataFrames
+    """
+    pause = (minutes_page_sleep_floor, minutes_page_sleep_ceiling)
+
+    dict_of_dfs = {}
+    browser = None
+    try:
+        for href_name, href in dict_of_hrefs.items():
+
+            print(f"Scraping started for: {href_name} (session {session_id})")
+
+            with ins.stage("scrape.product", product=href_name, session=session_id):
+                with host_slot(href, session_id, *pause):
+                    df = None
+                    if fast_path:
+                        try:
+                            with ins.stage(
+                                "scrape.fetch", product=href_name, path="fast"
+                            ):
+                                raw_html, current_tmstmp = html_from_url(href)
+                            with ins.stage(
+                                "scrape.parse", product=href_name, path="fast"
+                            ):
+                                df = df_from_html_fast(
+                                    raw_html, href_name, current_tmstmp
+                                )
+                        except fast_path_errors as e:
+                            print(f"\t<fast path failed for {href_name}: {e}>")
+
+                    if df is None:
+                        if browser is None:
+                            browser = browser_factory()
+
+                        with ins.stage(
+                            "scrape.fetch", product=href_name, path="browser"
+                        ):
+                            raw_html, current_tmstmp = html_from_javascript(
+                                browser, href, scroll
+                            )
+                    else:
+                        pass
+
+                if df is None:
+                    with ins.stage("scrape.parse", product=href_name, path="browser"):
+                        df, raw_html = df_from_html(raw_html, href_name, current_tmstmp)
+                else:
+                    pass
+                fh.save_raw_file(raw_html, href_name, "outputs_txt")
+
+            dict_of_dfs[href_name] = df
+            print(f"\t<data collection ended for {href_name}>\n")
+
+    finally:
+        if browser is not None:
+            browser.quit()
+
+    return dict_of_dfs
+
+
+def get_dict_of_dfs_concurrent(
+    dict_of_hrefs,
+    browser_factory=make_browser,
+    n_sessions=1,
+    minutes_page_sleep_floor=2,
+    minutes_page_sleep_ceiling=5,
+    scroll=True,
+    fast_path=False,
+):
+    """
+    Concurrent version of get_dict_of_dfs(): hrefs are dealt round-robin to
+    n_sessions independent browser sessions that run in parallel threads.
+    Requests to each host are still made one at a time with the same
+    randomized pause between them as the serial crawler (see host_slot()),
+    so the per-site request rate doesn't change with n_sessions; sessions
+    only overlap the parsing and browser start-up around those requests, and
+    requests to different hosts. The defaults (one session, every page
+    rendered in a visible browser) reproduce get_dict_of_dfs().
+    :param dict_of_hrefs: Dictionary of names to hrefs
+    :param browser_factory: Callable returning a new webdriver browser object
+    :param n_sessions: Maximum number of concurrent browser sessions
+    :param minutes_page_sleep_floor: Lower bound of time to sleep between
+    requests to a host (in minutes)
+    :param minutes_page_sleep_ceiling: Upper bound of time to sleep between
+    requests to a host (in minutes)
+    :param scroll: Whether to simulate scrolling on each page
+    :param fast_path: Whether to try the browserless extraction first
+    :return: Dictionary of DataFrames in dict_of_hrefs order
+    """
+    names = list(dict_of_hrefs.keys())
+    n_sessions = max(1, min(n_sessions, len(names)))
+
+    session_hrefs = [
+        {name: dict_of_hrefs[name] for name in names[i::n_sessions]}
+        for i in range(n_sessions)
+    ]
+
+    def run_session(session_id):
+        return scrape_in_session(
+            session_id,
+            session_hrefs[session_id],
+            browser_factory,
+            minutes_page_sleep_floor,
+            minutes_page_sleep_ceiling,
+            scroll,
+            fast_path,
+        )
+
+    with ThreadPoolExecutor(max_workers=n_sessions) as executor:
+        results = list(executor.map(run_session, range(n_sessions)))
+
+    scraped = {k: v for result in results for k, v in result.items()}
+
+    return {name: scraped[name] for name in names}
+
+
+def start_archive_server(dir_to_serve="outputs_txt", port=0):
+    """
+    Serves the archived raw pages as HTML from a local HTTP server running
+    in a background thread, for exercising the scrapers without hitting
+    the live site.
+    :param dir_to_serve: Directory of archived pages to serve
+    :param port: Port to listen on (0 to pick a free one)
+    :return: Server object (call .shutdown() when done), base url
+    """
+
+    class ArchiveHandler(SimpleHTTPRequestHandler):
+        extensions_map = {
+            **SimpleHTTPRequestHandler.extensions_map,
+            ".txt": "text/html; charset=utf-8",
+        }
+
+        def log_message(self, *args):
+            pass
+
+    handler = partial(ArchiveHandler, directory=os.path.abspath(dir_to_serve))
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"<serving {dir_to_serve} at {base_url}>")
+
+    return server, base_url
+
+
+def get_archive_hrefs(base_url: str, dir_served="outputs_txt", date_str=None):
+    """
+    Builds a names: hrefs dictionary pointing at the latest archived page of
+    each product (optionally for a single date) on a start_archive_server().
+    :param base_url: Base url returned by start_archive_server()
+    :param dir_served: Directory being served
+    :param date_str: Date to restrict to (e.g. '2020-04-10')
+    :return: Dictionary of names to hrefs
+    """
+    latest = {}
+    for file in sorted(os.listdir(dir_served)):
+        if not file.endswith(".txt") or file.count(" ~ ") != 2:
+            continue
+
+        file_date, name, version = os.path.splitext(file)[0].split(" ~ ")
+        if date_str and file_date != date_str:
+            continue
+
+        rank = (file_date, int(version.lstrip("v")))
+        if name not in latest or latest[name][1] <= rank:
+            latest[name] = (file, rank)
+
+    hrefs = {
+        name: f"{base_url}/{urllib.parse.quote(file)}"
+        for name, (file, _) in latest.items()
+    }
+
+    return hrefs
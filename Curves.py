@@ -0,0 +1,245 @@
+# Imports
+import os
+import time
+import bisect
+import argparse
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+import PriceStore as ps
+
+# Snapshots (every metric's curve on one collected date) are kept in a
+# least-recently-used cache bounded by their total size in memory; the curves
+# handed out are the cached Series themselves, so they aren't to be modified
+max_cache_bytes = 64 * 1024**2
+
+_cache = OrderedDict()
+_cache_stats = {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+_partitions = {}
+_lock = threading.Lock()
+
+
+def get_mtime_ns(path: str) -> int:
+    """
+    Returns the modified time of a path in nanoseconds. Adding a partition
+    changes the store directory's, appending to one changes the partition's.
+    """
+    return os.stat(path).st_mtime_ns
+
+
+def get_partitions(store_dir: str = None) -> list:
+    """
+    Returns the store's collected dates, re-listing them only when a new date
+    has been ingested since the last call. Snapshots of dates that are no
+    longer in the store are dropped from the cache.
+    """
+    store_dir = ps.get_store_dir(store_dir)
+    mtime_ns = get_mtime_ns(store_dir)
+
+    with _lock:
+        listed = _partitions.get(store_dir)
+        if listed is not None and listed[0] == mtime_ns:
+            return listed[1]
+
+    dates = ps.list_partitions(store_dir)
+    with _lock:
+        _partitions[store_dir] = (mtime_ns, dates)
+        for key in [key for key in _cache if key[0] == store_dir]:
+            if key[1] not in dates:
+                evict(key)
+
+    return dates
+
+
+def resolve_as_of(date_str: str, store_dir: str = None) -> str:
+    """
+    Returns the latest collected date on or before date_str.
+    """
+    dates = get_partitions(store_dir)
+    idx = bisect.bisect_right(dates, date_str)
+    if not idx:
+        raise KeyError(f"No prices stored on or before {date_str}")
+
+    return dates[idx - 1]
+
+
+def evict(key: tuple) -> None:
+    """
+    Removes a snapshot from the cache; callers hold _lock.
+    """
+    _, _, n_bytes = _cache.pop(key)
+    _cache_stats["bytes"] -= n_bytes
+
+    return None
+
+
+def evict_to_size() -> None:
+    """
+    Evicts the least recently used snapshots until the cache holds no more
+    than max_cache_bytes, keeping at least the most recent one; callers hold
+    _lock.
+    """
+    while _cache_stats["bytes"] > max_cache_bytes and len(_cache) > 1:
+        evict(next(iter(_cache)))
+        _cache_stats["evictions"] += 1
+
+    return None
+
+
+def read_snapshot(date_str: str, store_dir: str) -> dict:
+    """
+    Reads a collected date's partition (only the columns curves need) into
+    the curve of every metric quoted on it.
+    :return: Dictionary of metric_id: Series of prior settles indexed by
+    contract month (YYYYMM)
+    """
+    df = ps.read_partition(
+        date_str, ["metric_id", "contract_month", "prior_settle"], store_dir
+    )
+    df = df[df["prior_settle"].notna()].sort_values("contract_month")
+
+    return {
+        metric_id: pd.Series(
+            group["prior_settle"].to_numpy(),
+            index=pd.Index(group["contract_month"].to_numpy(), name="contract_month"),
+            name=f"{metric_id} {date_str}",
+        )
+        for metric_id, group in df.groupby("metric_id", sort=True)
+    }
+
+
+def get_snapshot(date_str: str, store_dir: str = None) -> dict:
+    """
+    Returns every metric's curve on a collected date from the cache, reading
+    the date's partition on a miss or when it has been appended to since it
+    was cached. The least recently used snapshots are evicted once the cache
+    holds more than max_cache_bytes.
+    :param date_str: Collected date ('YYYY-MM-DD')
+    :param store_dir: Store directory
+    :return: Dictionary of metric_id: curve, shared with the cache
+    """
+    store_dir = ps.get_store_dir(store_dir)
+    key = (store_dir, date_str)
+    mtime_ns = get_mtime_ns(os.path.join(store_dir, ps.partition_prefix + date_str))
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == mtime_ns:
+            _cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            evict_to_size()
+            return cached[1]
+
+    snapshot = read_snapshot(date_str, store_dir)
+    n_bytes = sum(int(curve.memory_usage(deep=True)) for curve in snapshot.values())
+
+    with _lock:
+        _cache_stats["misses"] += 1
+        if key in _cache:
+            evict(key)
+        _cache[key] = (mtime_ns, snapshot, n_bytes)
+        _cache_stats["bytes"] += n_bytes
+        evict_to_size()
+
+    return snapshot
+
+
+def get_curve(metric_id: str, as_of_date: str, store_dir: str = None) -> pd.Series:
+    """
+    Returns a metric's forward curve as of a date: the prior settle of every
+    contract month quoted on the latest collected date on or before it.
+    :param metric_id: Metric (e.g. 'WTI')
+    :param as_of_date: Date ('YYYY-MM-DD')
+    :param store_dir: Store directory
+    :return: Series of prior settles indexed by contract month (YYYYMM),
+    named after the metric and the collected date used; shared with the
+    cache, so not to be modified
+    """
+    store_dir = ps.get_store_dir(store_dir)
+    date_str = resolve_as_of(as_of_date, store_dir)
+    snapshot = get_snapshot(date_str, store_dir)
+    if metric_id not in snapshot:
+        raise KeyError(f"No {metric_id} prices stored for {date_str}")
+
+    return snapshot[metric_id]
+
+
+def get_curve_matrix(
+    metric_id: str,
+    start_date: str = None,
+    end_date: str = None,
+    by_tenor: bool = False,
+    store_dir: str = None,
+) -> pd.DataFrame:
+    """
+    Returns a metric's curve on every collected date in a range, reading only
+    the partitions in the range that aren't cached yet.
+    :param metric_id: Metric (e.g. 'WTI')
+    :param start_date: First collected date ('YYYY-MM-DD', inclusive)
+    :param end_date: Last collected date ('YYYY-MM-DD', inclusive)
+    :param by_tenor: Boolean value indicating whether to label columns by
+    tenor (1 = first quoted contract) instead of by contract month
+    :param store_dir: Store directory
+    :return: DataFrame indexed by collected date with a column per contract
+    month (YYYYMM) or tenor
+    """
+    store_dir = ps.get_store_dir(store_dir)
+
+    curves = {}
+    for date_str in get_partitions(store_dir):
+        if start_date is not None and date_str < start_date:
+            continue
+        if end_date is not None and date_str > end_date:
+            continue
+
+        curve = get_snapshot(date_str, store_dir).get(metric_id)
+        if curve is None:
+            continue
+
+        if by_tenor:
+            curve = pd.Series(curve.to_numpy(), index=range(1, len(curve) + 1))
+        curves[pd.Timestamp(date_str)] = curve
+
+    matrix = pd.DataFrame.from_dict(curves, orient="index").sort_index(axis=1)
+    matrix.index.name = "collected_date"
+    matrix.columns.name = "tenor" if by_tenor else "contract_month"
+
+    return matrix
+
+
+def invalidate(dates: list = None, store_dir: str = None) -> None:
+    """
+    Drops cached snapshots (of some dates, or all of them) and the cached
+    list of dates, e.g. after files in the store were changed by hand.
+    """
+    store_dir = ps.get_store_dir(store_dir)
+
+    with _lock:
+        _partitions.pop(store_dir, None)
+        for key in [key for key in _cache if key[0] == store_dir]:
+            if dates is None or key[1] in dates:
+                evict(key)
+
+    return None
+
+
+def get_cache_info() -> dict:
+    """
+    Returns the number of cached snapshots, their size and hit/miss counts.
+    """
+    with _lock:
+        return {"entries": len(_cache), "max_bytes": max_cache_bytes, **_cache_stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a forward curve")
+    parser.add_argument("metric_id")
+    parser.add_argument("as_of_date")
+    parser.add_argument("--store-dir", default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    curve = get_curve(args.metric_id, args.as_of_date, args.store_dir)
+    print(curve.to_string())
+    print(f"<{len(curve)} contracts in {time.perf_counter() - start:.4f}s>")
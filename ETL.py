@@ -1,15 +1,84 @@
 # Imports
 import os
+import io
+import shutil
 import pandas as pd
 import calendar
 from datetime import datetime as dt
 import re
 import numpy as np
+import threading
 from collections import Counter
+from functools import lru_cache
+
+import Catalog as cat
+import Schema as sch
+import Instrument as ins
+import PriceStore as ps
+import Analytics as an
 
 # Creating dictionary of abbreviated month to month-index number
 month_to_index = {v: str(k).zfill(2) for k, v in enumerate(calendar.month_abbr) if k}
 
+# Regex for the 'updated' column, e.g. '20:24:53 CT  09 Apr 2020'
+updated_pattern = (
+    r"^\s*(?P<time_military>\d{1,2}:\d{2}:\d{2})\s+(?P<time_zone>\S+)\s+"
+    r"(?P<date>\d{1,2} [A-Za-z]{3} \d{4})\s*$"
+)
+
+# Regex for contract months in any order/delimiter, e.g. 'MAY 2020', 'Feb-31'
+# or '2031-FEB'
+contract_month_pattern = (
+    r"^\s*(?:(?P<year_first>\d+)[- ](?P<month_last>[A-Za-z]+)"
+    r"|(?P<month_first>[A-Za-z]+)[- ](?P<year_last>\d+))\s*$"
+)
+
+# Components the 'updated' column is exploded into
+cols_to_explode = [
+    "last_updated_date",
+    "last_updated_time_military",
+    "last_updated_time_local",
+    "last_updated_time_zone",
+]
+
+# Values parse_last_updated() gives the exploded columns of an 'updated' value
+# it can't parse; they're non-null, so coalesce_multiple() takes them as the
+# metric's value for the contract month
+unparsed_updated_values = {
+    "last_updated_date": sch.date_placeholders["Updated Date"],
+    "last_updated_time_local": "-",
+    "last_updated_time_zone": "-",
+}
+
+# Sets of pivoted columns (by pattern) coalesced into individual fields
+patterns_to_find = [
+    ".*_zone:",
+    "collected_date: ",
+    "last_updated_date: ",
+    ".*time_local:",
+]
+coalesced_col_nms = [
+    "updated_time_zone",
+    "collected_date",
+    "updated_date",
+    "updated_time",
+]
+
+# Folder the ETL outputs are copied to for sharing
+dropbox_dir = r"D:\Dropbox\1 - CME Group Futures Files"
+
+# Whether run_pipeline() also appends each scrape to the long-format price
+# store (see PriceStore.py)
+append_to_price_store = True
+
+# Whether run_pipeline() also computes spreads, cracks and curve structure
+# (see Analytics.py) into tabs of the workbook and their own .parquet files
+compute_analytics = True
+
+# Serializes writes to the Dropbox folder; ETL_All swaps in a lock shared
+# across its worker processes when backfilling dates in parallel
+dropbox_write_lock = threading.Lock()
+
 
 def standardize_excel_date_str(val):
     """
@@ -156,20 +225,129 @@ def explode_col_by_func(
 # TODO: Modularize the above two functions (column-exploder)
 
 
+def parse_last_updated_col(ser: pd.Series) -> pd.DataFrame:
+    """
+    Vectorized equivalent of parse_last_updated() that splits the whole
+    'updated' column with a single regex and returns typed columns rather
+    than a tilda-delimited string per row. Only the distinct values are
+    parsed (a scrape shares a handful of timestamps across every contract)
+    and then broadcast back to the full column. Values that can't be parsed
+    are returned as NaT/NaN.
+    :param ser: Series of 'updated' strings
+    :return: DataFrame of date (datetime64), time_military (timedelta64),
+    time_local (string) and time_zone (category) columns
+    """
+    codes, uniques = pd.factorize(ser.astype(str))
+    parts = pd.Series(uniques).str.extract(updated_pattern)
+
+    time_of_day = pd.to_datetime(
+        parts["time_military"], format="%H:%M:%S", errors="coerce"
+    )
+
+    parsed = pd.DataFrame(
+        {
+            "date": pd.to_datetime(parts["date"], format="%d %b %Y", errors="coerce"),
+            "time_military": pd.to_timedelta(parts["time_military"], errors="coerce"),
+            "time_local": time_of_day.dt.strftime("%I:%M %p"),
+            "time_zone": parts["time_zone"].astype("category"),
+        }
+    )
+
+    parsed = parsed.take(codes)
+    parsed.index = ser.index
+
+    return parsed
+
+
+def explode_updated_col(
+    df: pd.DataFrame, old_col: str, new_cols: list, drop_old_col: bool = True
+) -> pd.DataFrame:
+    """
+    Explodes the 'updated' column into date, military time, local time and
+    time zone columns using parse_last_updated_col().
+    :param df: DataFrame to perform operation on
+    :param old_col: Name of old column
+    :param new_cols: List of 4 new column names (date, military time, local
+    time, time zone)
+    :param drop_old_col: Boolean value of whether to drop old column value
+    or not
+    :return: DataFrame with explosion operation performed
+    """
+    parsed = parse_last_updated_col(df[old_col])
+    parsed.columns = new_cols
+    df[new_cols] = parsed
+
+    if drop_old_col:
+        df.drop(columns=[old_col], inplace=True)
+    else:
+        pass
+
+    return df
+
+
+def pivot_on_metric_id(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pivots the exploded scraping output to one row per contract month with a
+    'field: metric_id' column for every field of every metric.
+    :param df: Output of read_csv_from_path() with the 'updated' column
+    exploded
+    :return: Pivoted DataFrame with 'month' as its first column
+    """
+    df_pivoted = df.pivot(
+        index="month", columns="metric_id", values=df.columns.tolist()[2:]
+    )
+
+    # Combining multi-index into single column index
+    df_pivoted.columns = [f"{col[0]}: {col[1]}" for col in df_pivoted.columns]
+
+    df_pivoted.index.name = "month"
+    df_pivoted.reset_index(inplace=True)
+    df_pivoted.drop(
+        columns=[col for col in df_pivoted.columns if "month:" in col], inplace=True
+    )
+
+    return df_pivoted
+
+
+def explode_scraped_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Explodes the 'updated' column of read_csv_from_path()'s output into the
+    date, local time and time zone of each quote (as strings, ready to be
+    pivoted), giving one long-format row per metric and contract month.
+    Values with any part that can't be parsed get the same placeholders as
+    parse_last_updated() gives them (see unparsed_updated_values), so they
+    coalesce exactly as they always have.
+    :param df: Output of read_csv_from_path()
+    :return: DataFrame of metric_id, month, prior_settle, collected_date and
+    the last_updated_* columns
+    """
+    df = explode_updated_col(df, "updated", cols_to_explode)
+
+    df.drop(columns=["last_updated_time_military"], inplace=True)
+    df["last_updated_date"] = df["last_updated_date"].dt.strftime("%Y-%m-%d")
+    df["last_updated_time_zone"] = df["last_updated_time_zone"].astype(object)
+
+    unparsed_cols = list(unparsed_updated_values)
+    unparsed = df[unparsed_cols].isna().any(axis=1)
+    df.loc[unparsed, unparsed_cols] = list(unparsed_updated_values.values())
+
+    return df
+
+
 def get_coalesced_col(df1, cols_to_coalesce):
     """
     Quick & dirty custom function to SQL-style coalesce multiple columns into
-    a single field.
-    :param df1:
-    :param cols_to_coalesce:
-    :return:
+    a single field, taking the first non-null value of each row from the
+    columns as a single NumPy block.
+    :param df1: DataFrame containing cols_to_coalesce
+    :param cols_to_coalesce: Columns to coalesce, in order of precedence
+    :return: Coalesced Series named after the first column
     """
-    i = iter(cols_to_coalesce)
-    column_name = next(i)
-    coalesced = df1[column_name]
-    for column_name in i:
-        coalesced = coalesced.fillna(df1[column_name])
-    return coalesced
+    block = df1[list(cols_to_coalesce)].to_numpy()
+    first_valid = pd.notna(block).argmax(axis=1)
+    coalesced = block[np.arange(len(block)), first_valid]
+
+    return pd.Series(coalesced, index=df1.index, name=cols_to_coalesce[0])
 
 
 def coalesce(
@@ -187,7 +365,7 @@ def coalesce(
     :param drop_coalesced_cols: Boolean value indicating whether or not to
     coalesce columns
     """
-    df[col_to_coalesce_into] = get_coalesced_col(df.copy(), cols_to_coalesce)
+    df[col_to_coalesce_into] = get_coalesced_col(df, cols_to_coalesce)
 
     if drop_coalesced_cols:
         df.drop(columns=cols_to_coalesce, inplace=True)
@@ -214,13 +392,19 @@ def coalesce_multiple(
     :param drop_coalesced_cols: Boolean value indicating whether or not to
     columns that have been coalesced
     """
-    sets_of_cols = []
-    for patt in col_patterns_to_coalesce:
-        cols = [col for col in df.columns if re.findall(patt, col) != []]
-        sets_of_cols.append(cols)
+    sets_of_cols = [
+        df.columns[df.columns.str.contains(patt, regex=True)].tolist()
+        for patt in col_patterns_to_coalesce
+    ]
 
     for cols, col_nm in zip(sets_of_cols, col_nms_to_coalesce_into):
-        coalesce(df, cols, col_nm, drop_coalesced_cols)
+        coalesce(df, cols, col_nm, drop_coalesced_cols=False)
+
+    # Dropping every coalesced column at once rather than once per set
+    if drop_coalesced_cols:
+        df.drop(columns=[col for cols in sets_of_cols for col in cols], inplace=True)
+    else:
+        pass
 
     return None
 
@@ -270,6 +454,50 @@ def get_numeric_time_index(val):
 # problem is in both month_index and hash functions
 
 
+def get_month_rank_col(ser: pd.Series) -> pd.Series:
+    """
+    Vectorized equivalent of get_numeric_time_index() returning the YYYYMM
+    rank of every contract month as int32. Distinct months are parsed once
+    with a single regex and broadcast back to the full column.
+    :param ser: Series of contract months ('MAY 2020', 'Feb-31', '2031-FEB')
+    :return: int32 Series of YYYYMM values
+    """
+    codes, uniques = pd.factorize(ser.astype(str))
+    parts = pd.Series(uniques).str.extract(contract_month_pattern)
+
+    year = parts["year_first"].fillna(parts["year_last"]).str[-2:]
+    month = parts["month_last"].fillna(parts["month_first"]).str.title()
+    month_index = month.map(month_to_index)
+
+    invalid = year.isna() | month_index.isna()
+    if invalid.any():
+        raise ValueError(
+            f"Could not parse contract months: {list(uniques[invalid.to_numpy()])}"
+        )
+
+    ranks = (2000 + year.astype(int)) * 100 + month_index.astype(int)
+
+    return pd.Series(ranks.to_numpy(dtype="int32")[codes], index=ser.index)
+
+
+def get_key_col(child: pd.Series, parent: pd.Series, sep: str = " - ") -> np.ndarray:
+    """
+    Builds '<child> - <parent>' keys. The prefix is formatted once per
+    distinct child value and the numeric parent is stringified by NumPy;
+    the final concatenation of object arrays still joins one pair of Python
+    strings per row (which measured faster than np.char.add() on fixed-width
+    arrays, as that has to convert its result back to objects).
+    :param child: Series making up the start of the key (e.g. collected date)
+    :param parent: Integer Series making up the end of the key
+    :param sep: Separator between the two
+    :return: Object array of keys
+    """
+    codes, uniques = pd.factorize(child.astype(str))
+    prefixes = np.array([f"{val}{sep}" for val in uniques], dtype=object)
+
+    return prefixes[codes] + parent.to_numpy().astype(str).astype(object)
+
+
 def get_month_hash_and_sort(
     df: pd.DataFrame,
     hash_parent: str = "Month Index",
@@ -287,18 +515,14 @@ def get_month_hash_and_sort(
     :param drop_month_index: Boolean value indication whether or not to drop
     the numeric index for month once it has been embedded into the unique field
     """
-    df.insert(1, "month_rank", df.month.apply(get_numeric_time_index))
+    df.insert(1, "month_rank", get_month_rank_col(df.month))
 
     df.sort_values("month_rank", inplace=True)
     df.reset_index(drop=True, inplace=True)
     df.index.name = hash_parent
     df.reset_index(inplace=True)
 
-    df.insert(
-        0,
-        name_of_hash,
-        df[hash_child].astype(str) + " - " + df[hash_parent].astype(str),
-    )
+    df.insert(0, name_of_hash, get_key_col(df[hash_child], df[hash_parent]))
 
     if drop_month_index:
         df.drop(columns=[hash_parent], inplace=True)
@@ -318,11 +542,18 @@ def get_month_hash_and_sort(
 def floatify_cols(df, list_of_cols):
     """
     Function to convert all numeric metric columns to floats (replacing
-    dashes with NaN values along the way)
+    dashes with NaN values along the way) in a single pd.to_numeric() call
+    over the block of columns.
     """
-    for col in list_of_cols:
-        df[col] = df[col].replace("-", np.nan)
-        df[col] = df[col].apply(float)
+    if not list_of_cols:
+        return None
+
+    block = df[list_of_cols].to_numpy(dtype=object).ravel()
+    block[block == "-"] = np.nan
+
+    df[list_of_cols] = (
+        pd.to_numeric(block).astype("float64").reshape(len(df), len(list_of_cols))
+    )
 
     return None
 
@@ -387,14 +618,111 @@ def get_context_and_date_for_data(df_data: pd.DataFrame) -> tuple:
     return context_df, date_frmt
 
 
-def fancy_excel_writer(path_to_write: str, dict_of_dfs: dict) -> None:
+@lru_cache(maxsize=None)
+def read_template_col_names(path_to_template: str) -> tuple:
+    """
+    Reads the column names (header row only) of the output template once per
+    process.
+    :param path_to_template: Full path to 'ETL_Output_Template.xlsx'
+    :return: Tuple of column names in export order
+    """
+    return tuple(pd.read_excel(path_to_template, nrows=0).columns)
+
+
+def get_template_col_names_if_any() -> tuple:
+    """
+    Returns the template's column names, or an empty tuple when writing from
+    a directory without a template.
+    """
+    path_to_template = os.path.join(os.getcwd(), "ETL_Output_Template.xlsx")
+    if not os.path.isfile(path_to_template):
+        return ()
+
+    return read_template_col_names(path_to_template)
+
+
+# Widths of template columns whose values are all formatted to the same length
+# (dates, times, time zones), keyed by (sheet name, column name) and stored
+# with that length: a later workbook re-uses the width as long as its column's
+# values still share the length, which is cheaper to check than measuring it
+stable_col_widths = {}
+
+
+def get_col_width(series: pd.Series, exact=False, sample_size=10_000) -> int:
+    """
+    Returns the width to give a column in Excel: the length of its longest
+    value as text (or of its header) plus a little extra space. Columns of up
+    to sample_size rows, or any column with exact=True, are measured by
+    stringifying every value. Larger columns are estimated by dtype:
+    integers and dates from their min/max, floats from their min/max and a
+    sample, and text from its distinct values (sampled if there are more
+    than sample_size of them).
+    :param series: Column to size
+    :param exact: Boolean value indicating whether to always measure every
+    value
+    :param sample_size: Row count above which widths are estimated
+    :return: Column width
+    """
+    header_len = len(str(series.name))
+    if exact or len(series) <= sample_size:
+        return max((series.astype(str).map(len).max(), header_len)) + 1
+
+    values = series.dropna()
+    lens = [header_len, 3 if len(values) < len(series) else 0]  # 'nan'
+
+    if values.empty:
+        return max(lens) + 1
+
+    if pd.api.types.is_bool_dtype(values):
+        lens.append(5)
+    elif pd.api.types.is_integer_dtype(values):
+        lens += [len(str(values.min())), len(str(values.max()))]
+    elif pd.api.types.is_float_dtype(values):
+        sample = values.sample(min(sample_size, len(values)), random_state=0)
+        to_measure = pd.concat([sample, pd.Series([values.min(), values.max()])])
+        lens.append(to_measure.astype(values.dtype).astype(str).str.len().max())
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        lens.append(pd.Series([values.min(), values.max()]).astype(str).str.len().max())
+    else:
+        distinct = pd.Series(pd.unique(values.to_numpy()))
+        if len(distinct) > sample_size:
+            distinct = distinct.sample(sample_size, random_state=0)
+        lens.append(distinct.astype(str).str.len().max())
+
+    return max(lens) + 1
+
+
+def get_stable_value_len(series: pd.Series):
+    """
+    Returns the length every value of a text column shares, as for
+    fixed-format dates and times. All rows are checked, through the column's
+    distinct values.
+    :param series: Column to check
+    :return: Length of its values, or None if they differ (or are missing)
+    """
+    if not pd.api.types.is_object_dtype(series) or series.isna().any():
+        return None
+
+    lens = pd.Series(pd.unique(series.to_numpy())).astype(str).str.len()
+    if lens.empty or lens.nunique() != 1:
+        return None
+
+    return int(lens.iloc[0])
+
+
+def fancy_excel_writer(path_to_write: str, dict_of_dfs: dict, exact_widths=False):
     """
     Function to write out to a .xlsx file based on a path to write to and a
     dict of DataFrames.
-    :param path_to_write: Full file path to write to
+    :param path_to_write: Full file path (or file-like buffer) to write to
     :param dict_of_dfs: Dictionary of DataFrames following the convention
     Tab Name: Data for Tab
+    :param exact_widths: Boolean value indicating whether to size columns by
+    measuring every value instead of estimating large columns (see
+    get_col_width())
     """
+    template_cols = get_template_col_names_if_any()
+
     writer = pd.ExcelWriter(path_to_write, "xlsxwriter")
     for sheetname, df in dict_of_dfs.items():
 
@@ -407,15 +735,21 @@ def fancy_excel_writer(path_to_write: str, dict_of_dfs: dict) -> None:
 
         for idx, col in enumerate(df):  # loop through all columns
             series = df[col]
-            max_len = (
-                max(
-                    (
-                        series.astype(str).map(len).max(),  # len of largest item
-                        len(str(series.name)),  # len of column name/header
-                    )
-                )
-                + 1
-            )  # adding a little extra space
+            key = (sheetname, col)
+            value_len = get_stable_value_len(series) if col in template_cols else None
+            if (
+                not exact_widths
+                and key in stable_col_widths
+                and stable_col_widths[key][0] == value_len
+            ):
+                max_len = stable_col_widths[key][1]
+            else:
+                max_len = get_col_width(series, exact_widths)
+                if value_len is not None:
+                    stable_col_widths[key] = (value_len, max_len)
+                else:
+                    pass
+
             worksheet.set_column(idx, idx, max_len)  # set column width
     writer.save()
 
@@ -425,6 +759,150 @@ def fancy_excel_writer(path_to_write: str, dict_of_dfs: dict) -> None:
 # TODO: Modularize the above two functions (Excel-Handler)
 
 
+@ins.timed("excel.render")
+def render_excel_bytes(dict_of_dfs: dict, exact_widths=False) -> bytes:
+    """
+    Renders the workbook fancy_excel_writer() would write into memory, so it
+    can be written to several destinations without being rebuilt.
+    :param dict_of_dfs: Dictionary of DataFrames following the convention
+    Tab Name: Data for Tab
+    :param exact_widths: See fancy_excel_writer()
+    :return: Bytes of the .xlsx file
+    """
+    buffer = io.BytesIO()
+    fancy_excel_writer(buffer, dict_of_dfs, exact_widths)
+
+    return buffer.getvalue()
+
+
+def get_fallback_path(path_to_write: str) -> str:
+    """
+    Returns a versioned 'date ~ name ~ vN' path in the same directory for when
+    the destination file is locked (e.g. open in Excel).
+    """
+    dir_to_write, file_nm = os.path.split(path_to_write)
+    base_file_nm, file_ext = os.path.splitext(file_nm)
+    current_date = str(dt.today()).split(" ")[0]
+
+    version = cat.get_next_version(dir_to_write, base_file_nm, current_date)
+
+    return os.path.join(
+        dir_to_write, f"{current_date} ~ {base_file_nm} ~ v{version}{file_ext}"
+    )
+
+
+def replace_or_fallback(path_to_tmp: str, path_to_write: str) -> str:
+    """
+    Renames a fully written temp file into place and records it in the file
+    catalog. If the destination is locked the file goes to a versioned
+    fallback path instead.
+    :param path_to_tmp: Full path to the temp file
+    :param path_to_write: Full path to write to
+    :return: Full path actually written
+    """
+    try:
+        os.replace(path_to_tmp, path_to_write)
+
+    except PermissionError:
+        path_to_write = get_fallback_path(path_to_write)
+        os.replace(path_to_tmp, path_to_write)
+        print(f"\t<destination locked, wrote to {path_to_write} instead>")
+
+    cat.register_file(path_to_write)
+
+    return path_to_write
+
+
+def write_bytes_atomic(data: bytes, path_to_write: str) -> str:
+    """
+    Writes bytes to a temp file next to the destination and renames it into
+    place, so readers never see a half-written file. If the destination is
+    locked the same bytes go to a versioned fallback file instead.
+    :param data: Bytes to write
+    :param path_to_write: Full path to write to
+    :return: Full path actually written
+    """
+    file_nm = os.path.split(path_to_write)[-1]
+    with ins.stage("excel.write", file=file_nm, n_bytes=len(data)):
+        path_to_tmp = f"{path_to_write}.{os.getpid()}.tmp"
+        with open(path_to_tmp, "wb") as f:
+            f.write(data)
+
+        return replace_or_fallback(path_to_tmp, path_to_write)
+
+
+def copy_file_atomic(path_to_read: str, path_to_write: str) -> str:
+    """
+    Copies a file (in chunks, without reading it into memory) to a temp file
+    next to the destination and renames it into place, with the same locked
+    destination fallback as write_bytes_atomic().
+    :param path_to_read: Full path to the file to copy
+    :param path_to_write: Full path to write to
+    :return: Full path actually written
+    """
+    file_nm = os.path.split(path_to_write)[-1]
+    with ins.stage("excel.copy", file=file_nm):
+        path_to_tmp = f"{path_to_write}.{os.getpid()}.tmp"
+        shutil.copyfile(path_to_read, path_to_tmp)
+
+        return replace_or_fallback(path_to_tmp, path_to_write)
+
+
+def write_excel_to_paths(dict_of_dfs: dict, list_of_paths: list) -> list:
+    """
+    Renders the workbook once and writes it to every path in list_of_paths.
+    :param dict_of_dfs: Dictionary of DataFrames following the convention
+    Tab Name: Data for Tab
+    :param list_of_paths: List of full paths to write to
+    :return: List of full paths actually written
+    """
+    data = render_excel_bytes(dict_of_dfs)
+
+    return [write_bytes_atomic(data, path) for path in list_of_paths]
+
+
+def write_columnar_output(df: pd.DataFrame, file_nm: str, dir_to_write=None) -> str:
+    """
+    Writes the pivoted DataFrame out to a typed Parquet file (one file per
+    collected date) for the combine step to read instead of the Excel output.
+    :param df: Pivoted DataFrame for primary output tab
+    :param file_nm: Base file name (without extension) shared with the .xlsx
+    :param dir_to_write: Directory to write to
+    :return: Full path of the file written
+    """
+    if not dir_to_write:
+        dir_to_write = os.path.join(os.getcwd(), "etl_outputs_parquet")
+
+    else:
+        pass
+
+    os.makedirs(dir_to_write, exist_ok=True)
+
+    path_to_write = os.path.join(dir_to_write, f"{file_nm}.parquet")
+    df.to_parquet(path_to_write, index=False)
+    cat.register_file(path_to_write)
+
+    return path_to_write
+
+
+def get_output_paths(date_frmt: str) -> dict:
+    """
+    Returns the full paths of every output written for a collected date.
+    :param date_frmt: Collected date as 'YYYY-MM-DD'
+    :return: Dictionary of output type: full path
+    """
+    base_file_nm = f"CME Group Futures Price - Prior Settle {date_frmt}"
+
+    return {
+        "parquet": os.path.join(
+            os.getcwd(), "etl_outputs_parquet", f"{base_file_nm}.parquet"
+        ),
+        "xlsx": os.path.join(os.getcwd(), "etl_outputs_xlsx", f"{base_file_nm}.xlsx"),
+        "dropbox": os.path.join(dropbox_dir, f"{base_file_nm}.xlsx"),
+    }
+
+
+@ins.timed("etl.run_pipeline")
 def run_pipeline(path_str):
     print(f"Pipeline Started for:\n\t{path_str}")
 
@@ -434,7 +912,8 @@ def run_pipeline(path_str):
     #            r'\outputs_csv\2020-04-23 ~ Combined Output ~ v1.csv'
     # path_str = r'C:\Users\GEM7318\Documents\Github\Energy-Scraping' \
     #            r'\outputs_csv\2020-04-21 ~ Combined Output ~ v1.csv'
-    df = read_csv_from_path(path_str)
+    with ins.stage("etl.read_csv", file=os.path.split(path_str)[-1]):
+        df = read_csv_from_path(path_str)
 
     # [col for col in df.columns if 'collected' in col]
     # type(df.iloc[2])
@@ -442,31 +921,21 @@ def run_pipeline(path_str):
 
     # =========================================================================
     # Splitting components within 'last updated' column into their own fields
-    cols_to_explode = [
-        "last_updated_date",
-        "last_updated_time_military",
-        "last_updated_time_local",
-        "last_updated_time_zone",
-    ]
-
-    df = explode_col_by_func(df, "updated", cols_to_explode, parse_last_updated)
+    with ins.stage("etl.explode_updated"):
+        df = explode_scraped_df(df)
 
-    df.drop(columns=["last_updated_time_military"], inplace=True)
+    # =========================================================================
+    # Appending the long-format rows to the price store
+    if append_to_price_store:
+        with ins.stage("etl.append_store"):
+            ps.append_prices(ps.from_exploded_df(df, os.path.split(path_str)[-1]))
+    else:
+        pass
 
     # =========================================================================
     # Pivoting DataFrame based on 'metric_id' column
-    df_pivoted = df.pivot(
-        index="month", columns="metric_id", values=df.columns.tolist()[2:]
-    )
-
-    # Combining multi-index into single column index
-    df_pivoted.columns = [f"{col[0]}: {col[1]}" for col in df_pivoted.columns]
-
-    df_pivoted.index.name = "month"
-    df_pivoted.reset_index(inplace=True)
-    df_pivoted.drop(
-        columns=[col for col in df_pivoted.columns if "month:" in col], inplace=True
-    )
+    with ins.stage("etl.pivot"):
+        df_pivoted = pivot_on_metric_id(df)
 
     dfp1 = df_pivoted.copy()
     dfp2 = df_pivoted.copy()
@@ -482,34 +951,24 @@ def run_pipeline(path_str):
             print(col)
     # =========================================================================
     # Coalescing multiple sets of columns into individual fields
-    coalesced_col_nms = [
-        "updated_time_zone",
-        "collected_date",
-        "updated_date",
-        "updated_time",
-    ]
-
-    patterns_to_find = [
-        ".*_zone:",
-        "collected_date: ",
-        "last_updated_date: ",
-        ".*time_local:",
-    ]
-
-    coalesce_multiple(df_pivoted, patterns_to_find, coalesced_col_nms)
+    with ins.stage("etl.coalesce"):
+        coalesce_multiple(df_pivoted, patterns_to_find, coalesced_col_nms)
 
     # =========================================================================
     # Sorting on month/year and creating Lookup-ID Column
-    get_month_hash_and_sort(df_pivoted)
+    with ins.stage("etl.sort"):
+        get_month_hash_and_sort(df_pivoted)
 
     # =========================================================================
     # Cleansing & converting numeric columns to floats pre-export
-    metric_cols = [col for col in df_pivoted.columns if re.findall(":", col)]
-    floatify_cols(df_pivoted, metric_cols)
+    with ins.stage("etl.floatify"):
+        metric_cols = [col for col in df_pivoted.columns if re.findall(":", col)]
+        floatify_cols(df_pivoted, metric_cols)
 
     # =========================================================================
     # Renaming column names pre-export
-    prettify_cols_for_export(df_pivoted)
+    with ins.stage("etl.prettify"):
+        prettify_cols_for_export(df_pivoted)
 
     # =========================================================================
     # Converting USGC-HSFO column to a per gallon like other metrics
@@ -520,29 +979,56 @@ def run_pipeline(path_str):
     # path_to_col_order = os.path.join(os.getcwd(), 'ETL_col_order.csv')
     path_to_col_order = os.path.join(os.getcwd(), "ETL_Output_Template.xlsx")
 
-    df_cols = pd.read_excel(path_to_col_order)
-    col_names_for_export = df_cols.columns.tolist()
+    with ins.stage("etl.reorder"):
+        col_names_for_export = list(read_template_col_names(path_to_col_order))
 
-    df_pivoted = df_pivoted[col_names_for_export]
+        df_pivoted = df_pivoted[col_names_for_export]
 
     # =========================================================================
     # Generating DataFrame for 'Context' tab and getting date for file name
-    context_df, date_frmt = get_context_and_date_for_data(df_pivoted)
+    with ins.stage("etl.context"):
+        context_df, date_frmt = get_context_and_date_for_data(df_pivoted)
+
+    # =========================================================================
+    # Enforcing the declared output schema (see Schema.py) for the typed
+    # .parquet output; the .xlsx output gets plain Excel-friendly values
+    with ins.stage("etl.schema"):
+        df_pivoted = sch.enforce_schema(df_pivoted)
+
+    # =========================================================================
+    # Computing spreads, cracks and curve structure from the typed output
+    analytics_dfs = {}
+    if compute_analytics:
+        with ins.stage("etl.analytics"):
+            analytics_dfs = an.get_analytics_for_output(df_pivoted)
+    else:
+        pass
 
     # =========================================================================
     # Creating dict of Tab_Name: Associated DataFrame for Excel writer
-    dfs = {"Data_Vertical": df_pivoted, "Context": context_df}
+    with ins.stage("etl.excel_types"):
+        dfs = {"Data_Vertical": sch.to_excel_types(df_pivoted)}
+        for tab_nm, analytics_df in analytics_dfs.items():
+            dfs[tab_nm] = sch.to_excel_types(analytics_df)
+        dfs["Context"] = context_df
 
     # =========================================================================
     # Creating file name and path to write data to
-    file_nm = f"CME Group Futures Price - Prior Settle {date_frmt}.xlsx"
-    path_to_write = os.path.join(os.getcwd(), "etl_outputs_xlsx", file_nm)
-    path_to_write_2 = os.path.join(r"D:\Dropbox\1 - CME Group Futures Files", file_nm)
+    output_paths = get_output_paths(date_frmt)
+    base_file_nm = os.path.splitext(os.path.split(output_paths["parquet"])[-1])[0]
+    path_to_write = output_paths["xlsx"]
+    path_to_write_2 = output_paths["dropbox"]
 
     # =========================================================================
-    # Writing out to .xlsx
-    fancy_excel_writer(path_to_write, dfs)
-    fancy_excel_writer(path_to_write_2, dfs)
+    # Writing out to .parquet for the combine step and to .xlsx for export,
+    # rendering the workbook once for both destinations
+    with ins.stage("etl.write_parquet"):
+        write_columnar_output(df_pivoted, base_file_nm)
+        an.write_analytics(analytics_dfs)
+    excel_bytes = render_excel_bytes(dfs)
+    write_bytes_atomic(excel_bytes, path_to_write)
+    with dropbox_write_lock:
+        write_bytes_atomic(excel_bytes, path_to_write_2)
     print(f"Pipeline Completed for:\n\t{path_str}\n")
     return None
 
@@ -1,27 +1,153 @@
 # Imports
 import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import ETL as etl
 import FileHelper as fh
-import time
+import Catalog as cat
+import Changes as chg
+
+
+def init_worker(lock) -> None:
+    """
+    Hands each worker process the lock shared across the pool, so only one
+    of them writes to the Dropbox folder at a time.
+    """
+    etl.dropbox_write_lock = lock
+
+    return None
+
+
+def is_up_to_date(path_to_csv: str) -> bool:
+    """
+    Checks whether the local ETL outputs for a scraped CSV already exist and
+    are newer than the CSV itself.
+    :param path_to_csv: Full path to 'Combined Output' CSV
+    :return: Boolean indicator of the date not needing to be re-run
+    """
+    date_str, _, _ = cat.parse_file_name(os.path.split(path_to_csv)[-1])
+    if date_str is None:
+        return False
+
+    output_paths = etl.get_output_paths(date_str)
+    csv_mtime = os.path.getmtime(path_to_csv)
+
+    return all(
+        os.path.isfile(output_paths[key])
+        and os.path.getmtime(output_paths[key]) >= csv_mtime
+        for key in ["parquet", "xlsx"]
+    )
+
+
+def run_file(path_to_csv: str) -> dict:
+    """
+    Runs the ETL on a single file, returning its outcome instead of raising so
+    that one bad date doesn't stop the rest of the backfill.
+    """
+    start = time.perf_counter()
+    try:
+        etl.run_pipeline(path_to_csv)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    return {
+        "path": path_to_csv,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+
+
+def run_backfill(dir_str: str = None, n_workers: int = None, force=False) -> dict:
+    """
+    Runs the ETL on the latest scraped CSV of every date in a process pool,
+    skipping dates whose outputs are already up to date.
+    :param dir_str: Directory of 'Combined Output' CSVs
+    :param n_workers: Number of worker processes (defaults to CPU count)
+    :param force: Boolean value indicating whether to re-run every date
+    :return: Dictionary summarizing the files run, skipped and failed
+    """
+    if not dir_str:
+        dir_str = os.path.join(os.getcwd(), "outputs_csv")
+
+    else:
+        pass
+
+    dates = fh.get_distinct_dates_from_dir(dir_str)
+    files = [fh.get_latest_file_for_date(dir_str, date) for date in dates]
+
+    to_run = [file for file in files if force or not is_up_to_date(file)]
+    print(
+        f"<{len(to_run)} of {len(files)} dates to run "
+        f"({len(files) - len(to_run)} already up to date)>"
+    )
+
+    start = time.perf_counter()
+    results = []
+    lock = multiprocessing.Lock()
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=init_worker, initargs=(lock,)
+    ) as executor:
+        futures = [executor.submit(run_file, file) for file in to_run]
+
+        for i, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+
+            status = "failed" if result["error"] else "done"
+            print(
+                f"\t[{i}/{len(to_run)}] {status} in {result['seconds']:.1f}s: "
+                f"{os.path.split(result['path'])[-1]}"
+            )
 
-from importlib import reload
+    failed = [result for result in results if result["error"]]
 
-reload(etl)
-reload(fh)
+    # Dates ran out of order, so changes are chained afterwards from the
+    # earliest date re-run on
+    dates_run = [
+        cat.parse_file_name(os.path.split(result["path"])[-1])[0]
+        for result in results
+        if not result["error"]
+    ]
+    if dates_run:
+        chg.rebuild_changes(min(dates_run))
+    else:
+        pass
 
+    summary = {
+        "dates": len(files),
+        "skipped": len(files) - len(to_run),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "wall_seconds": time.perf_counter() - start,
+        "pipeline_seconds": sum(result["seconds"] for result in results),
+        "failures": {result["path"]: result["error"] for result in failed},
+    }
 
-outputs_dir = os.path.join(os.getcwd(), "outputs_csv")
+    print(
+        f"<Backfill completed: {summary['succeeded']} succeeded, "
+        f"{summary['failed']} failed, {summary['skipped']} skipped in "
+        f"{summary['wall_seconds']:.1f}s ({summary['pipeline_seconds']:.1f}s of "
+        f"pipeline time)>"
+    )
+    for path, error in summary["failures"].items():
+        print(f"\t{os.path.split(path)[-1]}: {error}")
 
-dates = fh.get_distinct_dates_from_dir(outputs_dir)
-# dates
+    return summary
 
-files = [fh.get_latest_file_for_date(outputs_dir, date) for date in dates]
-# print(files)
 
-# etl.run_pipeline(r'C:\Users\GEM7318\Documents\Github\Energy-Scraping\outputs_csv\2020-04-06 ~ Combined Output ~ v3.csv')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the ETL on the latest scraped CSV of every date"
+    )
+    parser.add_argument("--dir", default=None, help="Directory of scraped CSVs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="Re-run dates already up to date"
+    )
+    args = parser.parse_args()
 
-for file in files:
-    etl.run_pipeline(file)
-    print("<sleeping for 65 seconds before proceeding to next file>")
-    time.sleep(65)
+    run_backfill(args.dir, args.workers, args.force)
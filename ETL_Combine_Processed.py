@@ -1,9 +1,20 @@
 import pandas as pd
+import numpy as np
 import os
 import hashlib
-import math
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+import openpyxl
+import xlsxwriter
+import pyarrow.parquet as pq
 import ETL as etl
-import FileHelper as fh
+import Schema as sch
+import PriceStore as ps
+import Changes as chg
+import Instrument as ins
 
 import logging
 
@@ -39,7 +50,13 @@ logging.basicConfig(filename="test.log", level=logging.DEBUG)
 def hash_from_cols(df):
     """Quick hashing function to return hash value from a DataFrame's columns.
     """
-    to_hash = "~".join(df.columns.to_list())
+    return hash_from_col_names(df.columns.to_list())
+
+
+def hash_from_col_names(col_names: list) -> str:
+    """Quick hashing function to return hash value from a list of column names.
+    """
+    to_hash = "~".join(col_names)
 
     hash_base = hashlib.md5(to_hash.encode("utf-8"))
     hashed = hash_base.hexdigest()
@@ -47,13 +64,36 @@ def hash_from_cols(df):
     return hashed
 
 
+def read_col_names(path: str) -> list:
+    """
+    Reads only the column names of a daily ETL output (or the template)
+    without materializing any of its data: the Parquet schema for .parquet
+    files and the first row of the first sheet for .xlsx files.
+    :param path: Full path to .parquet/.xlsx file
+    :return: List of column names
+    """
+    if os.path.splitext(path)[-1] == r".parquet":
+        return pq.read_schema(path).names
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        header = next(worksheet.iter_rows(max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+
+    return [str(val) for val in header if val is not None]
+
+
 # template_df = pd.read_excel()
 # valid_col_hash = hash_from_cols(template_df)
 # TODO: Change to get column_template_hash()
 
 
-def get_valid_hash(path_to_template=None):
-
+def get_template_path(path_to_template=None) -> str:
+    """
+    Returns the path to the ETL output template.
+    """
     if not path_to_template:
         path_to_template = os.path.join(
             os.getcwd().split("Energy-Scraping")[0],
@@ -63,80 +103,186 @@ def get_valid_hash(path_to_template=None):
     else:
         pass
 
-    df = pd.read_excel(path_to_template)
-    template_hash = hash_from_cols(df)
+    return path_to_template
+
+
+@lru_cache(maxsize=None)
+def get_template_col_names(path_to_template: str) -> tuple:
+    """
+    Reads the header of the template once per process.
+    """
+    return tuple(read_col_names(path_to_template))
+
+
+def get_valid_hash(path_to_template=None):
+
+    template_cols = get_template_col_names(get_template_path(path_to_template))
+    template_hash = hash_from_col_names(list(template_cols))
 
     return template_hash
 
 
-# get_valid_hash()
+def get_header_check_dtl(list_of_paths: list, path_to_template=None) -> dict:
+    """
+    Returns a dictionary of df_name: whether the file's header matches the
+    template, reading only headers. Each rejected file is reported as a
+    structured (JSON) log record with its missing and unexpected columns.
+    :param list_of_paths: List of full directory paths to .parquet/.xlsx files
+    :param path_to_template: Path to the ETL output template
+    :return: Dictionary of Df_Name: boolean column check
+    """
+    template_cols = get_template_col_names(get_template_path(path_to_template))
+    template_hash = get_valid_hash(path_to_template)
 
+    hash_dict = {}
+    for path in list_of_paths:
+        k = os.path.split(path)[-1].split(".")[0]
+        col_names = read_col_names(path)
+        hash_dict[k] = hash_from_col_names(col_names) == template_hash
+
+        if not hash_dict[k]:
+            logging.warning(
+                json.dumps(
+                    {
+                        "event": "etl_output_rejected",
+                        "file": path,
+                        "reason": "column_mismatch",
+                        "expected_hash": template_hash,
+                        "missing_cols": [
+                            col for col in template_cols if col not in col_names
+                        ],
+                        "unexpected_cols": [
+                            col for col in col_names if col not in template_cols
+                        ],
+                    }
+                )
+            )
+
+    return hash_dict
 
-def get_paths_to_base_etl_outputs(path_to_read=None):
 
+# get_valid_hash()
+
+
+def get_paths_to_base_etl_outputs(path_to_read=None, path_to_columnar=None):
+    """
+    Returns paths to every daily ETL output, preferring the Parquet twin of a
+    workbook whenever one has been written.
+    :param path_to_read: Directory of daily .xlsx outputs
+    :param path_to_columnar: Directory of daily .parquet outputs
+    :return: List of full paths sorted by file name (i.e. by date)
+    """
     if not path_to_read:
         path_to_read = os.path.join(os.getcwd(), "etl_outputs_xlsx")
 
     else:
         pass
 
-    paths = [
-        os.path.join(path_to_read, file)
+    if not path_to_columnar:
+        path_to_columnar = os.path.join(os.getcwd(), "etl_outputs_parquet")
+
+    else:
+        pass
+
+    paths = {
+        os.path.splitext(file)[0]: os.path.join(path_to_read, file)
         for file in os.listdir(path_to_read)
         if r".xlsx" in file and "combined" not in file.lower()
-    ]
+    }
+
+    if os.path.isdir(path_to_columnar):
+        for file in os.listdir(path_to_columnar):
+            if os.path.splitext(file)[-1] == r".parquet":
+                paths[os.path.splitext(file)[0]] = os.path.join(path_to_columnar, file)
 
-    return paths
+    return [paths[k] for k in sorted(paths)]
 
 
-def get_dict_of_dfs(list_of_paths: list) -> dict:
+def read_etl_output(path: str) -> pd.DataFrame:
     """
-    Returns a dictionary of DataFrames from a list of paths
-    :param list_of_paths: List of full directory paths to .xlsx files
-    :return: Dictionary of Df_Name: pd.DataFrame based
+    Reads a single daily ETL output from either its .parquet or .xlsx file,
+    with the declared output schema enforced (outputs written before the
+    schema existed are cast on read).
     """
-    df_dict = {}
-    for path in list_of_paths:
-        print(path)
-        df_dict[os.path.split(path)[-1].split(".")[0]] = pd.read_excel(path)
+    if os.path.splitext(path)[-1] == r".parquet":
+        return sch.enforce_schema(pd.read_parquet(path))
 
-    return df_dict
+    return sch.enforce_schema(pd.read_excel(path))
 
 
-def get_col_check_dtl(dict_of_dfs):
+def read_and_check_etl_output(path: str, template_hash=None):
     """
-    Returns a dictionary of df_name: hash value for columns.
-    :param dict_of_dfs:
-    :return:
+    Reads a single daily ETL output and checks its columns against the
+    template hash (if given), returning None for a mismatched file so that
+    a worker process doesn't ship its data back to the parent.
+    :param path: Full path to .parquet/.xlsx file
+    :param template_hash: Valid column hash or None to skip the check
+    :return: pd.DataFrame or None
     """
-    template_hash = get_valid_hash()
+    df = read_etl_output(path)
 
-    hash_dict = {}
-    for k, v in dict_of_dfs.items():
-        hash_dict[k] = hash_from_cols(v) == template_hash
+    if template_hash and hash_from_cols(df) != template_hash:
+        return None
 
-    return hash_dict
+    return df
 
 
-def get_list_of_indicators(df, cols_to_check=["WTI", "USGC-ULSD", "USGC-HSFO"]):
+def get_dict_of_dfs(list_of_paths: list, n_workers=None, template_hash=None) -> dict:
     """
-    Gets a list of 1s and 0s to indicate invalid/valid records of a DataFrame
-    based on numeric values of specified columns
-    :param df:
-    :param cols_to_check:
-    :return:
+    Returns a dictionary of DataFrames from a list of paths, optionally
+    parsing the files in a pool of worker processes. When a template hash is
+    given, files whose columns don't match it are left out of the result.
+    Note that on Windows the calling script needs an
+    `if __name__ == "__main__":` guard for n_workers > 1.
+    :param list_of_paths: List of full directory paths to .parquet/.xlsx files
+    :param n_workers: Number of worker processes (None or 1 to read serially)
+    :param template_hash: Valid column hash or None to skip the check
+    :return: Dictionary of Df_Name: pd.DataFrame based in list_of_paths order
     """
-    unusable_list = []
-    for vals in df[cols_to_check].iterrows():
-        valid = [v for v in vals[1] if not math.isnan(v)]
+    if n_workers and n_workers > 1 and len(list_of_paths) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            dfs = list(
+                executor.map(
+                    read_and_check_etl_output,
+                    list_of_paths,
+                    repeat(template_hash),
+                )
+            )
+    else:
+        dfs = []
+        for path in list_of_paths:
+            print(path)
+            dfs.append(read_and_check_etl_output(path, template_hash))
 
-        if len(valid) != len(vals[1]):
-            unusable_list.append(1)
+    df_dict = {}
+    for path, df in zip(list_of_paths, dfs):
+        if df is not None:
+            df_dict[os.path.split(path)[-1].split(".")[0]] = df
 
-        else:
-            unusable_list.append(0)
+    return df_dict
+
+
+def truncate_trailing_invalid(
+    df, cols_to_check=("WTI", "USGC-ULSD", "USGC-HSFO")
+) -> pd.DataFrame:
+    """
+    Vectorized equivalent of truncate_df(): a record is invalid if any of
+    cols_to_check is null, and the DataFrame is cut at the start of the
+    trailing run of invalid records. Keeps truncate_df()'s behavior of also
+    dropping the record just before that run (iloc[0:last_valid_index - 1]).
+    :param df: DataFrame to truncate
+    :param cols_to_check: Columns that must all be populated for a valid record
+    :return: Truncated DataFrame (or df itself if its last record is valid)
+    """
+    is_invalid = df[list(cols_to_check)].isna().any(axis=1).to_numpy()
+    is_trailing_invalid = np.logical_and.accumulate(is_invalid[::-1])[::-1]
 
-    return unusable_list
+    if not is_trailing_invalid.any():
+        return df
+
+    last_valid_index = int(is_trailing_invalid.argmax())
+
+    return df.iloc[0 : (last_valid_index - 1)]
 
 
 def truncate_df(df):
@@ -144,25 +290,9 @@ def truncate_df(df):
     Truncates a DataFrame by cutting chopping at the index position where all
     values within a list are 1s from that point forward
     :param df:
-    :param list_of_indicators:
     :return:
     """
-    list_of_indicators = get_list_of_indicators(df)
-
-    for i, val in enumerate(list_of_indicators):
-
-        total_less_current = len(list_of_indicators) - i
-        remaining_unusable = sum(list_of_indicators[i:])
-
-        if total_less_current == remaining_unusable:
-            last_valid_index = i
-            df2 = df.iloc[0 : (last_valid_index - 1)]
-            break
-
-        else:
-            df2 = df
-
-    return df2
+    return truncate_trailing_invalid(df)
 
 
 def combine_valid_dfs(dict_of_dfs, hash_dict):
@@ -174,20 +304,48 @@ def combine_valid_dfs(dict_of_dfs, hash_dict):
     :return:
     """
     dict_of_trunc_dfs = {k: truncate_df(v) for k, v in dict_of_dfs.items()}
-    combined_df = pd.concat([dict_of_trunc_dfs[k] for k, v in hash_dict.items() if v])
 
-    invalid_dfs = [k for k, v in hash_dict.items() if not v]
-    try:
-        invalid_dfs == []
-    except Exception as e:
-        logging.exception(f"Could not load invalid DataFrames: {invalid_dfs}", e)
+    return concat_valid_dfs(dict_of_trunc_dfs, hash_dict)
+
+
+def concat_valid_dfs(dict_of_trunc_dfs, hash_dict):
+    """
+    Concatenates already-truncated DataFrames whose columns passed the hash
+    check, in the order of hash_dict.
+    :param dict_of_trunc_dfs: Dictionary of Df_Name: truncated pd.DataFrame
+    :param hash_dict: Dictionary of Df_Name: boolean column check
+    :return: Single combined DataFrame
+    """
+    combined_df = sch.concat_typed(
+        [dict_of_trunc_dfs[k] for k, v in hash_dict.items() if v]
+    )
+
+    log_excluded_dfs(hash_dict)
 
     combined_df.reset_index(drop=True, inplace=True)
 
     return combined_df
 
 
-# TODO: Add logic to log dataframes that can't be loaded due to column mismatch
+def log_excluded_dfs(hash_dict: dict) -> None:
+    """
+    Logs a single structured record listing the files left out of the
+    combine for failing the column check.
+    :param hash_dict: Dictionary of Df_Name: boolean column check
+    """
+    invalid_dfs = [k for k, v in hash_dict.items() if not v]
+    if invalid_dfs:
+        logging.warning(
+            json.dumps(
+                {
+                    "event": "etl_outputs_excluded_from_combine",
+                    "reason": "column_mismatch",
+                    "files": invalid_dfs,
+                }
+            )
+        )
+
+    return None
 
 
 def get_context_for_combined(df_data: pd.DataFrame) -> pd.DataFrame:
@@ -221,48 +379,332 @@ def write_combined_dict(
     dfs,
     base_file_name=r"CME Group Futures Price - Prior " r"Settle (COMBINED).xlsx",
     base_path=os.path.join(os.getcwd(), "etl_outputs_xlsx"),
+    excel_bytes: bytes = None,
 ):
-    base_file_name, folder_ext = base_file_name.split(".")
-    initial_file_name = f"{base_file_name}.xlsx"
-    initial_write_path = os.path.join(base_path, initial_file_name)
+    """
+    Writes the combined workbook to base_path, falling back to a versioned
+    file name in the same directory if the main file is locked.
+    :param dfs: Dictionary of Tab Name: DataFrame
+    :param base_file_name: File name to write to
+    :param base_path: Directory to write to
+    :param excel_bytes: Workbook already rendered by etl.render_excel_bytes(),
+    so writing to several directories only renders it once
+    """
+    initial_write_path = os.path.join(base_path, base_file_name)
     print(initial_write_path)
 
-    if fh.file_checker(initial_write_path):
-        etl.fancy_excel_writer(initial_write_path, dfs)
+    if excel_bytes is None:
+        excel_bytes = etl.render_excel_bytes(dfs)
 
     else:
-        try:
-            except_file_nm = fh.get_file_name("etl_outputs_xlsx", base_file_name)
-            except_write_path = os.path.join(base_path, except_file_nm)
-            etl.fancy_excel_writer(except_write_path, dfs)
+        pass
+
+    try:
+        etl.write_bytes_atomic(excel_bytes, initial_write_path)
+
+    # Only a locked destination (and fallback) is logged and skipped, so the
+    # other directories still get the workbook; anything else is a bug
+    except PermissionError:
+        logging.exception("Exception Occurred: Could not write to main path")
+
+    return None
+
+
+def get_paths_to_combine_store(store_dir=None) -> tuple:
+    """
+    Returns the paths to the manifest and the persisted store of truncated
+    DataFrames used by the incremental combine.
+    :param store_dir: Directory holding the store (created if missing)
+    :return: Path to manifest .json, path to store .pkl
+    """
+    if not store_dir:
+        store_dir = os.path.join(os.getcwd(), "etl_outputs_store")
+
+    else:
+        pass
+
+    os.makedirs(store_dir, exist_ok=True)
 
-        except Exception as e:
-            logging.exception("Exception Occurred: Could not write to main " "path", e)
+    path_to_manifest = os.path.join(store_dir, "combined_manifest.json")
+    path_to_store = os.path.join(store_dir, "combined_store.pkl")
+
+    return path_to_manifest, path_to_store
+
+
+def read_combine_store(path_to_manifest: str, path_to_store: str) -> tuple:
+    """
+    Reads in the manifest of already-combined files and the persisted
+    truncated DataFrames, returning empty ones if either is missing.
+    :param path_to_manifest: Path to manifest .json
+    :param path_to_store: Path to store .pkl
+    :return: Manifest dictionary, dictionary of Df_Name: truncated DataFrame
+    """
+    if not (os.path.isfile(path_to_manifest) and os.path.isfile(path_to_store)):
+        return {}, {}
+
+    with open(path_to_manifest, "r") as f:
+        manifest = json.load(f)
+
+    store = pd.read_pickle(path_to_store)
+
+    return manifest, store
+
+
+def write_combine_store(
+    manifest: dict, store: dict, path_to_manifest: str, path_to_store: str
+) -> None:
+    """
+    Persists the store and then the manifest, each through a temp file and
+    rename so an interrupted run never leaves a half-written file behind.
+    :param manifest: Manifest dictionary
+    :param store: Dictionary of Df_Name: truncated DataFrame
+    :param path_to_manifest: Path to manifest .json
+    :param path_to_store: Path to store .pkl
+    """
+    pd.to_pickle(store, f"{path_to_store}.tmp")
+    os.replace(f"{path_to_store}.tmp", path_to_store)
+
+    with open(f"{path_to_manifest}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path_to_manifest}.tmp", path_to_manifest)
 
     return None
 
 
-# TODO: Change fh.get_file_name() above such that it will continue to
-#  function if using a different directory structured
+def combine_incremental(
+    paths: list, store_dir=None, full_rebuild=False, n_workers=None
+):
+    """
+    Combines the daily ETL outputs, only parsing files that are new or have
+    been modified since the last run and re-using the persisted truncated
+    DataFrames for everything else. The result is identical to running
+    combine_valid_dfs() over every file.
+    :param paths: List of full paths to the daily .parquet/.xlsx outputs
+    :param store_dir: Directory holding the manifest and store
+    :param full_rebuild: Boolean value indicating whether to ignore the
+    manifest and re-parse every file
+    :param n_workers: Number of worker processes to parse files with
+    :return: Single combined DataFrame
+    """
+    path_to_manifest, path_to_store = get_paths_to_combine_store(store_dir)
+
+    with ins.stage("combine.read_store"):
+        if full_rebuild:
+            manifest, store = {}, {}
+        else:
+            manifest, store = read_combine_store(path_to_manifest, path_to_store)
+
+    mtimes = {
+        os.path.split(path)[-1].split(".")[0]: os.path.getmtime(path) for path in paths
+    }
+
+    for k in [k for k in manifest if k not in mtimes]:
+        manifest.pop(k)
+        store.pop(k, None)
+
+    stale_paths = [
+        path
+        for path, (k, mtime) in zip(paths, mtimes.items())
+        if manifest.get(k, {}).get("mtime") != mtime
+    ]
+    print(f"<{len(stale_paths)} of {len(paths)} files to parse for combine>")
+
+    with ins.stage("combine.header_check", n_files=len(stale_paths)):
+        header_dict = get_header_check_dtl(stale_paths)
+    valid_paths = [
+        path
+        for path in stale_paths
+        if header_dict[os.path.split(path)[-1].split(".")[0]]
+    ]
+
+    # Columns are checked against the template in the workers, so frames that
+    # don't match are never shipped back to this process
+    with ins.stage("combine.read_outputs", n_files=len(valid_paths)):
+        df_dict = get_dict_of_dfs(valid_paths, n_workers, get_valid_hash())
+
+    with ins.stage("combine.truncate", n_files=len(df_dict)):
+        for path in stale_paths:
+            k = os.path.split(path)[-1].split(".")[0]
+            manifest[k] = {
+                "collected_date": k.split(" ")[-1],
+                "mtime": mtimes[k],
+                "is_valid": k in df_dict,
+            }
+            if k in df_dict:
+                store[k] = truncate_df(df_dict[k])
+            else:
+                store.pop(k, None)
+
+    with ins.stage("combine.write_store"):
+        write_combine_store(manifest, store, path_to_manifest, path_to_store)
+
+    valid_dict = {k: manifest[k]["is_valid"] for k in mtimes}
+
+    with ins.stage("combine.concat", n_files=len(valid_dict)):
+        return concat_valid_dfs(store, valid_dict)
+
+
+# Same header style pandas' to_excel() gives the in-memory workbook
+header_format = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+
+def write_rows(worksheet, df: pd.DataFrame, first_row: int) -> int:
+    """
+    Writes a DataFrame's values row by row starting at first_row, leaving
+    nulls blank as to_excel() does.
+    :param worksheet: xlsxwriter worksheet
+    :param df: DataFrame to write
+    :param first_row: Index of the first row to write to
+    :return: Index of the next row to write to
+    """
+    values = df.astype(object).where(df.notna(), None)
+    for row_idx, row in enumerate(values.itertuples(index=False), start=first_row):
+        worksheet.write_row(row_idx, 0, row)
+
+    return first_row + len(df)
+
+
+@ins.timed("combine.stream_workbook")
+def stream_combined_workbook(paths: list, path_to_write: str) -> int:
+    """
+    Writes the combined workbook one daily output at a time with xlsxwriter's
+    constant_memory mode, so neither the concatenated DataFrame nor the
+    workbook is ever held in memory: each file is read, truncated, flushed to
+    the 'Combined_Vertical' tab and dropped before the next is read. The
+    'Changes' tab is streamed the same way, one collected date at a time, and
+    the 'Context' tab and column widths are built from running values.
+    :param paths: List of full paths to the daily .parquet/.xlsx outputs,
+    in the order to combine them
+    :param path_to_write: Full path to write the .xlsx file to
+    :return: Number of data rows written
+    """
+    hash_dict = get_header_check_dtl(paths)
+    log_excluded_dfs(hash_dict)
+
+    col_names = list(get_template_col_names(get_template_path()))
+    col_widths = [len(col) + 1 for col in col_names]
+    collected_dates = set()
+
+    workbook = xlsxwriter.Workbook(path_to_write, {"constant_memory": True})
+    data_sheet = workbook.add_worksheet("Combined_Vertical")
+    changes_sheet = workbook.add_worksheet("Changes")
+    context_sheet = workbook.add_worksheet("Context")
+
+    data_sheet.write_row(0, 0, col_names, workbook.add_format(header_format))
+
+    next_row = 1
+    for path in paths:
+        if not hash_dict[os.path.split(path)[-1].split(".")[0]]:
+            continue
+
+        df = sch.to_excel_types(truncate_df(read_etl_output(path))[col_names])
+        next_row = write_rows(data_sheet, df, next_row)
+
+        collected_dates.update(df["Collected Date"].dropna())
+        col_widths = [
+            max(width, etl.get_col_width(df[col]))
+            for width, col in zip(col_widths, col_names)
+        ]
+
+    changes_sheet.write_row(0, 0, chg.change_cols, workbook.add_format(header_format))
+    changes_widths = [len(col) + 1 for col in chg.change_cols]
+    next_changes_row = 1
+    for date_str in chg.get_changes_dates():
+        df = sch.to_excel_types(chg.read_changes(date_str, date_str))
+        next_changes_row = write_rows(changes_sheet, df, next_changes_row)
+        changes_widths = [
+            max(width, etl.get_col_width(df[col]))
+            for width, col in zip(changes_widths, chg.change_cols)
+        ]
+
+    context_df = get_context_for_combined(
+        pd.DataFrame({"Collected Date": sorted(collected_dates)})
+    )
+    write_rows(context_sheet, context_df, 0)
+
+    for idx, width in enumerate(col_widths):
+        data_sheet.set_column(idx, idx, width)
+    for idx, width in enumerate(changes_widths):
+        changes_sheet.set_column(idx, idx, width)
+    for idx, col in enumerate(context_df):
+        context_sheet.set_column(idx, idx, etl.get_col_width(context_df[col]))
+
+    workbook.close()
+
+    return next_row - 1
 
 
+@ins.timed("combine.run_pipeline")
 def run_pipeline(
     paths_to_write_to: list,
     base_file_name: str = r"CME Group Futures Price - Prior Settle (COMBINED).xlsx",
+    full_rebuild: bool = False,
+    n_workers: int = None,
+    stream: bool = False,
+    from_store: bool = False,
 ):
+    # The store view reads every partition in full and has neither the
+    # manifest, the worker pool nor a streaming writer
+    if from_store and (full_rebuild or n_workers or stream):
+        raise ValueError(
+            "full_rebuild, n_workers and stream apply to combining the daily "
+            "outputs, not to from_store"
+        )
 
-    paths = get_paths_to_base_etl_outputs()
+    else:
+        pass
 
-    df_dict = get_dict_of_dfs(paths)
+    with ins.stage("combine.list_outputs"):
+        paths = get_paths_to_base_etl_outputs()
 
-    hash_dict = get_col_check_dtl(df_dict)
+    if stream:
+        # Streams into a temp file next to the first destination, then copies
+        # that file to the remaining destinations
+        path_to_tmp = os.path.join(
+            paths_to_write_to[0], f"{base_file_name}.{os.getpid()}.stream.tmp"
+        )
+        n_rows = stream_combined_workbook(paths, path_to_tmp)
 
-    df_total = combine_valid_dfs(df_dict, hash_dict)
+        for path in paths_to_write_to[1:]:
+            print(os.path.join(path, base_file_name))
+            etl.copy_file_atomic(path_to_tmp, os.path.join(path, base_file_name))
 
-    dfs = {"Combined_Vertical": df_total, "Context": get_context_for_combined(df_total)}
+        print(os.path.join(paths_to_write_to[0], base_file_name))
+        etl.replace_or_fallback(
+            path_to_tmp, os.path.join(paths_to_write_to[0], base_file_name)
+        )
+        print(f"<Combine-All Pipeline Completed: {n_rows} rows streamed>")
 
+        return None
+
+    if from_store:
+        # Opt-in: the workbook as a view of the price store; dates scraped
+        # before the store existed are backfilled from their CSVs first
+        with ins.stage("combine.ingest_store"):
+            ps.ingest_csv_dir()
+        with ins.stage("combine.from_store"):
+            df_total = ps.get_combined_view()
+
+    else:
+        with ins.stage("combine.incremental", n_files=len(paths)):
+            df_total = combine_incremental(
+                paths, full_rebuild=full_rebuild, n_workers=n_workers
+            )
+
+    with ins.stage("combine.excel_types", n_rows=len(df_total)):
+        df_export = sch.to_excel_types(df_total)
+    with ins.stage("combine.changes"):
+        df_changes = sch.to_excel_types(chg.read_changes())
+    with ins.stage("combine.context"):
+        dfs = {
+            "Combined_Vertical": df_export,
+            "Changes": df_changes,
+            "Context": get_context_for_combined(df_export),
+        }
+
+    excel_bytes = etl.render_excel_bytes(dfs)
     for path in paths_to_write_to:
-        write_combined_dict(dfs, base_file_name, path)
+        write_combined_dict(dfs, base_file_name, path, excel_bytes)
 
     print(f"<Combine-All Pipeline Completed>")
 
@@ -276,3 +718,38 @@ base_file_nm = r"CME Group Futures Price - Prior Settle (COMBINED).xlsx"
 
 # run_pipeline(all_paths, r'CME Group Futures Price - Prior Settle ('
 #                              r'COMBINED).xlsx')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Combine daily ETL outputs")
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="Ignore the manifest and re-parse every daily output",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes to parse daily outputs with",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write the workbook one daily output at a time in constant memory",
+    )
+    parser.add_argument(
+        "--from-store",
+        action="store_true",
+        help="Build the workbook from the price store instead of the daily "
+        "outputs (not with --full-rebuild, --workers or --stream)",
+    )
+    args = parser.parse_args()
+
+    run_pipeline(
+        [project_path],
+        base_file_nm,
+        full_rebuild=args.full_rebuild,
+        n_workers=args.workers,
+        stream=args.stream,
+        from_store=args.from_store,
+    )
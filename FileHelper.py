@@ -2,7 +2,14 @@ import os
 from datetime import datetime
 import random
 import pandas as pd
-import re
+
+import RawArchive as ra
+import Catalog as cat
+import Instrument as ins
+
+# Raw pages go to the compressed, de-duplicated archive rather than one plain
+# .txt per page; set to False to fall back to writing .txt files
+archive_raw_pages = True
 
 
 def read_and_shuffle_hrefs(file_nm=r"urls.csv"):
@@ -26,6 +33,7 @@ def read_and_shuffle_hrefs(file_nm=r"urls.csv"):
 # print(urls.keys())
 
 
+@ins.timed("scrape.combine_scraped_dfs")
 def combine_scraped_dfs(dict_of_dfs: dict) -> pd.DataFrame:
     """
     Receives dictionary of DataFrames and combines into a single DataFrame.
@@ -51,7 +59,8 @@ def combine_scraped_dfs(dict_of_dfs: dict) -> pd.DataFrame:
 def get_file_name(folder_ext: str, file_name: str, is_etl=False) -> str:
     """
     Creates a file name with an index number based on folder extension and
-    file name inputs.
+    file name inputs. The index number is the next version for the file name
+    and date in the file catalog.
     :param folder_ext: Underscore-delimited name of folder with the last
     argument being the file type
     :param file_name: Base name of file
@@ -61,11 +70,7 @@ def get_file_name(folder_ext: str, file_name: str, is_etl=False) -> str:
     base_path = os.path.join(os.getcwd(), folder_ext)
     current_date = str(datetime.today()).split(" ")[0]
 
-    files = os.listdir(base_path)
-    pre_existing_files = [
-        file for file in files if file_name in file and current_date in file
-    ]
-    index_num = len(pre_existing_files) + 1
+    index_num = cat.get_next_version(base_path, file_name, current_date)
 
     file_ext = folder_ext.split("_")[-1]
 
@@ -84,12 +89,21 @@ def get_file_name(folder_ext: str, file_name: str, is_etl=False) -> str:
 def save_raw_file(data, file_name, folder_ext):
     """
     Accepts data (string of HTML or DataFrame) and writes out to local text
-    file in appropriate place.
+    file in appropriate place. Raw HTML is stored in the compressed archive
+    (see RawArchive.py) while archive_raw_pages is True.
     :param data: HTML or DataFrame
     :param folder_ext: Base folder name to save raw html in
     :param file_name: Name of Href or File to save
     :return: None
     """
+    if archive_raw_pages and folder_ext.split("_")[-1] == "txt":
+        entry = ra.save_page(data, file_name)
+        print(
+            f"\t<raw page archived as {entry['date']} ~ {entry['name']} ~ "
+            f"v{entry['version']} ({entry['blob'][:12]})>"
+        )
+        return None
+
     file_name = get_file_name(folder_ext, file_name)
     path_to_write = os.path.join(os.getcwd(), folder_ext, file_name)
 
@@ -104,6 +118,7 @@ def save_raw_file(data, file_name, folder_ext):
 
         data.to_csv(path_to_write, index=False)
 
+    cat.register_file(path_to_write)
     print(f"\t<local file saved to {path_to_write}>")
 
     return None
@@ -122,11 +137,7 @@ def get_path_to_most_recent_file(folder_ext=r"outputs_csv"):
     :return: DataFrame
     """
     base_path = os.path.join(os.getcwd(), folder_ext)
-    full_paths = [os.path.join(base_path, val) for val in os.listdir(base_path)]
-    file_paths = [val for val in full_paths if os.path.isfile(val)]
-
-    mod_file_dict = {os.path.getmtime(path): path for path in file_paths}
-    most_recent_mod = mod_file_dict[sorted(mod_file_dict.keys(), reverse=True)[0]]
+    most_recent_mod = cat.get_most_recent_path(base_path)
 
     return most_recent_mod
 
@@ -135,12 +146,7 @@ def get_latest_output_for_date(date_str):
     """
     Imports most recently modified raw output csv for a given day.
     """
-    base_path = os.path.join(os.getcwd(), r"outputs_csv")
-    full_paths = [os.path.join(base_path, val) for val in os.listdir(base_path)]
-    file_paths = [val for val in full_paths if os.path.isfile(val)]
-
-    mod_file_dict = {os.path.getmtime(path): path for path in file_paths}
-    most_recent_mod = mod_file_dict[sorted(mod_file_dict.keys(), reverse=True)[0]]
+    most_recent_mod = get_path_to_most_recent_file(r"outputs_csv")
 
     df = pd.read_csv(most_recent_mod)
     df.drop(df.head(1).index, inplace=True)
@@ -162,21 +168,14 @@ def get_latest_file_for_date(dir_str: str, date_str: str) -> str:
     """
     Gets full path to the 'latest' file name by version number for all files
     within a given directory on a given date based on the version number.
+    Looked up in the file catalog (see Catalog.py) rather than by listing the
+    directory.
     :param dir_str: Directory to traverse
     :param date_str: Date to partition by
     :return: Path to file that has the highest version number on the given
     date
     """
-    files = [file for file in os.listdir(dir_str) if date_str in file]
-
-    file_version_dict = {}
-    for file in files:
-        date_str, _, version = os.path.splitext(file)[0].split(" ~ ")
-        version_num = int(version[:: -len(version)])
-        file_version_dict[version_num] = file
-
-    latest_file = file_version_dict[list(file_version_dict.keys())[::-1][0]]
-    latest_path = os.path.join(dir_str, latest_file)
+    latest_path = cat.get_latest_path(dir_str, date_str.strip())
 
     return latest_path
 
@@ -189,13 +188,12 @@ def get_latest_file_for_date(dir_str: str, date_str: str) -> str:
 def get_distinct_dates_from_dir(dir_str: str) -> list:
     """
     Traverses a directory following tilda-delimited naming convention with date
-    as first argument and returns distinct dates within directory
+    as first argument and returns distinct dates within directory, as
+    indexed by the file catalog
     :param dir_str: Directory to traverse
     :return: Sorted list of distinct dates within the directory
     """
-    files = [file for file in os.listdir(dir_str) if re.findall("~", file)]
-    dates = {file.split("~")[0] for file in files}
-    dates = sorted(list(dates))
+    dates = cat.get_distinct_dates(dir_str)
 
     return dates
 
@@ -0,0 +1,284 @@
+# Imports
+import os
+import json
+import time
+import uuid
+import cProfile
+import argparse
+import threading
+import tracemalloc
+import functools
+import itertools
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Every stage record of a run shares one ID; it's kept in the environment so
+# worker processes (spawned on Windows) log under their parent's run
+run_id = os.environ.setdefault("ENERGY_RUN_ID", uuid.uuid4().hex[:12])
+
+log_dir = "logs"
+log_file_nm = "instrumentation.jsonl"
+
+# Set ENERGY_PROFILE_DIR to dump a cProfile of each outermost stage, and
+# ENERGY_TRACE_MEMORY=1 to add the Python-heap peak of each stage (which
+# slows allocation-heavy stages down noticeably)
+profile_dir = os.environ.get("ENERGY_PROFILE_DIR") or None
+trace_memory = os.environ.get("ENERGY_TRACE_MEMORY", "") not in ("", "0")
+
+_lock = threading.Lock()
+_local = threading.local()
+_profile_counter = itertools.count(1)
+
+
+def get_log_path() -> str:
+    """
+    Returns the full path to the instrumentation log, creating its directory
+    if it doesn't exist yet.
+    """
+    path = os.path.join(os.getcwd(), log_dir)
+    os.makedirs(path, exist_ok=True)
+
+    return os.path.join(path, log_file_nm)
+
+
+def get_peak_rss_mb():
+    """
+    Returns the peak resident memory of the current process in MB, or None
+    where the resource module isn't available.
+    """
+    if resource is None:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_record(record: dict) -> None:
+    """
+    Appends a single record to the log as one JSON line. Each line goes out
+    in a single append so records from concurrent processes don't interleave.
+    """
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        with open(get_log_path(), "a", encoding="utf-8") as f:
+            f.write(line)
+
+    return None
+
+
+def get_stack() -> list:
+    """
+    Returns the stack of stages open in the current thread.
+    """
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+
+    return _local.stack
+
+
+def fold_py_peak(peaks: list) -> None:
+    """
+    Folds the Python-heap peak since the last reset into every open stage of
+    this thread, then resets it, so nested stages each get their own peak
+    without hiding it from the stages enclosing them. Before Python 3.9
+    there's no reset and the peak is the one since tracing started.
+    """
+    _, py_peak = tracemalloc.get_traced_memory()
+    peaks[:] = [max(peak, py_peak) for peak in peaks]
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+    return None
+
+
+def start_profiler():
+    """
+    Starts a profiler for a stage if profiling is on and no enclosing stage of
+    this thread is already being profiled.
+    :return: Running cProfile.Profile, or None
+    """
+    if profile_dir is None or getattr(_local, "profiling", False):
+        return None
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # Another thread's profiler is active (Python 3.12+)
+        return None
+    _local.profiling = True
+
+    return profiler
+
+
+def dump_profile(profiler, name: str) -> str:
+    """
+    Stops a stage's profiler and dumps its stats to
+    '<profile_dir>/<run_id>/<stage> ~ <pid> ~ <n>.prof'.
+    :return: Full path of the .prof file written
+    """
+    profiler.disable()
+    _local.profiling = False
+
+    dir_to_write = os.path.join(profile_dir, run_id)
+    os.makedirs(dir_to_write, exist_ok=True)
+
+    path_to_write = os.path.join(
+        dir_to_write, f"{name} ~ {os.getpid()} ~ {next(_profile_counter)}.prof"
+    )
+    profiler.dump_stats(path_to_write)
+
+    return path_to_write
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """
+    Times a stage of the pipeline and logs a record of its wall time, CPU
+    time and memory once it finishes, whether or not it raised.
+
+        with ins.stage("etl.pivot", file=file_nm):
+            ...
+
+    CPU time is reported both for the process and for the calling thread;
+    the former includes every thread of the process (e.g. concurrent
+    browser sessions), neither includes worker processes, which log their
+    own stages. rss_peak_mb is the process's high-water mark so far and
+    py_peak_mb (with trace_memory) the Python heap's peak during the stage,
+    which counts allocations of every thread of the process.
+    :param name: Dotted stage name (e.g. 'etl.pivot')
+    :param fields: Extra JSON-serializable fields to log (e.g. product)
+    """
+    stack = get_stack()
+    parent = stack[-1] if stack else None
+    stack.append(name)
+
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if not hasattr(_local, "py_peaks"):
+            _local.py_peaks = []
+        fold_py_peak(_local.py_peaks)
+        _local.py_peaks.append(0)
+
+    profiler = start_profiler()
+    started_at = datetime.now().isoformat(timespec="milliseconds")
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    thread_cpu_start = time.thread_time()
+
+    status = "ok"
+    try:
+        yield
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        record = {
+            "event": "stage",
+            "run_id": run_id,
+            "stage": name,
+            "parent": parent,
+            "status": status,
+            "started_at": started_at,
+            "wall_seconds": round(time.perf_counter() - wall_start, 6),
+            "cpu_seconds": round(time.process_time() - cpu_start, 6),
+            "thread_cpu_seconds": round(time.thread_time() - thread_cpu_start, 6),
+            "rss_peak_mb": get_peak_rss_mb(),
+            "pid": os.getpid(),
+        }
+        if trace_memory:
+            fold_py_peak(_local.py_peaks)
+            record["py_peak_mb"] = round(_local.py_peaks.pop() / 1024**2, 3)
+        if profiler is not None:
+            record["profile"] = dump_profile(profiler, name)
+        record.update(fields)
+
+        stack.pop()
+        write_record(record)
+
+
+def timed(name: str):
+    """
+    Decorator running every call of a function as a stage.
+    :param name: Dotted stage name
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def read_records(path_to_log: str = None) -> list:
+    """
+    Reads in every stage record of the instrumentation log.
+    :param path_to_log: Full path to the log (defaults to get_log_path())
+    :return: List of records in the order they were written
+    """
+    path_to_log = path_to_log or get_log_path()
+    if not os.path.isfile(path_to_log):
+        return []
+
+    with open(path_to_log, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_runs(n_runs: int = 5, path_to_log: str = None, threshold=1.5):
+    """
+    Prints the total wall time of every stage over the last n_runs runs,
+    flagging stages of the latest run that took more than threshold times
+    their median over the runs before it.
+    :param n_runs: Number of most recent runs to show
+    :param path_to_log: Full path to the log (defaults to get_log_path())
+    :param threshold: Ratio to the previous median above which a stage is
+    flagged
+    :return: Dictionary of stage: ratio for the flagged stages
+    """
+    import pandas as pd
+
+    records = [r for r in read_records(path_to_log) if r.get("event") == "stage"]
+    if not records:
+        print("<No instrumentation records yet>")
+        return {}
+
+    df = pd.DataFrame(records)
+    run_order = df.groupby("run_id")["started_at"].min().sort_values()
+    runs = run_order.index[-n_runs:].tolist()
+
+    table = (
+        df[df["run_id"].isin(runs)]
+        .pivot_table(
+            index="stage", columns="run_id", values="wall_seconds", aggfunc="sum"
+        )
+        .reindex(columns=runs)
+    )
+    print(table.round(3).to_string())
+
+    flagged = {}
+    if len(runs) > 1:
+        ratios = table[runs[-1]] / table[runs[:-1]].median(axis=1)
+        flagged = ratios[ratios > threshold].round(2).to_dict()
+        for stage_name, ratio in flagged.items():
+            print(f"\t<{stage_name} took {ratio}x its previous median>")
+
+    return flagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarize stage timings of the most recent runs"
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--log", default=None)
+    parser.add_argument("--threshold", type=float, default=1.5)
+    args = parser.parse_args()
+
+    summarize_runs(args.runs, args.log, args.threshold)
@@ -3,16 +3,35 @@ import Crawler as cr
 import FileHelper as fh
 import ETL as etl
 import ETL_Combine_Processed as combine
+import Changes as chg
+import Catalog as cat
+import Instrument as ins
 import random
 import time
+from functools import partial
 
 import os
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
 
 cwd = os.path.join(os.getcwd().split("Energy-Scraping")[0], "Energy-Scraping")
 os.chdir(cwd)
 
+print(f"<Run ID: {ins.run_id}>")
+
+# Scraping settings*****
+# Every product page is on the same host, and host_slot() lets one request at
+# a time through to a host with a randomized pause of
+# minutes_page_sleep_floor to minutes_page_sleep_ceiling minutes after each:
+# the site sees one request every 2-5 minutes however many sessions run, so
+# n_sessions > 1 doesn't shorten the run (it only overlaps browser start-up
+# and parsing). What does is fast_path: pages are fetched without a browser
+# (no Chrome start-up, no 3-8 second wait and scrolling per page), and only
+# rendered in Chrome when that yields no table
+n_sessions = 1
+fast_path = True
+headless = False
+minutes_page_sleep_floor = 2
+minutes_page_sleep_ceiling = 5
+
 # from importlib import reload
 # reload(cr)
 # reload(fh)
@@ -33,21 +52,25 @@ urls = fh.read_and_shuffle_hrefs()
 # Scraping************************
 # browser = webdriver.Chrome(os.path.join(os.getcwd(), r'chromedriver.exe'))
 # browser = webdriver.Chrome(ChromeDriverManager().install())
-try:
-    browser = webdriver.Chrome(os.path.join(os.getcwd(), r"chromedriver.exe"))
-except:
-    browser = webdriver.Chrome(ChromeDriverManager().install())
-
-
-browser.maximize_window()
-
-dict_of_dfs = cr.get_dict_of_dfs(urls, browser)
+# browser.maximize_window()
+# dict_of_dfs = cr.get_dict_of_dfs(urls, browser)
+
+with ins.stage("main.scrape", n_products=len(urls)):
+    dict_of_dfs = cr.get_dict_of_dfs_concurrent(
+        urls,
+        partial(cr.make_browser, headless),
+        n_sessions,
+        minutes_page_sleep_floor,
+        minutes_page_sleep_ceiling,
+        fast_path=fast_path,
+    )
 
 # Combining daily results**********
 df_total = fh.combine_scraped_dfs(dict_of_dfs)
 
 
-fh.save_raw_file(df_total, "Combined Output", "outputs_csv")
+with ins.stage("main.save_csv"):
+    fh.save_raw_file(df_total, "Combined Output", "outputs_csv")
 
 # Getting most recently modified file*****
 most_recently_modified_file = fh.get_path_to_most_recent_file()
@@ -57,6 +80,10 @@ most_recently_modified_file = fh.get_path_to_most_recent_file()
 # Running through pipeline*********
 etl.run_pipeline(most_recently_modified_file)
 
+# Computing day-over-day changes against the previously persisted day*****
+date_str, _, _ = cat.parse_file_name(os.path.split(most_recently_modified_file)[-1])
+chg.update_changes(date_str)
+
 # Running the combining of all-processed files through initial ETL
 project_path = os.path.join(os.getcwd(), "etl_outputs_xlsx")
 user_path = r"D:\Dropbox\1 - CME Group Futures Files"
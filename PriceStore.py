@@ -0,0 +1,381 @@
+# Imports
+import os
+import glob
+import hashlib
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import ETL as etl
+import Schema as sch
+import FileHelper as fh
+
+store_dir_nm = "price_store"
+partition_prefix = "collected_date="
+
+# One row per collected date, metric and contract month; contract_month is
+# the YYYYMM rank ETL.get_month_rank_col() gives and month its CME label
+key_cols = ["collected_date", "metric_id", "contract_month"]
+store_cols = key_cols + [
+    "month",
+    "prior_settle",
+    "updated_date",
+    "updated_time",
+    "updated_time_zone",
+    "source",
+    "ingested_at",
+]
+
+
+def get_store_dir(store_dir: str = None) -> str:
+    """
+    Returns the full path to the price store, creating it if it doesn't exist
+    yet.
+    """
+    store_dir = store_dir or os.path.join(os.getcwd(), store_dir_nm)
+    os.makedirs(store_dir, exist_ok=True)
+
+    return store_dir
+
+
+def get_partition_dir(date_str: str, store_dir: str = None) -> str:
+    """
+    Returns the full path to the partition of a collected date.
+    """
+    return os.path.join(get_store_dir(store_dir), f"{partition_prefix}{date_str}")
+
+
+def from_exploded_df(df: pd.DataFrame, source: str = None) -> pd.DataFrame:
+    """
+    Converts a scrape exploded by ETL.explode_scraped_df() (already long
+    format, one row per metric and contract month) into typed store rows.
+    :param df: Output of ETL.explode_scraped_df()
+    :param source: Name of the file the rows were read from
+    :return: DataFrame of store_cols
+    """
+    long_df = pd.DataFrame(
+        {
+            "collected_date": pd.to_datetime(
+                df["collected_date"], format=sch.date_format
+            ),
+            "metric_id": df["metric_id"].astype(str),
+            "contract_month": etl.get_month_rank_col(df["month"]),
+            "month": df["month"].astype(str),
+            "prior_settle": pd.to_numeric(
+                df["prior_settle"].replace("-", np.nan)
+            ).astype("float64"),
+            "updated_date": pd.to_datetime(
+                df["last_updated_date"], format=sch.date_format, errors="coerce"
+            ),
+            "updated_time": df["last_updated_time_local"],
+            "updated_time_zone": df["last_updated_time_zone"],
+            "source": source,
+        }
+    )
+    long_df["ingested_at"] = pd.Timestamp(datetime.now())
+
+    return long_df.reset_index(drop=True)
+
+
+def get_content_hash(df: pd.DataFrame) -> str:
+    """
+    Returns a hash of store rows' contents, ignoring when they were ingested,
+    so the same rows appended twice hash the same.
+    """
+    row_hashes = pd.util.hash_pandas_object(
+        df[[col for col in store_cols if col != "ingested_at"]], index=False
+    )
+
+    return hashlib.sha1(row_hashes.to_numpy().tobytes()).hexdigest()[:16]
+
+
+def append_prices(long_df: pd.DataFrame, store_dir: str = None) -> list:
+    """
+    Appends store rows to the partition of each of their collected dates.
+    Existing files are never rewritten: every append adds a new part file
+    (written to a temp file and renamed into place), and queries resolve
+    each key to its most recently ingested row. Part files are named after
+    their rows' contents, so re-appending rows a partition already holds
+    (e.g. re-running the ETL on the same scrape) writes nothing.
+    :param long_df: Output of from_exploded_df()
+    :param store_dir: Store directory
+    :return: List of full paths to the part files written
+    """
+    paths_written = []
+    for collected_date, df in long_df.groupby("collected_date", sort=True):
+        date_str = collected_date.strftime(sch.date_format)
+        partition_dir = get_partition_dir(date_str, store_dir)
+        os.makedirs(partition_dir, exist_ok=True)
+
+        content_hash = get_content_hash(df)
+        if glob.glob(os.path.join(partition_dir, f"part-*-{content_hash}.parquet")):
+            continue
+
+        else:
+            pass
+
+        file_nm = (
+            f"part-{datetime.now().strftime('%Y%m%d%H%M%S%f')}-"
+            f"{content_hash}.parquet"
+        )
+        path_to_write = os.path.join(partition_dir, file_nm)
+        df[store_cols].to_parquet(f"{path_to_write}.tmp", index=False)
+        os.replace(f"{path_to_write}.tmp", path_to_write)
+
+        paths_written.append(path_to_write)
+
+    return paths_written
+
+
+def ingest_csv(path_str: str, store_dir: str = None) -> list:
+    """
+    Reads, explodes and appends a single 'Combined Output' CSV to the store.
+    :param path_str: Full path to the CSV
+    :param store_dir: Store directory
+    :return: List of full paths to the part files written
+    """
+    df = etl.explode_scraped_df(etl.read_csv_from_path(path_str))
+
+    return append_prices(from_exploded_df(df, os.path.split(path_str)[-1]), store_dir)
+
+
+def list_partitions(store_dir: str = None) -> list:
+    """
+    Returns the sorted collected dates that have a partition in the store.
+    """
+    with os.scandir(get_store_dir(store_dir)) as entries:
+        return sorted(
+            entry.name[len(partition_prefix) :]
+            for entry in entries
+            if entry.is_dir() and entry.name.startswith(partition_prefix)
+        )
+
+
+def prune_partitions(
+    start_date: str = None, end_date: str = None, store_dir: str = None
+) -> list:
+    """
+    Returns the collected dates between start_date and end_date (inclusive,
+    either open-ended), judged from the partition names alone so no file
+    outside the range is opened.
+    """
+    return [
+        date_str
+        for date_str in list_partitions(store_dir)
+        if (start_date is None or date_str >= start_date)
+        and (end_date is None or date_str <= end_date)
+    ]
+
+
+def resolve_latest(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keeps the most recently ingested row of every key.
+    """
+    df = df.sort_values("ingested_at", kind="mergesort")
+
+    return df.drop_duplicates(subset=key_cols, keep="last")
+
+
+def read_partition(date_str: str, columns: list = None, store_dir=None):
+    """
+    Reads every part file of a collected date's partition, resolved to the
+    latest ingest of each key.
+    :param date_str: Collected date ('YYYY-MM-DD')
+    :param columns: Columns to return (defaults to all of store_cols)
+    :param store_dir: Store directory
+    :return: DataFrame of the partition's rows
+    """
+    partition_dir = get_partition_dir(date_str, store_dir)
+    if not os.path.isdir(partition_dir):
+        raise KeyError(f"No prices stored for {date_str}")
+
+    # The key and ingest columns are always read so rows can be resolved
+    cols_to_read = store_cols
+    if columns is not None:
+        cols_to_read = list(dict.fromkeys(key_cols + ["ingested_at"] + columns))
+
+    parts = [
+        pq.read_table(os.path.join(partition_dir, file), columns=cols_to_read)
+        for file in sorted(os.listdir(partition_dir))
+        if file.endswith(".parquet")
+    ]
+    df = resolve_latest(pd.concat([part.to_pandas() for part in parts]))
+
+    return df[columns or store_cols].reset_index(drop=True)
+
+
+def query_prices(
+    start_date: str = None,
+    end_date: str = None,
+    metric_ids: list = None,
+    first_month: int = None,
+    last_month: int = None,
+    columns: list = None,
+    store_dir: str = None,
+) -> pd.DataFrame:
+    """
+    Returns stored prices for a range of collected dates, optionally limited
+    to some metrics and a range of contract months. Only the partitions in
+    the date range are read.
+    :param start_date: First collected date ('YYYY-MM-DD', inclusive)
+    :param end_date: Last collected date ('YYYY-MM-DD', inclusive)
+    :param metric_ids: Metrics to return (e.g. ['WTI', 'Brent'])
+    :param first_month: First contract month as YYYYMM (inclusive)
+    :param last_month: Last contract month as YYYYMM (inclusive)
+    :param columns: Columns to return (defaults to all of store_cols)
+    :param store_dir: Store directory
+    :return: DataFrame sorted by collected date, metric and contract month
+    """
+    dfs = []
+    for date_str in prune_partitions(start_date, end_date, store_dir):
+        df = read_partition(date_str, columns and key_cols + columns, store_dir)
+
+        mask = np.ones(len(df), dtype=bool)
+        if metric_ids is not None:
+            mask &= df["metric_id"].isin(metric_ids).to_numpy()
+        if first_month is not None:
+            mask &= (df["contract_month"] >= first_month).to_numpy()
+        if last_month is not None:
+            mask &= (df["contract_month"] <= last_month).to_numpy()
+
+        dfs.append(df[mask])
+
+    if not dfs:
+        return pd.DataFrame(columns=columns or store_cols)
+
+    df = pd.concat(dfs, ignore_index=True).sort_values(key_cols, kind="mergesort")
+    df["metric_id"] = df["metric_id"].astype("category")
+
+    return df[list(dict.fromkeys(key_cols + columns)) if columns else store_cols]
+
+
+def get_contract_history(
+    metric_id: str,
+    contract_month: int,
+    start_date: str = None,
+    end_date: str = None,
+    store_dir: str = None,
+) -> pd.Series:
+    """
+    Returns the prior settle of a single contract across collected dates
+    (e.g. WTI Dec-2021 as it was quoted on every date).
+    :param metric_id: Metric (e.g. 'WTI')
+    :param contract_month: Contract month as YYYYMM (e.g. 202112)
+    :param start_date: First collected date ('YYYY-MM-DD', inclusive)
+    :param end_date: Last collected date ('YYYY-MM-DD', inclusive)
+    :param store_dir: Store directory
+    :return: Series of prior settles indexed by collected date
+    """
+    df = query_prices(
+        start_date,
+        end_date,
+        [metric_id],
+        contract_month,
+        contract_month,
+        ["prior_settle"],
+        store_dir,
+    )
+
+    return df.set_index("collected_date")["prior_settle"].rename(
+        f"{metric_id} {contract_month}"
+    )
+
+
+def get_daily_view(date_str: str, store_dir: str = None) -> pd.DataFrame:
+    """
+    Builds the 'Data_Vertical' tab of a date's ETL output from the store:
+    one row per contract month with a price column per metric, and the
+    update metadata of the first metric (in ETL.run_pipeline()'s pivot
+    order) quoting each month.
+    :param date_str: Collected date ('YYYY-MM-DD')
+    :param store_dir: Store directory
+    :return: DataFrame with the template's columns and declared dtypes
+    """
+    df = read_partition(date_str, store_dir=store_dir)
+    df = df.sort_values(["contract_month", "metric_id"], kind="mergesort")
+
+    prices = df.pivot(
+        index="contract_month", columns="metric_id", values="prior_settle"
+    )
+    prices.columns = [f"prior_settle: {col}" for col in prices.columns]
+    etl.prettify_cols_for_export(prices)
+
+    # ETL.coalesce_multiple() takes each month's update metadata from the
+    # first metric (in pivot order) quoting it: unparsed values are '-'/'_'
+    # placeholders there rather than nulls, so they aren't skipped. The store
+    # reads the '_' date back as NaT, so the first row is taken as a whole
+    # instead of the first non-null value of each column
+    meta_cols = ["month", "updated_date", "updated_time", "updated_time_zone"]
+    meta = df.drop_duplicates("contract_month", keep="first")
+    meta = meta.set_index("contract_month")[meta_cols]
+
+    view = pd.concat([meta, prices], axis=1).reset_index()
+    view["USGC-HSFO"] = view["USGC-HSFO (/bbl)"] / 42
+    view.rename(
+        columns={
+            "contract_month": "Month Rank",
+            "month": "Month",
+            "updated_date": "Updated Date",
+            "updated_time": "Updated Time",
+            "updated_time_zone": "Updated Time Zone",
+        },
+        inplace=True,
+    )
+    view["Lookup-Key"] = f"{date_str} - " + pd.Series(view.index).astype(str)
+    view["Collected Date"] = date_str
+
+    return sch.enforce_schema(view.reindex(columns=list(sch.output_schema)))
+
+
+def get_combined_view(
+    start_date: str = None, end_date: str = None, store_dir: str = None
+) -> pd.DataFrame:
+    """
+    Builds the 'Combined_Vertical' tab from the store: every daily view in
+    the date range, truncated and concatenated as the combine step does.
+    :param start_date: First collected date ('YYYY-MM-DD', inclusive)
+    :param end_date: Last collected date ('YYYY-MM-DD', inclusive)
+    :param store_dir: Store directory
+    :return: DataFrame with the template's columns and declared dtypes
+    """
+    import ETL_Combine_Processed as combine
+
+    return sch.concat_typed(
+        [
+            combine.truncate_df(get_daily_view(date_str, store_dir))
+            for date_str in prune_partitions(start_date, end_date, store_dir)
+        ]
+    )
+
+
+def ingest_csv_dir(dir_to_read: str = "outputs_csv", store_dir: str = None) -> int:
+    """
+    Backfills the store from the latest 'Combined Output' CSV of every date
+    in a directory that doesn't have a partition yet.
+    :param dir_to_read: Directory of scraping CSVs
+    :param store_dir: Store directory
+    :return: Number of dates ingested
+    """
+    stored = set(list_partitions(store_dir))
+    dates = [d for d in fh.get_distinct_dates_from_dir(dir_to_read) if d not in stored]
+
+    print(f"<{len(dates)} dates to ingest into the price store>")
+    for i, date_str in enumerate(dates, start=1):
+        path_str = fh.get_latest_file_for_date(dir_to_read, date_str)
+        ingest_csv(path_str, store_dir)
+        print(f"\t[{i}/{len(dates)}] {os.path.split(path_str)[-1]}")
+
+    return len(dates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfill the long-format price store from scraping CSVs"
+    )
+    parser.add_argument("--dir", default="outputs_csv")
+    parser.add_argument("--store-dir", default=None)
+    args = parser.parse_args()
+
+    ingest_csv_dir(args.dir, args.store_dir)
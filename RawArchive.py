@@ -0,0 +1,285 @@
+# Imports
+import os
+import io
+import re
+import gzip
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # Falls back to gzip, which is always available
+    zstandard = None
+
+# Blobs are written with zstd when it's installed and gzip otherwise; both are
+# always readable as long as the library for a given blob is present
+codec = "zst" if zstandard is not None else "gz"
+
+index_file_nm = "index.jsonl"
+
+# Legacy plain-text pages follow the 'date ~ name ~ vN.txt' convention
+txt_file_pattern = (
+    r"^(?P<date>\d{4}-\d{2}-\d{2}) ~ (?P<name>.+) ~ v(?P<version>\d+)\.txt$"
+)
+
+# Browser sessions save pages from several threads at once
+_lock = threading.Lock()
+
+
+def get_archive_dir(archive_dir: str = "outputs_raw") -> str:
+    """
+    Returns the full path to the archive directory, creating it (and its
+    blob directory) if it doesn't exist yet.
+    """
+    path = os.path.join(os.getcwd(), archive_dir)
+    os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+
+    return path
+
+
+def get_blob_path(archive_path: str, blob: str) -> str:
+    """
+    Returns the full path of a blob, sharded by the first two characters of
+    its hash so no single directory grows too large.
+    """
+    digest = blob.split(".")[0]
+
+    return os.path.join(archive_path, "blobs", digest[:2], blob)
+
+
+def compress(data: bytes, blob_codec: str = codec) -> bytes:
+    """
+    Compresses bytes with zstd or gzip.
+    """
+    if blob_codec == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+
+    return gzip.compress(data, compresslevel=6)
+
+
+def read_index(archive_dir: str = "outputs_raw") -> list:
+    """
+    Reads in the archive index.
+    :param archive_dir: Archive directory
+    :return: List of entries of {date, name, version, blob, size}, in the
+    order the pages were saved
+    """
+    path_to_index = os.path.join(get_archive_dir(archive_dir), index_file_nm)
+    if not os.path.isfile(path_to_index):
+        return []
+
+    with open(path_to_index, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_blob(data: bytes, archive_path: str) -> str:
+    """
+    Writes compressed bytes under their content hash, skipping the write if
+    an identical page is already stored.
+    :param data: Uncompressed page bytes
+    :param archive_path: Full path to archive directory
+    :return: Blob file name
+    """
+    blob = f"{hashlib.sha256(data).hexdigest()}.{codec}"
+    path_to_write = get_blob_path(archive_path, blob)
+
+    if not os.path.isfile(path_to_write):
+        os.makedirs(os.path.dirname(path_to_write), exist_ok=True)
+        with open(f"{path_to_write}.tmp", "wb") as f:
+            f.write(compress(data, codec))
+        os.replace(f"{path_to_write}.tmp", path_to_write)
+
+    return blob
+
+
+def save_page(
+    html: str, name: str, date_str: str = None, archive_dir: str = "outputs_raw"
+) -> dict:
+    """
+    Saves a raw page to the archive under the next version number for its
+    name and date, storing the content only once no matter how many runs
+    scrape an identical page.
+    :param html: Raw page
+    :param name: Name of Href the page was scraped from
+    :param date_str: Collected date (defaults to today)
+    :param archive_dir: Archive directory
+    :return: Index entry of the saved page
+    """
+    date_str = date_str or str(datetime.today()).split(" ")[0]
+    archive_path = get_archive_dir(archive_dir)
+    data = html.encode("utf-8")
+
+    with _lock:
+        blob = write_blob(data, archive_path)
+
+        versions = [
+            entry["version"]
+            for entry in read_index(archive_dir)
+            if entry["date"] == date_str and entry["name"] == name
+        ]
+        entry = {
+            "date": date_str,
+            "name": name,
+            "version": max(versions, default=0) + 1,
+            "blob": blob,
+            "size": len(data),
+        }
+
+        with open(
+            os.path.join(archive_path, index_file_nm), "a", encoding="utf-8"
+        ) as f:
+            f.write(json.dumps(entry) + "\n")
+
+    return entry
+
+
+def open_blob(blob: str, archive_dir: str = "outputs_raw"):
+    """
+    Opens a stored page as a text stream that decompresses as it's read.
+    :param blob: Blob file name from the index
+    :param archive_dir: Archive directory
+    :return: Text file object
+    """
+    path_to_read = get_blob_path(get_archive_dir(archive_dir), blob)
+
+    if blob.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"zstandard is required to read {blob}")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path_to_read, "rb"))
+        return io.TextIOWrapper(raw, encoding="utf-8")
+
+    return gzip.open(path_to_read, "rt", encoding="utf-8")
+
+
+def get_entry(
+    date_str: str, name: str, version: int = None, archive_dir: str = "outputs_raw"
+) -> dict:
+    """
+    Looks up the index entry of a page, defaulting to the latest version.
+    :param date_str: Collected date
+    :param name: Name of Href
+    :param version: Version number (defaults to the latest)
+    :param archive_dir: Archive directory
+    :return: Index entry
+    """
+    entries = [
+        entry
+        for entry in read_index(archive_dir)
+        if entry["date"] == date_str
+        and entry["name"] == name
+        and (version is None or entry["version"] == version)
+    ]
+    if not entries:
+        raise KeyError(f"No archived page for {date_str} ~ {name} ~ v{version}")
+
+    return max(entries, key=lambda entry: entry["version"])
+
+
+def open_page(
+    date_str: str, name: str, version: int = None, archive_dir: str = "outputs_raw"
+):
+    """
+    Opens an archived page as a decompressing text stream.
+    """
+    entry = get_entry(date_str, name, version, archive_dir)
+
+    return open_blob(entry["blob"], archive_dir)
+
+
+def read_page(
+    date_str: str, name: str, version: int = None, archive_dir: str = "outputs_raw"
+) -> str:
+    """
+    Reads in a single archived page.
+    """
+    with open_page(date_str, name, version, archive_dir) as f:
+        return f.read()
+
+
+def iter_pages(date_str: str = None, name: str = None, archive_dir="outputs_raw"):
+    """
+    Yields archived pages one at a time, so only a single page is ever
+    decompressed in memory.
+    :param date_str: Only yield pages collected on this date
+    :param name: Only yield pages of this Href name
+    :param archive_dir: Archive directory
+    :return: Generator of (index entry, page)
+    """
+    for entry in read_index(archive_dir):
+        if date_str is not None and entry["date"] != date_str:
+            continue
+        if name is not None and entry["name"] != name:
+            continue
+
+        with open_blob(entry["blob"], archive_dir) as f:
+            yield entry, f.read()
+
+
+def import_txt_dir(dir_to_read: str = "outputs_txt", archive_dir="outputs_raw"):
+    """
+    Imports legacy 'date ~ name ~ vN.txt' pages into the archive, keeping
+    their original dates and version numbers. Pages already in the index are
+    skipped, so the import can be re-run safely. The .txt files are left in
+    place to be removed by hand once the import is checked.
+    :param dir_to_read: Directory of legacy plain-text pages
+    :param archive_dir: Archive directory
+    :return: Dictionary of counts of pages imported, skipped and bytes saved
+    """
+    archive_path = get_archive_dir(archive_dir)
+    existing = {
+        (entry["date"], entry["name"], entry["version"])
+        for entry in read_index(archive_dir)
+    }
+
+    counts = {"imported": 0, "skipped": 0, "bytes_in": 0}
+    new_entries = []
+    for file in sorted(os.listdir(dir_to_read)):
+        match = re.match(txt_file_pattern, file)
+        if not match:
+            continue
+
+        key = (match.group("date"), match.group("name"), int(match.group("version")))
+        if key in existing:
+            counts["skipped"] += 1
+            continue
+
+        with open(os.path.join(dir_to_read, file), "rb") as f:
+            data = f.read()
+
+        new_entries.append(
+            {
+                "date": key[0],
+                "name": key[1],
+                "version": key[2],
+                "blob": write_blob(data, archive_path),
+                "size": len(data),
+            }
+        )
+        counts["imported"] += 1
+        counts["bytes_in"] += len(data)
+
+    with _lock:
+        with open(
+            os.path.join(archive_path, index_file_nm), "a", encoding="utf-8"
+        ) as f:
+            for entry in new_entries:
+                f.write(json.dumps(entry) + "\n")
+
+    counts["bytes_out"] = sum(
+        os.path.getsize(os.path.join(root, file))
+        for root, _, files in os.walk(os.path.join(archive_path, "blobs"))
+        for file in files
+    )
+    print(
+        f"<Imported {counts['imported']} pages ({counts['skipped']} skipped) "
+        f"from {dir_to_read}: {counts['bytes_in'] / 1024**2:.1f} MB -> "
+        f"{counts['bytes_out'] / 1024**2:.1f} MB archive>"
+    )
+
+    return counts
+
+
+if __name__ == "__main__":
+    import_txt_dir()
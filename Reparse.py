@@ -0,0 +1,259 @@
+# Imports
+import os
+import json
+import argparse
+import contextlib
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import Crawler as cr
+import FileHelper as fh
+import ETL_All as eta
+import RawArchive as ra
+import Catalog as cat
+import Changes as chg
+
+
+def get_raw_file_index(archive_dir: str = "outputs_raw") -> dict:
+    """
+    Indexes the raw HTML archive by date, product name and version.
+    :param archive_dir: Archive directory
+    :return: Dictionary of date: {name: {version: blob}}
+    """
+    index = {}
+    for entry in ra.read_index(archive_dir):
+        index.setdefault(entry["date"], {}).setdefault(entry["name"], {})[
+            entry["version"]
+        ] = entry["blob"]
+
+    return index
+
+
+def get_run_groups(raw_file_index: dict) -> dict:
+    """
+    Groups raw pages into scraping runs: run vN of a date is made up of each
+    product's vN page, or its latest earlier version if that product wasn't
+    re-scraped in run N.
+    :param raw_file_index: Output of get_raw_file_index()
+    :return: Dictionary of (date, version): {name: blob}
+    """
+    groups = {}
+    for date_str, names in sorted(raw_file_index.items()):
+        n_runs = max(max(versions) for versions in names.values())
+
+        for run in range(1, n_runs + 1):
+            groups[(date_str, run)] = {
+                name: versions[max(v for v in versions if v <= run)]
+                for name, versions in sorted(names.items())
+                if min(versions) <= run
+            }
+
+    return groups
+
+
+def get_signature(dict_of_blobs: dict) -> list:
+    """
+    Returns the (name, blob) of every page in a run so that a rebuilt output
+    can be redone if any of its pages change; blobs are content hashes.
+    """
+    return [[name, blob] for name, blob in sorted(dict_of_blobs.items())]
+
+
+def reparse_run(
+    date_str: str,
+    version: int,
+    dict_of_blobs: dict,
+    out_dir: str,
+    archive_dir: str = "outputs_raw",
+):
+    """
+    Parses every raw page of a run and writes the combined output CSV in the
+    same shape Main.py writes it.
+    :param date_str: Collected date of the run
+    :param version: Version number of the run
+    :param dict_of_blobs: Dictionary of name: archived blob
+    :param out_dir: Directory to write the 'Combined Output' CSV to
+    :param archive_dir: Archive directory
+    :return: Full path of the CSV written
+    """
+    dict_of_dfs = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, blob in dict_of_blobs.items():
+            with ra.open_blob(blob, archive_dir) as f:
+                html = f.read()
+
+            # Pages saved by the crawler's fast path hold the quotes as
+            # embedded JSON rather than a rendered table
+            current_tmstmp = f"{date_str} 00:00:00"
+            df = cr.df_from_html_fast(html, name, current_tmstmp)
+            if df is None:
+                df, _ = cr.df_from_html(html, name, current_tmstmp)
+            else:
+                pass
+            dict_of_dfs[name] = df
+
+        df_total = fh.combine_scraped_dfs(dict_of_dfs)
+
+    path_to_write = os.path.join(
+        out_dir, f"{date_str} ~ Combined Output ~ v{version}.csv"
+    )
+    df_total.to_csv(path_to_write, index=False)
+    cat.register_file(path_to_write)
+
+    return path_to_write
+
+
+def read_progress(path_to_progress: str) -> dict:
+    """
+    Reads in the progress file of runs already rebuilt.
+    """
+    if not os.path.isfile(path_to_progress):
+        return {}
+
+    with open(path_to_progress, "r") as f:
+        return json.load(f)
+
+
+def write_progress(progress: dict, path_to_progress: str) -> None:
+    """
+    Writes out the progress file through a temp file and rename.
+    """
+    with open(f"{path_to_progress}.tmp", "w") as f:
+        json.dump(progress, f, indent=2, sort_keys=True)
+    os.replace(f"{path_to_progress}.tmp", path_to_progress)
+
+    return None
+
+
+def run_reparse(
+    archive_dir: str = "outputs_raw",
+    out_dir: str = "outputs_csv_reparsed",
+    n_workers: int = None,
+    force: bool = False,
+    run_etl: bool = True,
+) -> list:
+    """
+    Rebuilds the 'Combined Output' CSVs from the raw HTML archive in a process
+    pool, then re-runs the ETL on the latest run of every date the way
+    ETL_All.run_backfill() does (sharing the Dropbox write lock and carrying
+    on past failed dates). Progress is recorded after each run, so an
+    interrupted backfill resumes where it left off and only re-does runs
+    whose raw pages have changed.
+    :param archive_dir: Archive directory
+    :param out_dir: Directory to write the rebuilt CSVs to
+    :param n_workers: Number of worker processes (defaults to CPU count)
+    :param force: Boolean value indicating whether to ignore progress and
+    rebuild everything
+    :param run_etl: Boolean value indicating whether to re-run the ETL on the
+    latest rebuilt CSV of each date
+    :return: List of full paths to CSVs rebuilt in this call
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path_to_progress = os.path.join(out_dir, "_reparse_progress.json")
+    progress = {} if force else read_progress(path_to_progress)
+
+    groups = get_run_groups(get_raw_file_index(archive_dir))
+
+    to_do = {}
+    for (date_str, version), dict_of_blobs in groups.items():
+        key = f"{date_str} ~ v{version}"
+        if progress.get(key) != get_signature(dict_of_blobs):
+            to_do[key] = (date_str, version, dict_of_blobs)
+
+    print(f"<{len(to_do)} of {len(groups)} runs to re-parse from {archive_dir}>")
+
+    rebuilt = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {
+            executor.submit(
+                reparse_run, date_str, version, dict_of_blobs, out_dir, archive_dir
+            ): key
+            for key, (date_str, version, dict_of_blobs) in to_do.items()
+        }
+
+        for i, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                rebuilt.append(future.result())
+            except Exception as e:
+                print(f"\t[{i}/{len(futures)}] {key} failed: {e}")
+                continue
+
+            progress[key] = get_signature(to_do[key][2])
+            write_progress(progress, path_to_progress)
+            print(f"\t[{i}/{len(futures)}] {key} re-parsed")
+
+    if run_etl and rebuilt:
+        # Latest run of each date taken from the run groups, not the directory
+        rebuilt_dates = {os.path.split(path)[-1][:10] for path in rebuilt}
+        latest_runs = {}
+        for date_str, version in groups:
+            if date_str in rebuilt_dates:
+                latest_runs[date_str] = max(version, latest_runs.get(date_str, 0))
+
+        latest_files = [
+            os.path.join(out_dir, f"{date_str} ~ Combined Output ~ v{version}.csv")
+            for date_str, version in sorted(latest_runs.items())
+        ]
+
+        results = []
+        lock = multiprocessing.Lock()
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=eta.init_worker, initargs=(lock,)
+        ) as executor:
+            futures = [executor.submit(eta.run_file, file) for file in latest_files]
+
+            for i, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                results.append(result)
+
+                status = f"failed: {result['error']}" if result["error"] else "done"
+                print(
+                    f"\t[{i}/{len(latest_files)}] ETL re-run {status} "
+                    f"({os.path.split(result['path'])[-1]})"
+                )
+
+        # Dates ran out of order, so changes are chained afterwards from the
+        # earliest date re-run on
+        dates_run = [
+            cat.parse_file_name(os.path.split(result["path"])[-1])[0]
+            for result in results
+            if not result["error"]
+        ]
+        if dates_run:
+            chg.rebuild_changes(min(dates_run))
+        else:
+            pass
+
+    print(f"<Re-parse completed: {len(rebuilt)} runs rebuilt>")
+
+    return rebuilt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild the combined CSVs and ETL outputs from raw pages"
+    )
+    parser.add_argument("--archive-dir", default="outputs_raw")
+    parser.add_argument(
+        "--import-txt",
+        default=None,
+        help="Import a directory of legacy .txt pages into the archive first",
+    )
+    parser.add_argument("--out-dir", default="outputs_csv_reparsed")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="Ignore progress and redo every run"
+    )
+    parser.add_argument(
+        "--skip-etl", action="store_true", help="Only rebuild the combined CSVs"
+    )
+    args = parser.parse_args()
+
+    if args.import_txt:
+        ra.import_txt_dir(args.import_txt, args.archive_dir)
+
+    run_reparse(
+        args.archive_dir, args.out_dir, args.workers, args.force, not args.skip_etl
+    )
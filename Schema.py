@@ -0,0 +1,131 @@
+# Imports
+import json
+import logging
+import pandas as pd
+
+# Dtypes of every column in 'ETL_Output_Template.xlsx', declared once and
+# enforced on every output: 'price' columns take price_dtype, 'date' columns
+# are parsed from 'YYYY-MM-DD' strings
+output_schema = {
+    "Lookup-Key": "object",
+    "Month": "category",
+    "Month Rank": "int32",
+    "WTI": "price",
+    "Brent": "price",
+    "Gasoline-RBOB": "price",
+    "NYH ULSD-Heating Oil": "price",
+    "USGC-ULSD": "price",
+    "USGC-HSFO": "price",
+    "USGC-HSFO (/bbl)": "price",
+    "Collected Date": "date",
+    "Updated Date": "date",
+    "Updated Time": "category",
+    "Updated Time Zone": "category",
+}
+
+# Set to 'float32' to halve the memory taken up by prices; prices keep about
+# 7 significant digits, so derived columns like 'USGC-HSFO' (/bbl / 42) are
+# rounded accordingly
+price_dtype = "float64"
+
+date_format = "%Y-%m-%d"
+
+# Placeholders the ETL writes for dates it couldn't parse (see
+# ETL.unparsed_updated_values). They read back as NaT and are written back
+# out as the placeholder, so the Excel outputs keep them; these columns are
+# never otherwise empty, as every row is a month at least one metric quotes
+date_placeholders = {"Updated Date": "_"}
+
+
+def get_dtype(col: str, price_dtype_to_use: str = None) -> str:
+    """
+    Resolves a column's declared dtype to a pandas dtype.
+    """
+    dtype = output_schema[col]
+    if dtype == "price":
+        return price_dtype_to_use or price_dtype
+    elif dtype == "date":
+        return "datetime64[ns]"
+
+    return dtype
+
+
+def enforce_schema(df: pd.DataFrame, price_dtype_to_use: str = None) -> pd.DataFrame:
+    """
+    Casts every schema column of a DataFrame to its declared dtype, leaving
+    columns already of that dtype untouched. Dates that don't parse become
+    NaT and, unless they're the column's placeholder, are reported as a
+    structured (JSON) log record.
+    :param df: DataFrame with the template's columns
+    :param price_dtype_to_use: Overrides price_dtype (e.g. 'float32')
+    :return: DataFrame with the declared dtypes
+    """
+    df = df.copy(deep=False)
+
+    for col in [col for col in df.columns if col in output_schema]:
+        dtype = get_dtype(col, price_dtype_to_use)
+        if str(df[col].dtype) == dtype:
+            continue
+
+        if output_schema[col] == "date":
+            parsed = pd.to_datetime(df[col], format=date_format, errors="coerce")
+            unparsed = parsed.isna() & df[col].notna()
+            if col in date_placeholders:
+                unparsed &= df[col] != date_placeholders[col]
+            n_unparsed = int(unparsed.sum())
+            if n_unparsed:
+                logging.warning(
+                    json.dumps(
+                        {
+                            "event": "schema_dates_unparsed",
+                            "column": col,
+                            "count": n_unparsed,
+                        }
+                    )
+                )
+            df[col] = parsed
+
+        else:
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+def concat_typed(list_of_dfs: list, price_dtype_to_use: str = None) -> pd.DataFrame:
+    """
+    Concatenates DataFrames with the declared dtypes. pd.concat() falls back
+    to object for categorical columns whose categories differ between
+    frames, so those columns are re-categorized once over the whole result,
+    which is much cheaper than aligning categories frame by frame.
+    :param list_of_dfs: List of DataFrames with the declared dtypes
+    :param price_dtype_to_use: Overrides price_dtype (e.g. 'float32')
+    :return: Single DataFrame with a fresh RangeIndex
+    """
+    combined = pd.concat(list_of_dfs, ignore_index=True)
+
+    return enforce_schema(combined, price_dtype_to_use)
+
+
+def to_excel_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts a DataFrame with the declared dtypes back to the plain values
+    the Excel outputs have always held: dates as 'YYYY-MM-DD' strings (and
+    missing ones as their column's placeholder, if it has one), categoricals
+    as their values and float32 prices as the float64 of their shortest repr
+    (so 1.3735 doesn't export as 1.37349998950958).
+    :param df: DataFrame with the declared dtypes
+    :return: DataFrame ready for to_excel()
+    """
+    df = df.copy(deep=False)
+
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime(date_format)
+            if col in date_placeholders:
+                df[col] = df[col].fillna(date_placeholders[col])
+        elif pd.api.types.is_categorical_dtype(df[col]):
+            df[col] = df[col].astype(object)
+        elif str(df[col].dtype) == "float32":
+            df[col] = df[col].astype(str).astype("float64")
+
+    return df
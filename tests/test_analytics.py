@@ -0,0 +1,136 @@
+# Imports
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+import Analytics as an
+import PriceStore as ps
+
+month_ranks = [202005 + i + 88 * (i // 8) for i in range(13)]  # May 2020 on
+
+
+def get_long_df() -> pd.DataFrame:
+    """
+    Builds the prior settles of two collected dates: WTI in contango over 13
+    months, Brent in backwardation from its second month on, a flat gasoline
+    curve of two months and HSFO (per barrel) on two months.
+    """
+    rows = []
+    for day, date_str in enumerate(["2020-04-09", "2020-04-10"]):
+        date = pd.Timestamp(date_str)
+        for i, month_rank in enumerate(month_ranks):
+            rows.append((date, "WTI", month_rank, 20.0 + i + day))
+            if i > 0:
+                rows.append((date, "Brent", month_rank, 40.0 - i + day))
+        rows += [
+            (date, "Gasoline-RBOB", month_ranks[0], 1.0),
+            (date, "Gasoline-RBOB", month_ranks[1], 1.0),
+            (date, "USGC-HSFO (/bbl)", month_ranks[0], 30.0),
+            (date, "USGC-HSFO (/bbl)", month_ranks[2], 35.5),
+        ]
+
+    return pd.DataFrame(
+        rows, columns=["Collected Date", "Product", "Month Rank", "Prior Settle"]
+    )
+
+
+def get_wide_df(long_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reshapes prior settles into the 'Data_Vertical' tab's layout.
+    """
+    df = long_df.pivot_table(
+        index=["Collected Date", "Month Rank"], columns="Product", values="Prior Settle"
+    )
+
+    return df.reindex(columns=an.curve_cols).reset_index()
+
+
+@pytest.fixture
+def analytics():
+    return an.get_analytics_for_output(get_wide_df(get_long_df()))
+
+
+def test_get_curve_shape(analytics):
+    df = analytics["Curve_Shape"]
+    df = df[df["Collected Date"] == "2020-04-10"].set_index("Product")
+
+    assert list(df.index) == ["WTI", "Brent", "Gasoline-RBOB", "USGC-HSFO (/bbl)"]
+    assert df["Structure"].tolist() == [
+        "Contango",
+        "Backwardation",
+        "Flat",
+        "Contango",
+    ]
+
+    # Brent's curve starts at its first quoted month
+    assert df.loc["WTI", "M1 Month Rank"] == month_ranks[0]
+    assert df.loc["Brent", "M1 Month Rank"] == month_ranks[1]
+    assert df.loc["WTI", ["M1", "M2", "M12"]].tolist() == [21.0, 22.0, 32.0]
+    assert df.loc["WTI", ["M1-M2", "M1-M12"]].tolist() == [-1.0, -11.0]
+    assert df.loc["Brent", ["M1-M2", "M1-M12"]].tolist() == [1.0, 11.0]
+
+    # HSFO skips a month: M2 is the next quoted one; M12 is past its curve
+    assert df.loc["USGC-HSFO (/bbl)", "M2"] == 35.5
+    assert np.isnan(df.loc["USGC-HSFO (/bbl)", "M12"])
+    assert np.isnan(df.loc["Gasoline-RBOB", "M1-M12"])
+
+
+def test_get_cracks_per_barrel(analytics):
+    df = analytics["Cracks"]
+    df = df[df["Collected Date"] == "2020-04-10"].set_index("Month Rank")
+
+    # Gasoline is per gallon (1.0 x 42), HSFO already per barrel
+    assert df.loc[month_ranks[0], "Gasoline-RBOB vs WTI"] == pytest.approx(42 - 21)
+    assert df.loc[month_ranks[0], "USGC-HSFO (/bbl) vs WTI"] == 30 - 21
+    assert np.isnan(df.loc[month_ranks[0], "Gasoline-RBOB vs Brent"])
+    assert df.loc[month_ranks[1], "Gasoline-RBOB vs Brent"] == pytest.approx(42 - 40)
+    assert df.loc[month_ranks[2], "USGC-HSFO (/bbl) vs Brent"] == 35.5 - 39
+    assert df[["USGC-ULSD vs WTI", "NYH ULSD-Heating Oil vs Brent"]].isna().all().all()
+
+    # Months with no product quoted have no row
+    assert list(df.index) == month_ranks[:3]
+
+
+def test_write_analytics(analytics, tmp_path):
+    paths_written = an.write_analytics(analytics, str(tmp_path))
+
+    assert len(paths_written) == 4
+    for date_str in ["2020-04-09", "2020-04-10"]:
+        for tab_nm, path in an.get_analytics_paths(date_str, str(tmp_path)).items():
+            df = analytics[tab_nm]
+            pd.testing.assert_frame_equal(
+                pd.read_parquet(path),
+                df[df["Collected Date"] == date_str].reset_index(drop=True),
+            )
+
+
+def test_recompute_history_from_the_store(analytics, tmp_path):
+    long_df = get_long_df()
+    store_df = pd.DataFrame(
+        {
+            "collected_date": long_df["Collected Date"],
+            "metric_id": long_df["Product"].replace({"USGC-HSFO (/bbl)": "USGC-HSFO"}),
+            "contract_month": long_df["Month Rank"],
+            "month": long_df["Month Rank"].astype(str),
+            "prior_settle": long_df["Prior Settle"],
+            "updated_date": pd.to_datetime("2020-04-09"),
+            "updated_time": "17:00:00",
+            "updated_time_zone": "CT",
+            "source": "test",
+            "ingested_at": pd.Timestamp.now(),
+        }
+    )
+    store_dir = str(tmp_path / "price_store")
+    ps.append_prices(store_df, store_dir)
+
+    recomputed = an.recompute_history(
+        "2020-04-10", None, store_dir, str(tmp_path / "analytics")
+    )
+
+    for tab_nm, df in analytics.items():
+        expected = df[df["Collected Date"] == "2020-04-10"].reset_index(drop=True)
+        pd.testing.assert_frame_equal(recomputed[tab_nm], expected)
+        path = an.get_analytics_paths("2020-04-10", str(tmp_path / "analytics"))
+        pd.testing.assert_frame_equal(pd.read_parquet(path[tab_nm]), expected)
+    assert len(os.listdir(tmp_path / "analytics")) == 2
@@ -0,0 +1,97 @@
+# Imports
+import os
+
+import Catalog as cat
+
+
+def touch(path, mtime):
+    with open(path, "a"):
+        pass
+    os.utime(path, (mtime, mtime))
+
+
+def write_versions(dir_str, n_dates, n_versions=3):
+    for day in range(n_dates):
+        for version in range(1, n_versions + 1):
+            touch(
+                os.path.join(
+                    dir_str,
+                    f"2020-{1 + day // 28:02d}-{1 + day % 28:02d} ~ "
+                    f"Combined Output ~ v{version}.csv",
+                ),
+                1_000_000 + day,
+            )
+
+
+def test_catalog_follows_files_written_or_resynced(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dir_str = tmp_path / "outputs_csv"
+    dir_str.mkdir()
+    older = dir_str / "2020-04-10 ~ Combined Output ~ v1.csv"
+    newer = dir_str / "2020-04-10 ~ Combined Output ~ v2.csv"
+    touch(older, 1_000_000)
+    touch(newer, 2_000_000)
+    dir_mtime = os.stat(dir_str).st_mtime
+
+    assert cat.get_most_recent_path(str(dir_str)) == str(newer)
+
+    # Rewriting a file in place leaves the directory's modified time alone,
+    # so the catalog only sees it once registered
+    touch(older, 3_000_000)
+    os.utime(dir_str, (dir_mtime, dir_mtime))
+    assert cat.get_most_recent_path(str(dir_str)) == str(newer)
+    cat.register_file(str(older))
+    assert cat.get_most_recent_path(str(dir_str)) == str(older)
+
+    # ... or the directory is re-synced explicitly
+    touch(newer, 4_000_000)
+    os.utime(dir_str, (dir_mtime, dir_mtime))
+    cat.resync(str(dir_str))
+    assert cat.get_most_recent_path(str(dir_str)) == str(newer)
+
+    # Files added or removed by hand move the directory's modified time
+    os.remove(older)
+    assert cat.get_latest_path(str(dir_str), "2020-04-10") == str(newer)
+    assert cat.get_next_version(str(dir_str), "Combined Output", "2020-04-10") == 3
+
+
+def test_register_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "2020-04-10 ~ WTI ~ v1.txt"
+    touch(path, 1_000_000)
+
+    cat.register_file(str(path))
+    assert cat.get_distinct_dates(str(tmp_path)) == ["2020-04-10"]
+    assert cat.get_next_version(str(tmp_path), "WTI", "2020-04-10") == 2
+
+
+def test_lookups_do_not_scan_the_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dir_str = tmp_path / "outputs_csv"
+    dir_str.mkdir()
+    write_versions(str(dir_str), n_dates=1_000)
+
+    n_scans = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        n_scans.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(cat.os, "scandir", counting_scandir)
+
+    cat.get_distinct_dates(str(dir_str))
+    assert len(n_scans) == 1
+
+    for day in range(0, 1_000, 10):
+        date_str = f"2020-{1 + day // 28:02d}-{1 + day % 28:02d}"
+        assert cat.get_latest_path(str(dir_str), date_str).endswith("v3.csv")
+        assert cat.get_next_version(str(dir_str), "Combined Output", date_str) == 4
+    assert len(n_scans) == 1
+
+    # Writing through save_raw_file/register_file doesn't re-scan either
+    new_file = dir_str / "2020-01-01 ~ Combined Output ~ v4.csv"
+    touch(new_file, 3_000_000)
+    cat.register_file(str(new_file))
+    assert cat.get_most_recent_path(str(dir_str)) == str(new_file)
+    assert len(n_scans) == 1
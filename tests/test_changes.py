@@ -0,0 +1,233 @@
+# Imports
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Analytics as an
+import Changes as chg
+import ETL as etl
+
+
+def get_long_df(date_str, prior_settles):
+    return pd.DataFrame(
+        {
+            "Metric": ["WTI", "Brent"],
+            "Month Rank": np.array([202005, 202005], dtype="int32"),
+            "Collected Date": pd.to_datetime([date_str] * 2),
+            "Prior Settle": prior_settles,
+        }
+    )
+
+
+def test_read_changes_drops_carried_window(tmp_path):
+    dir_str = str(tmp_path)
+    prev_df = None
+    for date_str, prior_settles in [
+        ("2020-04-09", [0.0, 30.0]),
+        ("2020-04-10", [22.76, 31.5]),
+        ("2020-04-13", [22.41, 31.74]),
+    ]:
+        prev_df = chg.get_changes(get_long_df(date_str, prior_settles), prev_df)
+        prev_df.to_parquet(chg.get_changes_path(date_str, dir_str), index=False)
+
+    assert chg.get_changes_dates("2020-04-10", None, dir_str) == [
+        "2020-04-10",
+        "2020-04-13",
+    ]
+
+    df = chg.read_changes("2020-04-10", None, dir_str)
+    assert list(df.columns) == chg.change_cols
+    assert df["Collected Date"].dt.strftime("%Y-%m-%d").tolist() == [
+        "2020-04-10",
+        "2020-04-10",
+        "2020-04-13",
+        "2020-04-13",
+    ]
+    # WTI's previous settle was 0: the change is reported, the % change isn't
+    assert df.loc[0, "Change"] == 22.76
+    assert np.isnan(df.loc[0, "% Change"])
+    assert df.loc[1, "% Change"] == 5.0
+
+    assert list(chg.read_changes(dir_to_read=str(tmp_path / "missing")).columns) == (
+        chg.change_cols
+    )
+
+
+def get_history(n_days=25, seed=0) -> pd.DataFrame:
+    """
+    Builds a long frame of prior settles over n_days business days: WTI and
+    Brent contracts, one expiring part-way through, one first quoted part-way
+    through, and prices straddling 0.
+    """
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range("2020-03-02", periods=n_days)
+    rows = [
+        {
+            "Metric": metric,
+            "Month Rank": month_rank,
+            "Collected Date": date,
+            "Prior Settle": round(rng.uniform(-10, 40), 2),
+        }
+        for i, date in enumerate(dates)
+        for metric in ["WTI", "Brent"]
+        for month_rank in [202005, 202006, 202012]
+        if not (month_rank == 202005 and i >= 15)
+        and not (month_rank == 202012 and i < 5)
+    ]
+    df = pd.DataFrame(rows)
+    df["Month Rank"] = df["Month Rank"].astype("int32")
+
+    return df
+
+
+def get_expected_changes(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes every date's changes over the full history with pandas' own
+    shift() and rolling().
+    """
+    df = history.sort_values(chg.key_cols + ["Collected Date"]).reset_index(drop=True)
+    grouped = df.groupby(chg.key_cols)["Prior Settle"]
+    rolling = grouped.rolling(chg.rolling_window, min_periods=1)
+
+    df["Prev Settle"] = grouped.shift(1)
+    df["Prev Collected Date"] = df.groupby(chg.key_cols)["Collected Date"].shift(1)
+    df["Change"] = df["Prior Settle"] - df["Prev Settle"]
+    df["% Change"] = df["Change"] / df["Prev Settle"].abs() * 100
+    df["Rolling Days"] = rolling.count().to_numpy().astype("int32")
+    df["Rolling Mean"] = rolling.mean().to_numpy()
+    df["Rolling Std"] = rolling.std().to_numpy()
+    df["Rolling Min"] = rolling.min().to_numpy()
+    df["Rolling Max"] = rolling.max().to_numpy()
+    for lag, col in enumerate(chg.window_cols, start=1):
+        df[col] = grouped.shift(lag)
+
+    return df[chg.change_cols + chg.window_cols]
+
+
+def sort_changes(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(["Collected Date"] + chg.key_cols).reset_index(drop=True)
+
+
+def write_daily_outputs(history: pd.DataFrame, dir_str: str, dates=None) -> None:
+    """
+    Writes the history's dates (or the given ones) as daily .parquet outputs
+    with a column per product, as ETL.run_pipeline() does.
+    """
+    for date, df in history.groupby("Collected Date"):
+        date_str = date.strftime("%Y-%m-%d")
+        if dates is not None and date_str not in dates:
+            continue
+
+        wide = df.pivot(index="Month Rank", columns="Metric", values="Prior Settle")
+        wide = wide.reindex(columns=an.curve_cols).reset_index()
+        wide["Collected Date"] = date
+        file_nm = os.path.split(etl.get_output_paths(date_str)["parquet"])[-1]
+        wide.to_parquet(os.path.join(dir_str, file_nm), index=False)
+
+
+def get_dates(history: pd.DataFrame) -> list:
+    return sorted(history["Collected Date"].dt.strftime("%Y-%m-%d").unique())
+
+
+def test_get_changes_carries_the_rolling_window():
+    history = get_history(n_days=3)
+    prev_df = None
+    for date, long_df in history.groupby("Collected Date"):
+        prev_df = chg.get_changes(long_df.reset_index(drop=True), prev_df)
+
+    wti = prev_df.set_index(chg.key_cols).loc[("WTI", 202006)]
+    settles = history[(history["Metric"] == "WTI") & (history["Month Rank"] == 202006)][
+        "Prior Settle"
+    ].tolist()
+    assert wti["Prior Settle"] == settles[2]
+    assert wti["Settle T-1"] == settles[1]
+    assert wti["Settle T-2"] == settles[0]
+    assert wti[chg.window_cols[2:]].isna().all()
+    assert wti["Rolling Days"] == 3
+    assert wti["Rolling Mean"] == pytest.approx(np.mean(settles))
+    assert wti["Rolling Std"] == pytest.approx(np.std(settles, ddof=1))
+
+
+def test_get_changes_of_new_and_dropped_contracts():
+    prev_df = chg.get_changes(get_long_df("2020-04-09", [20.0, 30.0]))
+
+    # WTI's contract expired, a new Brent contract is quoted
+    long_df = pd.DataFrame(
+        {
+            "Metric": ["Brent", "Brent"],
+            "Month Rank": np.array([202005, 202006], dtype="int32"),
+            "Collected Date": pd.to_datetime(["2020-04-10"] * 2),
+            "Prior Settle": [31.5, 32.0],
+        }
+    )
+    df = chg.get_changes(long_df, prev_df).set_index(chg.key_cols)
+
+    assert list(df.index) == [("Brent", 202005), ("Brent", 202006)]
+    assert df.loc[("Brent", 202005), "Change"] == 1.5
+    assert df.loc[("Brent", 202005), "Rolling Days"] == 2
+
+    new = df.loc[("Brent", 202006)]
+    assert pd.isna(new["Prev Collected Date"])
+    assert np.isnan(new["Prev Settle"]) and np.isnan(new["Change"])
+    assert new["Rolling Days"] == 1
+    assert new["Rolling Mean"] == 32.0
+    assert np.isnan(new["Rolling Std"])
+    assert new["Rolling Min"] == new["Rolling Max"] == 32.0
+
+
+def test_percent_change_follows_the_change_across_negative_prices():
+    prev_df = chg.get_changes(get_long_df("2020-04-20", [-37.63, 10.0]))
+    df = chg.get_changes(get_long_df("2020-04-21", [10.01, -5.0]), prev_df)
+
+    # Up from a negative settle is a positive % change, down to one negative
+    assert df["Change"].round(2).tolist() == [47.64, -15.0]
+    assert df["% Change"].round(2).tolist() == [126.6, -150.0]
+
+
+def test_rebuilt_changes_match_pandas_rolling(tmp_path):
+    history = get_history(n_days=25)
+    write_daily_outputs(history, str(tmp_path))
+
+    assert chg.rebuild_changes(None, str(tmp_path), str(tmp_path / "changes")) == 25
+
+    dfs = [
+        pd.read_parquet(chg.get_changes_path(date_str, str(tmp_path / "changes")))
+        for date_str in get_dates(history)
+    ]
+    result = sort_changes(pd.concat(dfs, ignore_index=True))
+    expected = sort_changes(get_expected_changes(history))
+
+    assert (result["Rolling Days"] == chg.rolling_window).any()
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_update_changes_after_backfills_matches_a_full_rebuild(tmp_path):
+    history = get_history(n_days=25)
+    dates = get_dates(history)
+    daily_dir, changes_dir = str(tmp_path / "daily"), str(tmp_path / "changes")
+    os.makedirs(daily_dir)
+
+    # Nightly runs, with some dates missed
+    backfilled = [dates[3], dates[10], dates[11]]
+    for date_str in dates[:-1]:
+        if date_str not in backfilled:
+            write_daily_outputs(history, daily_dir, [date_str])
+            chg.update_changes(date_str, daily_dir, changes_dir)
+
+    # The missed dates are backfilled out of order, as ETL_All.run_backfill()
+    # does, then the next nightly run
+    write_daily_outputs(history, daily_dir, backfilled)
+    for date_str in reversed(backfilled):
+        chg.update_changes(date_str, daily_dir, changes_dir)
+    chg.rebuild_changes(min(backfilled), daily_dir, changes_dir)
+    write_daily_outputs(history, daily_dir, [dates[-1]])
+    chg.update_changes(dates[-1], daily_dir, changes_dir)
+
+    chg.rebuild_changes(None, daily_dir, str(tmp_path / "rebuilt"))
+    for date_str in dates:
+        pd.testing.assert_frame_equal(
+            pd.read_parquet(chg.get_changes_path(date_str, changes_dir)),
+            pd.read_parquet(chg.get_changes_path(date_str, str(tmp_path / "rebuilt"))),
+        )
@@ -0,0 +1,362 @@
+# Imports
+import os
+import json
+import math
+import numpy as np
+import pandas as pd
+import pytest
+
+import ETL_Combine_Processed as combine
+
+default_cols = ("WTI", "USGC-ULSD", "USGC-HSFO")
+all_cols = ["WTI", "Brent", "Gasoline-RBOB", "USGC-ULSD", "USGC-HSFO"]
+
+
+def get_list_of_indicators(df, cols_to_check=list(default_cols)):
+    """
+    Original row-by-row flags of invalid (1) and valid (0) records.
+    """
+    unusable_list = []
+    for vals in df[cols_to_check].iterrows():
+        valid = [v for v in vals[1] if not math.isnan(v)]
+
+        if len(valid) != len(vals[1]):
+            unusable_list.append(1)
+
+        else:
+            unusable_list.append(0)
+
+    return unusable_list
+
+
+def truncate_df_iterative(df, cols_to_check=list(default_cols)):
+    """
+    Original row-by-row implementation of truncate_df(), the reference
+    truncate_trailing_invalid() has to match.
+    """
+    list_of_indicators = get_list_of_indicators(df, cols_to_check)
+
+    for i, val in enumerate(list_of_indicators):
+
+        total_less_current = len(list_of_indicators) - i
+        remaining_unusable = sum(list_of_indicators[i:])
+
+        if total_less_current == remaining_unusable:
+            last_valid_index = i
+            df2 = df.iloc[0 : (last_valid_index - 1)]
+            break
+
+        else:
+            df2 = df
+
+    return df2
+
+
+def get_random_df(rng: np.random.RandomState, n_rows: int, p_null: float):
+    """
+    Builds a frame of prices with each value null with probability p_null,
+    and a run of fully populated or fully null trailing records half the
+    time so both ends of the truncation get exercised.
+    """
+    values = rng.uniform(0, 100, size=(n_rows, len(all_cols)))
+    values[rng.uniform(size=values.shape) < p_null] = np.nan
+
+    if n_rows and rng.uniform() < 0.5:
+        n_tail = rng.randint(1, n_rows + 1)
+        values[-n_tail:] = np.nan if rng.uniform() < 0.5 else 1.0
+
+    return pd.DataFrame(values, columns=all_cols)
+
+
+def get_random_cols(rng: np.random.RandomState) -> list:
+    """
+    Draws a non-empty subset of the price columns, in random order.
+    """
+    n_cols = rng.randint(1, len(all_cols) + 1)
+
+    return list(rng.choice(all_cols, size=n_cols, replace=False))
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_truncate_trailing_invalid_matches_iterative(seed):
+    rng = np.random.RandomState(seed)
+    df = get_random_df(rng, rng.randint(1, 40), rng.choice([0.0, 0.1, 0.5, 1.0]))
+    cols_to_check = get_random_cols(rng)
+
+    expected = truncate_df_iterative(df, cols_to_check)
+    result = combine.truncate_trailing_invalid(df, cols_to_check)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("n_rows", [1, 2, 3, 10])
+def test_truncate_trailing_invalid_all_valid(n_rows):
+    df = pd.DataFrame(np.ones((n_rows, len(all_cols))), columns=all_cols)
+
+    result = combine.truncate_df(df)
+
+    pd.testing.assert_frame_equal(result, truncate_df_iterative(df))
+    assert result is df
+
+
+@pytest.mark.parametrize("n_rows", [1, 2, 3, 10])
+def test_truncate_trailing_invalid_all_invalid(n_rows):
+    df = pd.DataFrame(np.full((n_rows, len(all_cols)), np.nan), columns=all_cols)
+
+    result = combine.truncate_df(df)
+
+    # last_valid_index is 0, so iloc[0:-1] keeps every record but the last
+    pd.testing.assert_frame_equal(result, truncate_df_iterative(df))
+    assert len(result) == n_rows - 1
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_truncate_trailing_invalid_drops_record_before_invalid_run(seed):
+    rng = np.random.RandomState(seed)
+    n_rows = rng.randint(3, 30)
+    n_tail = rng.randint(1, n_rows - 1)
+    df = pd.DataFrame(np.ones((n_rows, len(all_cols))), columns=all_cols)
+    df.iloc[-n_tail:, 0] = np.nan
+
+    result = combine.truncate_df(df)
+
+    # The run starts at n_rows - n_tail; the record before it goes too
+    pd.testing.assert_frame_equal(result, df.iloc[: n_rows - n_tail - 1])
+
+
+def test_truncate_trailing_invalid_empty():
+    df = pd.DataFrame(columns=all_cols, dtype="float64")
+
+    # The iterative version never assigned its result for an empty frame
+    with pytest.raises(UnboundLocalError):
+        truncate_df_iterative(df)
+
+    assert combine.truncate_df(df) is df
+
+
+@pytest.mark.parametrize("n_workers", [None, 2])
+def test_get_dict_of_dfs_drops_mismatched_columns(tmp_path, n_workers):
+    import Schema as sch
+
+    cols = list(sch.output_schema)
+    good = pd.DataFrame({col: ["1"] for col in cols})
+    bad = good.rename(columns={"WTI": "WTI (old)"})
+
+    paths = []
+    for file_nm, df in [("good 2020-04-04", good), ("bad 2020-04-05", bad)]:
+        paths.append(str(tmp_path / f"{file_nm}.parquet"))
+        df.to_parquet(paths[-1], index=False)
+
+    template_hash = combine.hash_from_col_names(cols)
+    df_dict = combine.get_dict_of_dfs(paths, n_workers, template_hash)
+
+    assert list(df_dict) == ["good 2020-04-04"]
+
+
+def test_write_combined_dict_logs_locked_destination(tmp_path, monkeypatch, caplog):
+    def write_locked(data, path_to_write):
+        raise PermissionError(path_to_write)
+
+    monkeypatch.setattr(combine.etl, "write_bytes_atomic", write_locked)
+
+    combine.write_combined_dict({}, "Combined.xlsx", str(tmp_path), b"xlsx")
+
+    assert "Could not write to main path" in caplog.text
+    assert "PermissionError" in caplog.text
+
+
+def test_write_combined_dict_raises_other_errors(tmp_path, monkeypatch):
+    def write_failing(data, path_to_write):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(combine.etl, "write_bytes_atomic", write_failing)
+
+    with pytest.raises(OSError, match="disk full"):
+        combine.write_combined_dict({}, "Combined.xlsx", str(tmp_path), b"xlsx")
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"full_rebuild": True}, {"n_workers": 2}, {"stream": True}]
+)
+def test_run_pipeline_rejects_daily_output_options_from_store(tmp_path, kwargs):
+    with pytest.raises(ValueError, match="from_store"):
+        combine.run_pipeline([str(tmp_path)], from_store=True, **kwargs)
+
+
+def get_daily_output(date_str: str, wti_settles: list) -> pd.DataFrame:
+    """
+    Builds a daily output with the template's columns, one row per WTI
+    settle.
+    """
+    n_rows = len(wti_settles)
+    df = pd.DataFrame(
+        {
+            "Lookup-Key": [f"{date_str} M{i}" for i in range(n_rows)],
+            "Month": [f"M{i}" for i in range(n_rows)],
+            "Month Rank": np.arange(202005, 202005 + n_rows, dtype="int32"),
+            "Collected Date": date_str,
+            "Updated Date": date_str,
+            "Updated Time": "17:00:00",
+            "Updated Time Zone": "CT",
+        }
+    )
+    for col in combine.sch.output_schema:
+        if combine.sch.output_schema[col] == "price":
+            df[col] = 1.0
+    df["WTI"] = wti_settles
+
+    return df[list(combine.sch.output_schema)]
+
+
+@pytest.fixture
+def daily_outputs(tmp_path, monkeypatch):
+    """
+    Project directory with the template, urls.csv and the .parquet outputs
+    of three dates plus one whose columns don't match the template.
+    """
+    monkeypatch.chdir(tmp_path)
+    cols = list(combine.sch.output_schema)
+    (tmp_path / "Energy-Scraping").mkdir()
+    pd.DataFrame(columns=cols).to_excel(
+        tmp_path / "Energy-Scraping" / "ETL_Output_Template.xlsx", index=False
+    )
+    pd.DataFrame({"Name": ["WTI"], "Href": ["https://www.cmegroup.com/"]}).to_csv(
+        tmp_path / "urls.csv", index=False
+    )
+    (tmp_path / "etl_outputs_xlsx").mkdir()
+
+    outputs_dir = tmp_path / "etl_outputs_parquet"
+    outputs_dir.mkdir()
+    paths = []
+    for date_str, df in [
+        ("2020-04-08", get_daily_output("2020-04-08", [20.0, 21.0])),
+        ("2020-04-09", get_daily_output("2020-04-09", [22.0, 23.0])),
+        ("2020-04-10", get_daily_output("2020-04-10", [24.0, 25.0])),
+        ("2020-04-11", get_daily_output("2020-04-11", [1.0]).rename(columns=str.upper)),
+    ]:
+        paths.append(str(outputs_dir / f"Prior Settle {date_str}.parquet"))
+        df.to_parquet(paths[-1], index=False)
+
+    return paths
+
+
+def test_combine_incremental_only_parses_changed_files(
+    tmp_path, monkeypatch, daily_outputs
+):
+    paths = daily_outputs
+    parsed = []
+    read_and_check_etl_output = combine.read_and_check_etl_output
+
+    def counting_read(path, template_hash=None):
+        parsed.append(os.path.split(path)[-1])
+        return read_and_check_etl_output(path, template_hash)
+
+    monkeypatch.setattr(combine, "read_and_check_etl_output", counting_read)
+
+    def combine_full(paths):
+        dict_of_dfs = {
+            os.path.split(path)[-1].split(".")[0]: combine.read_etl_output(path)
+            for path in paths[:-1]
+        }
+        hash_dict = {k: True for k in dict_of_dfs}
+        return combine.combine_valid_dfs(dict_of_dfs, hash_dict)
+
+    store_dir = str(tmp_path / "etl_outputs_store")
+    df = combine.combine_incremental(paths, store_dir)
+    assert len(parsed) == 3  # the mismatched file's data is never read
+    pd.testing.assert_frame_equal(df, combine_full(paths))
+
+    path_to_manifest, _ = combine.get_paths_to_combine_store(store_dir)
+    with open(path_to_manifest, "r") as f:
+        manifest = json.load(f)
+    assert sorted(manifest) == [
+        "Prior Settle 2020-04-08",
+        "Prior Settle 2020-04-09",
+        "Prior Settle 2020-04-10",
+        "Prior Settle 2020-04-11",
+    ]
+    assert manifest["Prior Settle 2020-04-09"]["mtime"] == os.path.getmtime(paths[1])
+    assert [entry["is_valid"] for _, entry in sorted(manifest.items())] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+
+    # A daily output rewritten since the last run is the only one re-parsed
+    get_daily_output("2020-04-09", [22.5, 23.5]).to_parquet(paths[1], index=False)
+    mtime = manifest["Prior Settle 2020-04-09"]["mtime"] + 10
+    os.utime(paths[1], (mtime, mtime))
+    parsed.clear()
+
+    df = combine.combine_incremental(paths, store_dir)
+    assert parsed == ["Prior Settle 2020-04-09.parquet"]
+    assert df.loc[df["Collected Date"] == "2020-04-09", "WTI"].tolist() == [22.5, 23.5]
+    pd.testing.assert_frame_equal(df, combine_full(paths))
+
+    with open(path_to_manifest, "r") as f:
+        assert json.load(f)["Prior Settle 2020-04-09"]["mtime"] == mtime
+
+    # Files no longer passed in are dropped from the manifest and the result
+    parsed.clear()
+    df = combine.combine_incremental(paths[1:], store_dir)
+    assert parsed == []
+    pd.testing.assert_frame_equal(df, combine_full(paths[1:]))
+    with open(path_to_manifest, "r") as f:
+        assert "Prior Settle 2020-04-08" not in json.load(f)
+
+
+def test_streamed_workbook_matches_the_in_memory_one(tmp_path, daily_outputs):
+    long_df = pd.DataFrame(
+        {
+            "Metric": ["WTI"],
+            "Month Rank": np.array([202005], dtype="int32"),
+            "Collected Date": pd.to_datetime(["2020-04-10"]),
+            "Prior Settle": [24.0],
+        }
+    )
+    changes_path = combine.chg.get_changes_path("2020-04-10")
+    os.makedirs(os.path.dirname(changes_path))
+    combine.chg.get_changes(long_df).to_parquet(changes_path, index=False)
+
+    workbooks = {}
+    for stream in [False, True]:
+        dir_to_write = tmp_path / f"stream={stream}"
+        dir_to_write.mkdir()
+        combine.run_pipeline([str(dir_to_write)], "Combined.xlsx", stream=stream)
+        workbooks[stream] = pd.read_excel(
+            dir_to_write / "Combined.xlsx", sheet_name=None, header=None
+        )
+
+    assert list(workbooks[True]) == ["Combined_Vertical", "Changes", "Context"]
+    assert len(workbooks[True]["Combined_Vertical"]) == 1 + 3 * 2
+    for sheetname, df in workbooks[False].items():
+        pd.testing.assert_frame_equal(workbooks[True][sheetname], df)
+
+
+def test_header_check_logs_missing_and_unexpected_columns(
+    tmp_path, daily_outputs, caplog
+):
+    # Headers are read without the data, from .xlsx outputs too
+    path_to_xlsx = str(tmp_path / "etl_outputs_xlsx" / "Prior Settle 2020-04-07.xlsx")
+    get_daily_output("2020-04-07", [19.0]).rename(
+        columns={"Brent": "Brent (old)"}
+    ).to_excel(path_to_xlsx, index=False)
+
+    hash_dict = combine.get_header_check_dtl(daily_outputs[2:] + [path_to_xlsx])
+
+    assert hash_dict == {
+        "Prior Settle 2020-04-10": True,
+        "Prior Settle 2020-04-11": False,
+        "Prior Settle 2020-04-07": False,
+    }
+    records = [json.loads(record.message) for record in caplog.records]
+    assert [record["file"] for record in records] == daily_outputs[3:] + [path_to_xlsx]
+    renamed = [col for col in combine.sch.output_schema if col.upper() != col]
+    assert records[0]["missing_cols"] == renamed
+    assert records[0]["unexpected_cols"] == [col.upper() for col in renamed]
+    assert (records[1]["missing_cols"], records[1]["unexpected_cols"]) == (
+        ["Brent"],
+        ["Brent (old)"],
+    )
+    assert {record["event"] for record in records} == {"etl_output_rejected"}
@@ -0,0 +1,224 @@
+# Imports
+import os
+import time
+import threading
+import urllib.error
+import pandas as pd
+import pytest
+
+import Crawler as cr
+import FileHelper as fh
+
+archive_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "outputs_txt")
+archive_date = "2020-04-10"
+real_sleep = time.sleep
+fetch_from_archive = cr.html_from_url
+
+
+class ArchiveBrowser:
+    """
+    Stands in for Chrome: loads pages from the archive server, records when
+    each request starts and how many are in flight at once.
+    """
+
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    started_at = []
+
+    def __init__(self, session_id=None):
+        self.page_source = None
+
+    def get(self, href):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.started_at.append(time.monotonic())
+
+        real_sleep(0.05)
+        self.page_source = fetch_from_archive(href)[0]
+
+        with cls.lock:
+            cls.in_flight -= 1
+
+    def execute_script(self, *args):
+        return 0
+
+    def close(self):
+        pass
+
+    quit = close
+
+
+@pytest.fixture
+def archive(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cr.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(cr, "_host_state", {})
+    monkeypatch.setattr(fh, "save_raw_file", lambda *args, **kwargs: None)
+    monkeypatch.setattr(ArchiveBrowser, "in_flight", 0)
+    monkeypatch.setattr(ArchiveBrowser, "max_in_flight", 0)
+    monkeypatch.setattr(ArchiveBrowser, "started_at", [])
+
+    server, base_url = cr.start_archive_server(archive_dir)
+    yield cr.get_archive_hrefs(base_url, archive_dir, archive_date)
+    server.shutdown()
+    server.server_close()
+
+
+def drop_timestamps(df):
+    return df.drop(columns=["Collected Timestamp", "Collected Date"])
+
+
+@pytest.mark.parametrize("n_sessions", [1, 3])
+def test_concurrent_matches_serial(archive, n_sessions):
+    assert len(archive) == 6
+
+    serial = cr.get_dict_of_dfs(archive, ArchiveBrowser(), 0, 0)
+    concurrent = cr.get_dict_of_dfs_concurrent(
+        archive, ArchiveBrowser, n_sessions, 0, 0, fast_path=False
+    )
+
+    assert list(concurrent) == list(serial)
+    for href_name, df in serial.items():
+        assert not df.empty
+        pd.testing.assert_frame_equal(
+            drop_timestamps(concurrent[href_name]), drop_timestamps(df)
+        )
+
+
+def test_concurrent_sessions_keep_per_host_pacing(archive, monkeypatch):
+    pause = 0.2
+    monkeypatch.setattr(cr.random, "randint", lambda floor, ceiling: pause)
+
+    cr.get_dict_of_dfs_concurrent(
+        archive, ArchiveBrowser, 3, scroll=False, fast_path=False
+    )
+
+    assert ArchiveBrowser.max_in_flight == 1
+    gaps = pd.Series(sorted(ArchiveBrowser.started_at)).diff().dropna()
+    assert len(gaps) == len(archive) - 1
+    assert (gaps >= pause).all()
+
+
+quotes_json_html = """
+<html><head>
+<script type="application/json">{"quotes": [
+  {"expirationMonth": "MAY 2020", "priorSettle": "31.48", "last": "-",
+   "updated": "16:38:17 CT<br />03 Apr 2020"},
+  {"expirationMonth": "JUN 2020", "priorSettle": "32.07", "last": "-",
+   "updated": "16:38:17 CT<br />03 Apr 2020"}
+]}</script>
+<script type="text/javascript">var quotes = {"ignored": true};</script>
+<script type='application/ld+json'>{"broken": </script>
+</head><body><div id="quotes">Loading...</div></body></html>
+"""
+
+json_ld_html = """
+<html><head><script type="application/ld+json">{
+  "@type": "WebPage",
+  "mentions": [
+    {"@type": "FinancialProduct", "name": "MAY 2020 Brent Crude Oil Futures",
+     "amount": {"minValue": "30.10", "maxValue": "33.00"}},
+    {"@type": "FinancialProduct", "name": "JUN 2020 Brent Crude Oil Futures"},
+    {"@type": "Organization", "name": "CME Group"}
+  ]
+}</script></head><body><div id="quotes">Loading...</div></body></html>
+"""
+
+
+def test_get_embedded_payloads_skips_other_and_invalid_scripts():
+    payloads = cr.get_embedded_payloads(quotes_json_html)
+
+    assert len(payloads) == 1
+    assert [quote["expirationMonth"] for quote in payloads[0]["quotes"]] == [
+        "MAY 2020",
+        "JUN 2020",
+    ]
+
+
+def test_records_from_quotes_json():
+    records = cr.records_from_quotes_json(cr.get_embedded_payloads(quotes_json_html))
+
+    assert records == [
+        {
+            "Month": "MAY 2020",
+            "Last": "-",
+            "Prior Settle": "31.48",
+            "Updated": "16:38:17 CT 03 Apr 2020",
+        },
+        {
+            "Month": "JUN 2020",
+            "Last": "-",
+            "Prior Settle": "32.07",
+            "Updated": "16:38:17 CT 03 Apr 2020",
+        },
+    ]
+
+
+def test_records_from_json_ld():
+    records = cr.records_from_json_ld(cr.get_embedded_payloads(json_ld_html))
+
+    assert records == [
+        {"Month": "MAY 2020", "Low": "30.10", "High": "33.00"},
+        {"Month": "JUN 2020", "Low": "-", "High": "-"},
+    ]
+
+
+def test_df_from_html_fast():
+    tmstmp = "2020-04-04 10:00:00.000000"
+
+    df = cr.df_from_html_fast(quotes_json_html, "Brent", tmstmp)
+    assert list(df[("Month", "Month")]) == ["MAY 2020", "JUN 2020", "Legend"]
+    assert list(df[("Prior Settle", "Prior Settle")][:2]) == ["31.48", "32.07"]
+    assert (df["Metric ID"] == "Brent").all()
+    assert (df["Collected Date"] == "2020-04-04").all()
+
+    # JSON-LD lacks Prior Settle and Updated, and there's no static table
+    assert cr.df_from_html_fast(json_ld_html, "Brent", tmstmp) is None
+
+
+def test_fast_path_falls_back_to_browser_in_the_same_host_hold(archive, monkeypatch):
+    pauses = []
+    monkeypatch.setattr(
+        cr.random, "randint", lambda floor, ceiling: pauses.append(floor) or 0
+    )
+
+    # Half of the pages yield no usable table without a browser, the others
+    # fail to load
+    fast_requests = []
+
+    def html_from_url(href, timeout=30):
+        fast_requests.append(href)
+        if len(fast_requests) % 2:
+            raise urllib.error.URLError("connection refused")
+        return json_ld_html, "2020-04-04 10:00:00.000000"
+
+    monkeypatch.setattr(cr, "html_from_url", html_from_url)
+
+    serial = cr.get_dict_of_dfs(archive, ArchiveBrowser(), 0, 0)
+    n_pauses_serial = len(pauses)
+    monkeypatch.setattr(ArchiveBrowser, "started_at", [])
+    concurrent = cr.get_dict_of_dfs_concurrent(
+        archive, ArchiveBrowser, 2, 0, 0, scroll=False, fast_path=True
+    )
+
+    # Every page was rendered in the browser, with one pause per page
+    assert len(ArchiveBrowser.started_at) == len(archive)
+    assert len(pauses) - n_pauses_serial == len(archive)
+    for href_name, df in serial.items():
+        pd.testing.assert_frame_equal(
+            drop_timestamps(concurrent[href_name]), drop_timestamps(df)
+        )
+
+
+def test_fast_path_only_falls_back_on_request_and_parse_errors(archive, monkeypatch):
+    def records_from_quotes_json(payloads):
+        raise KeyError("priorSettle")
+
+    monkeypatch.setattr(cr, "records_from_quotes_json", records_from_quotes_json)
+
+    with pytest.raises(KeyError):
+        cr.get_dict_of_dfs_concurrent(archive, ArchiveBrowser, 1, 0, 0, fast_path=True)
+    assert ArchiveBrowser.started_at == []
@@ -0,0 +1,121 @@
+# Imports
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pytest
+
+import Curves as cv
+import PriceStore as ps
+
+dates = ["2020-04-06", "2020-04-08", "2020-04-10"]
+
+
+def get_store_rows(date_str, metric_id, prior_settles):
+    df = pd.DataFrame(
+        {
+            "collected_date": pd.to_datetime([date_str] * len(prior_settles)),
+            "metric_id": metric_id,
+            "contract_month": [202005 + i for i in range(len(prior_settles))],
+            "month": [f"M{i}" for i in range(len(prior_settles))],
+            "prior_settle": prior_settles,
+            "updated_date": pd.to_datetime(date_str),
+            "updated_time": "17:00:00",
+            "updated_time_zone": "CT",
+            "source": f"{date_str} ~ Combined Output ~ v1.csv",
+        }
+    )
+    df["ingested_at"] = pd.Timestamp.now()
+
+    return df
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cv, "_cache", OrderedDict())
+    monkeypatch.setattr(
+        cv, "_cache_stats", {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+    )
+    monkeypatch.setattr(cv, "_partitions", {})
+
+    store_dir = str(tmp_path / "price_store")
+    for day, date_str in enumerate(dates):
+        ps.append_prices(
+            pd.concat(
+                [
+                    get_store_rows(date_str, "WTI", [20.0 + day, np.nan, 22.0]),
+                    get_store_rows(date_str, "Brent", [30.0 + day, 31.0, 32.0]),
+                ],
+                ignore_index=True,
+            ),
+            store_dir,
+        )
+
+    return store_dir
+
+
+def test_get_curve_as_of(store_dir):
+    curve = cv.get_curve("WTI", "2020-04-09", store_dir)
+
+    # The latest collected date on or before the as-of date, without the
+    # contract months not quoted
+    assert curve.name == "WTI 2020-04-08"
+    assert curve.index.tolist() == [202005, 202007]
+    assert curve.tolist() == [21.0, 22.0]
+
+    assert cv.get_curve("Brent", "2020-04-08", store_dir).name == "Brent 2020-04-08"
+    assert cv.get_cache_info()["misses"] == 1
+    assert cv.get_cache_info()["hits"] == 1
+
+    with pytest.raises(KeyError):
+        cv.get_curve("WTI", "2020-04-05", store_dir)
+    with pytest.raises(KeyError):
+        cv.get_curve("USGC-ULSD", "2020-04-10", store_dir)
+
+
+def test_snapshots_follow_the_store(store_dir):
+    assert cv.get_curve("Brent", "2020-04-30", store_dir).tolist() == [32.0, 31.0, 32.0]
+
+    # Appending to a partition re-reads it, a new partition is listed
+    ps.append_prices(get_store_rows("2020-04-10", "Brent", [35.0]), store_dir)
+    assert cv.get_curve("Brent", "2020-04-30", store_dir).tolist() == [35.0, 31.0, 32.0]
+    ps.append_prices(get_store_rows("2020-04-13", "Brent", [36.0]), store_dir)
+    curve = cv.get_curve("Brent", "2020-04-30", store_dir)
+    assert curve.name == "Brent 2020-04-13"
+
+    assert cv.get_cache_info()["misses"] == 3
+    assert cv.get_cache_info()["entries"] == 2
+
+
+def test_cache_is_bounded_by_bytes(store_dir, monkeypatch):
+    cv.get_snapshot(dates[0], store_dir)
+    snapshot_bytes = cv.get_cache_info()["bytes"]
+    monkeypatch.setattr(cv, "max_cache_bytes", 2 * snapshot_bytes)
+
+    cv.get_snapshot(dates[1], store_dir)
+    cv.get_snapshot(dates[0], store_dir)  # now the most recently used
+    cv.get_snapshot(dates[2], store_dir)
+
+    assert [key[1] for key in cv._cache] == [dates[0], dates[2]]
+    info = cv.get_cache_info()
+    assert info["entries"] == 2
+    assert info["bytes"] == 2 * snapshot_bytes <= info["max_bytes"]
+    assert (info["hits"], info["misses"], info["evictions"]) == (1, 3, 1)
+
+    # The most recent snapshot is kept even if it alone is over the bound
+    monkeypatch.setattr(cv, "max_cache_bytes", 0)
+    cv.get_snapshot(dates[1], store_dir)
+    assert [key[1] for key in cv._cache] == [dates[1]]
+
+
+def test_invalidate(store_dir):
+    for date_str in dates:
+        cv.get_snapshot(date_str, store_dir)
+
+    cv.invalidate([dates[1]], store_dir)
+    assert [key[1] for key in cv._cache] == [dates[0], dates[2]]
+    assert cv.get_cache_info()["bytes"] > 0
+
+    cv.invalidate(store_dir=store_dir)
+    assert cv.get_cache_info()["entries"] == 0
+    assert cv.get_cache_info()["bytes"] == 0
+    assert cv._partitions == {}
@@ -0,0 +1,206 @@
+# Imports
+import io
+import os
+from datetime import datetime as dt
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import Benchmarks as bm
+import ETL as etl
+
+valid_updated = [
+    "16:38:17 CT  03 Apr 2020",
+    "09:05:00 CT  14 Apr 2020",
+    "23:59:59 ET  28 Feb 2021",
+]
+malformed_updated = [
+    "",
+    "-",
+    "garbage",
+    "16:38:17 CT",
+    "25:61:00 CT  03 Apr 2020",
+]
+
+
+def get_scraped_df(rng: np.random.RandomState, n_months: int) -> pd.DataFrame:
+    """
+    Builds a frame shaped like read_csv_from_path()'s output, with 'updated'
+    values drawn from valid and malformed strings.
+    """
+    metrics = ["WTI", "Brent", "USGC-HSFO"]
+    months = [f"{m} {2020 + i // 12}" for i, m in enumerate(["JAN", "FEB"] * 30)]
+    months = list(dict.fromkeys(months))[:n_months]
+
+    # Missing values aren't drawn: parse_last_updated() raises on them
+    pool = valid_updated + malformed_updated
+    rows = [
+        {
+            "metric_id": metric,
+            "month": month,
+            "prior_settle": f"{rng.uniform(10, 60):.2f}",
+            "updated": pool[rng.randint(len(pool))],
+            "collected_date": "2020-04-04",
+        }
+        for metric in metrics
+        for month in months
+        if rng.uniform() < 0.8
+    ]
+
+    return pd.DataFrame(rows)
+
+
+def coalesce_with(df: pd.DataFrame, explode) -> pd.DataFrame:
+    """
+    Runs a scrape through an explode step, the pivot and coalesce_multiple().
+    """
+    df_pivoted = etl.pivot_on_metric_id(explode(df.copy()))
+    etl.coalesce_multiple(df_pivoted, etl.patterns_to_find, etl.coalesced_col_nms)
+
+    return df_pivoted.set_index("month")[etl.coalesced_col_nms].sort_index()
+
+
+def explode_iterative(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The row-by-row explode ETL.run_pipeline() used before
+    explode_scraped_df().
+    """
+    df = etl.explode_col_by_func(
+        df, "updated", etl.cols_to_explode, etl.parse_last_updated
+    )
+    df.drop(columns=["last_updated_time_military"], inplace=True)
+
+    return df
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_explode_scraped_df_coalesces_like_parse_last_updated(seed):
+    rng = np.random.RandomState(seed)
+    df = get_scraped_df(rng, n_months=rng.randint(1, 25))
+
+    expected = coalesce_with(df, explode_iterative)
+    result = coalesce_with(df, etl.explode_scraped_df)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_explode_scraped_df_uses_placeholders_for_unparsed_values():
+    updated = malformed_updated + [np.nan]
+    df = pd.DataFrame(
+        {
+            "metric_id": ["WTI"] * len(updated),
+            "month": [f"MAY {2020 + i}" for i in range(len(updated))],
+            "prior_settle": ["20.00"] * len(updated),
+            "updated": updated,
+            "collected_date": ["2020-04-04"] * len(updated),
+        }
+    )
+
+    exploded = etl.explode_scraped_df(df)
+
+    for col, placeholder in etl.unparsed_updated_values.items():
+        assert (exploded[col] == placeholder).all()
+
+
+def get_col_widths(dict_of_dfs: dict) -> dict:
+    """
+    Writes a workbook with fancy_excel_writer() and reads back its column
+    widths by sheet.
+    """
+    buffer = io.BytesIO()
+    etl.fancy_excel_writer(buffer, dict_of_dfs)
+    workbook = openpyxl.load_workbook(buffer)
+
+    return {
+        sheetname: [
+            # xlsxwriter pads widths by a fraction of a character
+            int(workbook[sheetname].column_dimensions[letter].width)
+            for letter in "ABCDEFGHIJKLMNOP"[: len(df.columns)]
+        ]
+        for sheetname, df in dict_of_dfs.items()
+    }
+
+
+@pytest.fixture
+def template_cols(monkeypatch):
+    monkeypatch.setattr(etl, "stable_col_widths", {})
+    monkeypatch.setattr(
+        etl, "get_template_col_names_if_any", lambda: ("Month", "Updated Time")
+    )
+
+
+def test_col_widths_cover_every_row(template_cols):
+    updated_time = pd.Series(["16:38:17"] * 1_500)
+    df = pd.DataFrame({"Month": "MAY 2020", "Updated Time": updated_time})
+    assert get_col_widths({"Data": df})["Data"] == [9, 13]
+
+    # A wider value past the first 1,000 rows isn't hidden by the widths
+    # stored for the sheet
+    updated_time[1_200] = "16:38:17 CT 03 Apr 2020"
+    df = pd.DataFrame({"Month": "MAY 2020", "Updated Time": updated_time})
+    assert get_col_widths({"Data": df})["Data"] == [9, 24]
+
+
+def test_col_widths_are_stored_by_sheet(template_cols):
+    months = pd.DataFrame({"Month": ["MAY 2020", "JUN 2020"]})
+    month_names = pd.DataFrame({"Month": ["September 2020", "November 2020"]})
+
+    widths = get_col_widths({"Data": months, "Names": month_names})
+    assert widths == {"Data": [9], "Names": [15]}
+    assert set(etl.stable_col_widths) == {("Data", "Month")}
+
+    widths = get_col_widths({"Names": month_names, "Data": months})
+    assert widths == {"Names": [15], "Data": [9]}
+
+
+def test_write_bytes_atomic_falls_back_when_the_destination_is_locked(
+    tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    path_to_write = tmp_path / "CME Group Futures Price.xlsx"
+    path_to_write.write_bytes(b"open in Excel")
+
+    assert etl.write_bytes_atomic(b"v0", str(path_to_write)) == str(path_to_write)
+    assert path_to_write.read_bytes() == b"v0"
+
+    # Windows refuses to replace a file that's open in Excel
+    replace = os.replace
+
+    def locked_replace(src, dst):
+        if dst == str(path_to_write):
+            raise PermissionError(13, "Permission denied", dst)
+        return replace(src, dst)
+
+    monkeypatch.setattr(etl.os, "replace", locked_replace)
+
+    today = str(dt.today()).split(" ")[0]
+    for version in [1, 2]:
+        path_written = etl.write_bytes_atomic(b"v%d" % version, str(path_to_write))
+        assert path_written == str(
+            tmp_path / f"{today} ~ CME Group Futures Price ~ v{version}.xlsx"
+        )
+        with open(path_written, "rb") as f:
+            assert f.read() == b"v%d" % version
+
+    assert path_to_write.read_bytes() == b"v0"
+    assert not [file for file in os.listdir(tmp_path) if file.endswith(".tmp")]
+
+
+@pytest.mark.parametrize("n_products", [1, 6, 50])
+@pytest.mark.parametrize("seed", range(3))
+def test_floatify_and_coalesce_match_column_by_column(n_products, seed):
+    df = bm.get_synthetic_pivoted_df(n_products, n_months=40, seed=seed)
+    price_cols = [col for col in df.columns if col.startswith("prior_settle")]
+
+    expected, result = df.copy(), df.copy()
+    bm.floatify_cols_iterative(expected, price_cols)
+    etl.floatify_cols(result, price_cols)
+    pd.testing.assert_frame_equal(result, expected)
+
+    bm.coalesce_multiple_iterative(
+        expected, etl.patterns_to_find, etl.coalesced_col_nms
+    )
+    etl.coalesce_multiple(result, etl.patterns_to_find, etl.coalesced_col_nms)
+    pd.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,75 @@
+# Imports
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+import ETL_All as eta
+
+
+@pytest.fixture
+def outputs_csv(tmp_path, monkeypatch):
+    """
+    Scraped CSVs of three dates, the first of which already has up-to-date
+    outputs; the pipeline fails on the second.
+    """
+    monkeypatch.chdir(tmp_path)
+    dir_str = tmp_path / "outputs_csv"
+    dir_str.mkdir()
+    for file_nm in [
+        "2020-04-04 ~ Combined Output ~ v1.csv",
+        "2020-04-06 ~ Combined Output ~ v1.csv",
+        "2020-04-10 ~ Combined Output ~ v1.csv",
+        "2020-04-10 ~ Combined Output ~ v2.csv",
+    ]:
+        (dir_str / file_nm).write_text("metric_id\n")
+        os.utime(dir_str / file_nm, (1_000_000, 1_000_000))
+
+    for path in eta.etl.get_output_paths("2020-04-04").values():
+        if path.startswith(str(tmp_path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+
+    run = []
+
+    def run_pipeline(path_str):
+        run.append(os.path.split(path_str)[-1])
+        if "2020-04-06" in path_str:
+            raise ValueError("No tables found")
+
+    rebuilt = []
+    monkeypatch.setattr(eta.etl, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(eta.chg, "rebuild_changes", rebuilt.append)
+    monkeypatch.setattr(eta, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    return str(dir_str), run, rebuilt
+
+
+def test_run_backfill_counts_skipped_and_failed_dates(outputs_csv):
+    dir_str, run, rebuilt = outputs_csv
+
+    summary = eta.run_backfill(dir_str, n_workers=2)
+
+    assert sorted(run) == [
+        "2020-04-06 ~ Combined Output ~ v1.csv",
+        "2020-04-10 ~ Combined Output ~ v2.csv",
+    ]
+    assert (summary["dates"], summary["skipped"]) == (3, 1)
+    assert (summary["succeeded"], summary["failed"]) == (1, 1)
+    assert summary["failures"] == {
+        os.path.join(dir_str, "2020-04-06 ~ Combined Output ~ v1.csv"): (
+            "ValueError: No tables found"
+        )
+    }
+
+    # Changes are chained from the earliest date that ran successfully
+    assert rebuilt == ["2020-04-10"]
+
+
+def test_run_backfill_force_reruns_up_to_date_dates(outputs_csv):
+    dir_str, run, rebuilt = outputs_csv
+
+    summary = eta.run_backfill(dir_str, n_workers=2, force=True)
+
+    assert len(run) == 3
+    assert (summary["skipped"], summary["succeeded"], summary["failed"]) == (0, 2, 1)
+    assert rebuilt == ["2020-04-04"]
@@ -0,0 +1,83 @@
+# Imports
+import json
+import tracemalloc
+import pytest
+
+import Instrument as ins
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    return tmp_path / ins.log_dir
+
+
+@ins.timed("test.fails")
+def fails():
+    raise ValueError("bad input")
+
+
+def test_stages_are_logged_as_json_lines(log_dir):
+    with ins.stage("test.outer", file="a.csv"):
+        with ins.stage("test.inner", product="WTI"):
+            pass
+    with pytest.raises(ValueError):
+        fails()
+
+    with open(log_dir / ins.log_file_nm, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert records == ins.read_records()
+
+    # Stages are written as they finish, inner ones first
+    inner, outer, failed = records
+    assert [r["stage"] for r in records] == ["test.inner", "test.outer", "test.fails"]
+    assert (inner["parent"], outer["parent"], failed["parent"]) == (
+        "test.outer",
+        None,
+        None,
+    )
+    assert (inner["product"], outer["file"]) == ("WTI", "a.csv")
+    assert [r["status"] for r in records] == ["ok", "ok", "ValueError"]
+    for record in records:
+        assert record["event"] == "stage"
+        assert record["run_id"] == ins.run_id
+        assert record["wall_seconds"] >= 0 and record["cpu_seconds"] >= 0
+        assert "py_peak_mb" not in record
+    assert outer["wall_seconds"] >= inner["wall_seconds"]
+
+
+def test_stages_report_their_python_heap_peak(log_dir, monkeypatch):
+    monkeypatch.setattr(ins, "trace_memory", True)
+    try:
+        with ins.stage("test.outer"):
+            with ins.stage("test.inner"):
+                block = bytearray(8 * 1024**2)
+                del block
+            with ins.stage("test.small"):
+                pass
+    finally:
+        tracemalloc.stop()
+
+    peaks = {r["stage"]: r["py_peak_mb"] for r in ins.read_records()}
+    assert peaks["test.inner"] >= 8
+    assert peaks["test.small"] < 1
+    assert peaks["test.outer"] >= peaks["test.inner"]
+
+
+def test_summarize_runs_flags_slow_stages(log_dir):
+    for i, (run_id, seconds) in enumerate([("a", 1.0), ("b", 1.2), ("c", 3.0)]):
+        for stage_name, wall_seconds in [("etl", seconds), ("scrape", 10.0)]:
+            ins.write_record(
+                {
+                    "event": "stage",
+                    "run_id": run_id,
+                    "stage": stage_name,
+                    "started_at": f"2020-04-1{i}T02:00:00.000",
+                    "wall_seconds": wall_seconds,
+                }
+            )
+
+    assert ins.summarize_runs(n_runs=3) == {"etl": 2.73}
+    assert ins.summarize_runs(n_runs=2) == {"etl": 2.5}
@@ -0,0 +1,94 @@
+# Imports
+import os
+import pandas as pd
+
+import ETL as etl
+import PriceStore as ps
+
+
+def get_store_rows(prior_settles):
+    df = pd.DataFrame(
+        {
+            "collected_date": pd.to_datetime(["2020-04-10"] * len(prior_settles)),
+            "metric_id": "WTI",
+            "contract_month": [202005 + i for i in range(len(prior_settles))],
+            "month": [f"M{i}" for i in range(len(prior_settles))],
+            "prior_settle": prior_settles,
+            "updated_date": pd.to_datetime("2020-04-09"),
+            "updated_time": "17:00:00",
+            "updated_time_zone": "CT",
+            "source": "2020-04-10 ~ Combined Output ~ v1.csv",
+        }
+    )
+    df["ingested_at"] = pd.Timestamp.now()
+
+    return df
+
+
+def test_append_prices_is_idempotent(tmp_path):
+    store_dir = str(tmp_path)
+
+    assert len(ps.append_prices(get_store_rows([22.76, 27.86]), store_dir)) == 1
+    # Same rows ingested again (e.g. a re-parsed run): nothing is written
+    assert ps.append_prices(get_store_rows([22.76, 27.86]), store_dir) == []
+    # Changed rows still append and win on read
+    assert len(ps.append_prices(get_store_rows([22.76, 28.0]), store_dir)) == 1
+
+    partition_dir = ps.get_partition_dir("2020-04-10", store_dir)
+    assert len(os.listdir(partition_dir)) == 2
+    df = ps.read_partition("2020-04-10", ["prior_settle"], store_dir)
+    assert df["prior_settle"].tolist() == [22.76, 28.0]
+
+
+def test_daily_view_coalesces_update_metadata_like_etl(tmp_path):
+    # Metrics pivot in name order: unparsed 'updated' values (placeholders)
+    # of the first metric quoting a month win May and July, and a parsed one
+    # wins June over WTI's unparsed one
+    df = pd.DataFrame(
+        {
+            "metric_id": ["Brent", "WTI", "Brent", "WTI", "USGC-HSFO", "WTI"],
+            "month": [
+                "MAY 2020",
+                "MAY 2020",
+                "JUN 2020",
+                "JUN 2020",
+                "JUL 2020",
+                "JUL 2020",
+            ],
+            "prior_settle": ["26.57", "22.76", "27.86", "-", "20.1", "24.96"],
+            "updated": [
+                "garbage",
+                "16:38:17 CT  09 Apr 2020",
+                "17:00:00 CT  08 Apr 2020",
+                "16:38:17 CT",
+                "",
+                "09:05:00 ET  09 Apr 2020",
+            ],
+            "collected_date": "2020-04-10",
+        }
+    )
+    exploded = etl.explode_scraped_df(df)
+
+    df_pivoted = etl.pivot_on_metric_id(exploded.copy())
+    etl.coalesce_multiple(df_pivoted, etl.patterns_to_find, etl.coalesced_col_nms)
+    expected = df_pivoted.set_index("month")
+
+    ps.append_prices(ps.from_exploded_df(exploded), str(tmp_path))
+    view = ps.get_daily_view("2020-04-10", str(tmp_path)).set_index("Month")
+
+    assert sorted(view.index) == sorted(expected.index)
+    for month in expected.index:
+        updated_date = expected.loc[month, "updated_date"]
+        if updated_date == "_":
+            assert pd.isna(view.loc[month, "Updated Date"])
+        else:
+            assert view.loc[month, "Updated Date"] == pd.Timestamp(updated_date)
+        assert view.loc[month, "Updated Time"] == expected.loc[month, "updated_time"]
+        assert (
+            view.loc[month, "Updated Time Zone"]
+            == expected.loc[month, "updated_time_zone"]
+        )
+
+    assert view.loc["MAY 2020", "Updated Time"] == "-"
+    assert pd.isna(view.loc["JUL 2020", "Updated Date"])
+    assert view.loc["JUN 2020", "Updated Time Zone"] == "CT"
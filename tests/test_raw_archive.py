@@ -0,0 +1,68 @@
+# Imports
+import os
+import pytest
+
+import RawArchive as ra
+
+codecs = ["gz"] + (["zst"] if ra.zstandard is not None else [])
+
+page = "<html><body><table><tr><td>MAY 2020 – 22.76</td></tr></table></body></html>"
+
+
+def count_blobs(archive_dir: str) -> int:
+    return sum(
+        len(files) for _, _, files in os.walk(os.path.join(archive_dir, "blobs"))
+    )
+
+
+@pytest.mark.parametrize("codec", codecs)
+def test_save_and_read_pages(tmp_path, monkeypatch, codec):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ra, "codec", codec)
+
+    first = ra.save_page(page, "WTI", "2020-04-10")
+    second = ra.save_page(page, "WTI", "2020-04-10")
+    changed = ra.save_page(page.replace("22.76", "22.41"), "WTI", "2020-04-10")
+    ra.save_page(page, "Brent", "2020-04-10")
+
+    # Identical pages are stored once, under new versions
+    assert [first["version"], second["version"], changed["version"]] == [1, 2, 3]
+    assert first["blob"] == second["blob"] != changed["blob"]
+    assert first["blob"].endswith(f".{codec}")
+    assert count_blobs("outputs_raw") == 2
+
+    assert ra.read_page("2020-04-10", "WTI", 1) == page
+    assert "22.41" in ra.read_page("2020-04-10", "WTI")
+    assert [entry["name"] for entry, _ in ra.iter_pages("2020-04-10")] == [
+        "WTI",
+        "WTI",
+        "WTI",
+        "Brent",
+    ]
+    assert [html for _, html in ra.iter_pages(name="Brent")] == [page]
+
+    with pytest.raises(KeyError):
+        ra.get_entry("2020-04-10", "WTI", 4)
+
+
+def test_import_txt_dir_skips_pages_already_imported(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    txt_dir = tmp_path / "outputs_txt"
+    txt_dir.mkdir()
+    (txt_dir / "2020-04-10 ~ WTI ~ v1.txt").write_text(page, encoding="utf-8")
+    (txt_dir / "2020-04-10 ~ WTI ~ v2.txt").write_text(page, encoding="utf-8")
+    (txt_dir / "2020-04-10 ~ Brent ~ v1.txt").write_text("Brent", encoding="utf-8")
+    (txt_dir / "notes.txt").write_text("not a page", encoding="utf-8")
+
+    counts = ra.import_txt_dir(str(txt_dir))
+    assert (counts["imported"], counts["skipped"]) == (3, 0)
+    assert count_blobs("outputs_raw") == 2
+
+    counts = ra.import_txt_dir(str(txt_dir))
+    assert (counts["imported"], counts["skipped"]) == (0, 3)
+    assert len(ra.read_index()) == 3
+
+    # Imported pages keep their dates and version numbers
+    assert ra.read_page("2020-04-10", "WTI", 2) == page
+    assert ra.read_page("2020-04-10", "Brent") == "Brent"
+    assert ra.save_page(page, "WTI", "2020-04-10")["version"] == 3
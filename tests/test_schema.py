@@ -0,0 +1,54 @@
+# Imports
+import logging
+import pandas as pd
+
+import Schema as sch
+
+
+def get_excel_df():
+    """
+    A daily output's 'Data_Vertical' tab as the Excel outputs have always
+    held it, with an unparsed 'Updated Date' on its second row.
+    """
+    return pd.DataFrame(
+        {
+            "Lookup-Key": ["2020-04-10 - 0", "2020-04-10 - 1", "2020-04-10 - 2"],
+            "Month": ["MAY 2020", "JUN 2020", "JUL 2020"],
+            "Month Rank": pd.array([202005, 202006, 202007], dtype="int32"),
+            "WTI": [22.76, 24.74, 26.0],
+            "Brent": [31.48, 32.84, None],
+            "Gasoline-RBOB": [0.7036, 0.7612, 0.8044],
+            "NYH ULSD-Heating Oil": [0.9967, 1.0158, 1.0441],
+            "USGC-ULSD": [0.9217, 0.9408, 0.9741],
+            "USGC-HSFO": [0.4671, 0.4838, 0.5040],
+            "USGC-HSFO (/bbl)": [19.62, 20.32, 21.17],
+            "Collected Date": ["2020-04-10"] * 3,
+            "Updated Date": ["2020-04-09", "_", "2020-04-09"],
+            "Updated Time": ["16:38:17", "-", "17:00:00"],
+            "Updated Time Zone": ["CT", "-", "CT"],
+        }
+    )
+
+
+def test_placeholder_dates_round_trip_to_excel(caplog):
+    df = get_excel_df()
+
+    with caplog.at_level(logging.WARNING):
+        typed = sch.enforce_schema(df)
+
+    assert typed["Updated Date"].dtype == "datetime64[ns]"
+    assert pd.isna(typed.loc[1, "Updated Date"])
+    assert "schema_dates_unparsed" not in caplog.text
+
+    pd.testing.assert_frame_equal(sch.to_excel_types(typed), df)
+
+
+def test_unparsed_dates_other_than_placeholders_are_logged(caplog):
+    df = get_excel_df()
+    df.loc[2, "Updated Date"] = "09 Apr 2020"
+
+    with caplog.at_level(logging.WARNING):
+        typed = sch.enforce_schema(df)
+
+    assert pd.isna(typed.loc[2, "Updated Date"])
+    assert '"count": 1' in caplog.text